@@ -1,11 +1,31 @@
 #!/usr/bin/env python3
 """
 게임 정보를 RAG 서버에 추가하는 스크립트
+
+사용법:
+    python add_game_data.py                              # 내장 게임 팁 데이터
+    python add_game_data.py --file game_data.json        # 파일(JSON 배열 또는 JSONL), 여러 번 지정 가능
+    python add_game_data.py --file game_data.json --concurrency 16
+
+이미 추가한 문서는 내용 해시를 매니페스트 파일에 기록해 두고 다음 실행 때 건너뜁니다.
+중간에 실패해도 다시 실행하면 남은 문서만 추가합니다. (--force: 매니페스트 무시)
 """
-import requests
+import argparse
+import hashlib
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
 
 RAG_URL = "http://localhost:8100"
+# 추가 완료 문서 기록 (한 줄에 하나: {"hash", "title", "id"}). 실행 위치와 관계없이 스크립트 옆에 둔다
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ingest_manifest.jsonl")
+DEFAULT_CONCURRENCY = 8
+MAX_RETRIES = 2
 
 # 게임 팁 데이터
 game_data = [
@@ -89,53 +109,164 @@ game_data = [
     }
 ]
 
-def add_document(doc):
-    """문서를 RAG 서버에 추가"""
+def load_documents(path):
+    """JSON 배열 또는 JSONL 파일에서 문서 읽기"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def normalize_document(doc):
+    """/add 요청 형식으로 변환 (game_data.json의 genre → category)"""
+    return {
+        "title": doc.get("title", ""),
+        "content": doc.get("content", ""),
+        "category": doc.get("category") or doc.get("genre", ""),
+        "source_url": doc.get("source_url", ""),
+    }
+
+
+def content_hash(doc):
+    return hashlib.sha256(json.dumps(doc, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+
+class Manifest:
+    """추가 완료 문서 해시 기록. 한 건마다 바로 기록해서 중단돼도 이어서 진행"""
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.hashes.add(json.loads(line)["hash"])
+                    except (ValueError, KeyError):
+                        continue  # 기록 도중 끊긴 줄
+
+    def __contains__(self, digest):
+        return digest in self.hashes
+
+    def record(self, digest, title, doc_id):
+        with self._lock:
+            self.hashes.add(digest)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"hash": digest, "title": title, "id": doc_id}, ensure_ascii=False) + "\n")
+
+
+def make_session(pool_size):
+    """연결을 재사용하는 공유 세션"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def add_document(session, doc, retries=MAX_RETRIES):
+    """문서를 RAG 서버에 추가. (성공 여부, 문서 ID 또는 None)
+
+    2xx면 서버에 저장된 것이므로 ID가 없어도 성공으로 본다 (다시 보내면 중복 문서가 생김)
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(
+                f"{RAG_URL}/add",
+                json=doc,
+                timeout=10
+            )
+            if 200 <= response.status_code < 300:
+                try:
+                    doc_id = response.json().get("id")
+                except (ValueError, AttributeError):
+                    doc_id = None
+                if doc_id is None:
+                    print(f"⚠️  추가 완료, 응답에 ID 없음: {doc['title']} ({response.status_code})")
+                else:
+                    print(f"✅ 추가 완료: {doc['title']} (ID: {doc_id})")
+                return True, doc_id
+            if response.status_code < 500:
+                print(f"❌ 실패: {doc['title']} - {response.status_code}")
+                return False, None
+            error = response.status_code
+        except Exception as e:
+            error = e
+        if attempt < retries:
+            time.sleep(2 ** attempt)
+    print(f"❌ 오류: {doc['title']} - {error}")
+    return False, None
+
+
+def print_document_count(session, label):
     try:
-        response = requests.post(
-            f"{RAG_URL}/add",
-            json=doc,
-            timeout=10
-        )
-        if response.status_code == 200:
-            result = response.json()
-            print(f"✅ 추가 완료: {doc['title']} (ID: {result['id']})")
-            return True
-        else:
-            print(f"❌ 실패: {doc['title']} - {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"❌ 오류: {doc['title']} - {e}")
-        return False
+        stats = session.get(f"{RAG_URL}/stats", timeout=10).json()
+        print(f"{label}: {stats['total_documents']}")
+    except Exception:
+        print("⚠️  RAG 서버 상태 확인 실패")
+
 
 def main():
+    global RAG_URL
+    parser = argparse.ArgumentParser(description="게임 정보를 RAG 서버에 추가")
+    parser.add_argument("--file", action="append", help="문서 파일 (JSON 배열 또는 JSONL). 없으면 내장 데이터")
+    parser.add_argument("--url", default=RAG_URL, help="RAG 서버 주소")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="동시 요청 수")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="추가 완료 기록 파일")
+    parser.add_argument("--force", action="store_true", help="기록과 관계없이 모두 추가")
+    args = parser.parse_args()
+    RAG_URL = args.url.rstrip("/")
+
     print("=" * 60)
     print("게임 정보 데이터 추가 시작")
     print("=" * 60)
 
-    # 현재 문서 수 확인
-    try:
-        stats = requests.get(f"{RAG_URL}/stats").json()
-        print(f"현재 저장된 문서 수: {stats['total_documents']}\n")
-    except:
-        print("⚠️  RAG 서버 상태 확인 실패\n")
+    docs = []
+    for path in args.file or []:
+        docs.extend(load_documents(path))
+    if not args.file:
+        docs = game_data
+    docs = [normalize_document(d) for d in docs]
 
-    # 데이터 추가
+    manifest = Manifest(args.manifest)
+    pending, seen = [], set()
+    for doc in docs:
+        digest = content_hash(doc)
+        if digest in seen or (not args.force and digest in manifest):
+            continue
+        seen.add(digest)
+        pending.append((digest, doc))
+    skipped = len(docs) - len(pending)
+
+    session = make_session(args.concurrency)
+    print_document_count(session, "현재 저장된 문서 수")
+    print(f"대상 {len(docs)}개 중 {skipped}개 건너뜀 (이미 추가됨/중복), {len(pending)}개 추가\n")
+
+    # 데이터 추가 (동시 요청)
     success_count = 0
-    for doc in game_data:
-        if add_document(doc):
-            success_count += 1
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {executor.submit(add_document, session, doc): (digest, doc) for digest, doc in pending}
+        for future in as_completed(futures):
+            digest, doc = futures[future]
+            ok, doc_id = future.result()
+            if ok:
+                manifest.record(digest, doc["title"], doc_id)
+                success_count += 1
+    elapsed = time.monotonic() - started
 
     print("\n" + "=" * 60)
-    print(f"완료: {success_count}/{len(game_data)} 문서 추가됨")
+    print(f"완료: {success_count}/{len(pending)} 문서 추가됨, {skipped}개 건너뜀")
+    if pending:
+        print(f"소요 {elapsed:.1f}초 ({success_count / elapsed if elapsed else 0:.1f} docs/sec)")
+    if success_count < len(pending):
+        print("실패한 문서는 다시 실행하면 이어서 추가합니다.")
     print("=" * 60)
 
     # 최종 문서 수 확인
-    try:
-        stats = requests.get(f"{RAG_URL}/stats").json()
-        print(f"최종 문서 수: {stats['total_documents']}")
-    except:
-        pass
+    print_document_count(session, "최종 문서 수")
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,31 @@
+import bisect
+import fcntl
+import hashlib
+import heapq
+import hmac
+import ipaddress
 import json
 import logging
+import math
+import mmap
 import os
+import queue
+import random
+import re
+import sqlite3
+import struct
+import sys
+import threading
 import time
+import unicodedata
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, jsonify, render_template_string
 
 app = Flask(__name__)
@@ -18,47 +39,1514 @@ logger = logging.getLogger(__name__)
 # Iris (redroid) reply 엔드포인트
 IRIS_URL = os.getenv('IRIS_URL', 'http://192.168.0.80:3000')
 # wikibot-kakao 서버 주소 (Docker host 네트워크 → localhost 직접 통신)
-WIKIBOT_URL = 'http://localhost:8214'
+WIKIBOT_URL = os.getenv('WIKIBOT_URL', 'http://localhost:8214')
 # 배포 트리거 파일 (호스트의 cron이 이 파일 감지 후 deploy.sh 실행)
 DEPLOY_TRIGGER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".deploy_trigger")
 
-# 요청 딜레이 관리
-last_request_time = 0
-REQUEST_DELAY = 2
+# Iris 전송 큐: 메시지 합치기 대기 시간(초) / 초당 전송 수 / 버스트 / 동시 전송 스레드 수 / 재시도
+REPLY_COALESCE_WINDOW = float(os.getenv('REPLY_COALESCE_WINDOW', '0.3'))
+IRIS_SEND_RATE = float(os.getenv('IRIS_SEND_RATE', '5'))
+IRIS_SEND_BURST = int(os.getenv('IRIS_SEND_BURST', '5'))
+REPLY_SENDERS = int(os.getenv('REPLY_SENDERS', '4'))
+REPLY_MAX_RETRIES = 3
+REPLY_RETRY_BASE = 1
+REPLY_MAX_CHARS = 3000  # 합친 메시지 최대 길이
+
+# wikibot 요청 속도 제한 (토큰 버킷, 엔드포인트·방 단위)
+REQUEST_DELAY = float(os.getenv('WIKIBOT_REQUEST_DELAY', '2'))  # 토큰 1개 보충 간격(초)
+WIKIBOT_BURST = int(os.getenv('WIKIBOT_BURST', '5'))  # 한 번에 몰아 쓸 수 있는 토큰 수
+RATE_LIMIT_PER_ROOM = os.getenv('WIKIBOT_RATE_PER_ROOM', '1') == '1'
+# 엔드포인트별 (초당 보충량, 버스트). 없으면 REQUEST_DELAY / WIKIBOT_BURST 사용
+WIKIBOT_RATE_LIMITS = {
+    "/ask": (0.5, 3),
+    "/api/trade/query": (1.0, 5),
+}
+# wikibot 동시 요청 상한
+WIKIBOT_MAX_CONCURRENCY = int(os.getenv('WIKIBOT_MAX_CONCURRENCY', '16'))
+
+# wikibot 응답 캐시: 엔드포인트별 TTL(초). 목록에 없는 엔드포인트는 캐시하지 않음
+RESPONSE_CACHE_TTLS = {
+    "/ask": 1800,
+    "/ask/item": 6 * 3600,
+    "/ask/skill": 6 * 3600,
+    "/ask/community": 600,
+    "/ask/notice": 120,
+    "/ask/update": 300,
+    "/api/trade/query": 60,
+}
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+# 만료된 응답을 더 보관하는 시간(초). wikibot이 실패하거나 서킷이 열렸을 때 대신 답함
+RESPONSE_CACHE_STALE_FOR = int(os.getenv('RESPONSE_CACHE_STALE_FOR', str(6 * 3600)))
+
+
+# ── 메트릭 ────────────────────────────────────────────────
+# /metrics (Prometheus 텍스트 형식). 기록은 잠금 한 번 + dict 갱신뿐이라 항상 켜 둔다.
+# 큐 길이·캐시 통계처럼 이미 있는 값은 수집 시점에 읽어 온다(MetricFunc).
+
+# 지연 히스토그램 구간(초)
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _metric_labels(names, values, extra=""):
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+        metrics.register(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_metric_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=METRIC_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}  # 라벨 → [구간별 개수..., +Inf 개수, 합계]
+        metrics.register(self)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def time(self, *labels):
+        """with 블록 실행 시간 기록"""
+        return _HistogramTimer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(row)) for k, row in self._values.items()]
+        lines = []
+        for key, row in items:
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                total += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_metric_labels(self.labels, key, le)} {total}")
+            lines.append(f"{self.name}_sum{_metric_labels(self.labels, key)} {round(row[-1], 6)}")
+            lines.append(f"{self.name}_count{_metric_labels(self.labels, key)} {total}")
+        return lines
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.monotonic() - self.started, *self.labels)
+
+
+class MetricFunc:
+    """수집 시점에 fn()을 불러 값을 읽는 메트릭. fn은 숫자 또는 {라벨 튜플: 값} 반환"""
+
+    def __init__(self, name, help, type, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.fn = fn
+        self.labels = labels
+        metrics.register(self)
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            logger.error(f"메트릭 수집 오류 ({self.name}): {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_metric_labels(self.labels, k)} {v}" for k, v in values.items()]
+
+
+COMMAND_SECONDS = Histogram("bot_command_seconds", "명령 처리 시간", ("command",))
+COMMAND_ERRORS = Counter("bot_command_errors_total", "명령 처리 중 예외", ("command",))
+ADMIN_COMMAND_SECONDS = Histogram("bot_admin_command_seconds", "관리자 명령 처리 시간", ("command",))
+UPSTREAM_SECONDS = Histogram("bot_upstream_request_seconds", "upstream 요청 시간", ("upstream", "endpoint"))
+UPSTREAM_ERRORS = Counter(
+    "bot_upstream_errors_total",
+    "upstream 요청 실패 (timeout/connection/http_5xx/other/circuit_open/deadline)",
+    ("upstream", "endpoint", "kind"),
+)
+UPSTREAM_IN_FLIGHT = Gauge("bot_upstream_in_flight", "진행 중인 upstream 요청 수", ("upstream",))
+WEBHOOK_EVENTS = Counter("bot_webhook_events_total", "웹훅 수신 이벤트 (accepted/ignored/busy/error)", ("result",))
+EVENTS_IN_FLIGHT = Gauge("bot_events_in_flight", "처리 중인 이벤트 수")
+EVENT_SECONDS = Histogram("bot_event_seconds", "이벤트 하나 처리 시간(워커에서)")
+EVENT_ERRORS = Counter("bot_event_errors_total", "이벤트 처리 중 예외")
+BUDGET_EXCEEDED = Counter("bot_event_budget_exceeded_total", "시간 예산을 다 써 사과 답장으로 끝낸 명령", ("command",))
+
+# 경로의 가변 부분(방 ID, 별칭 등)은 :id로 바꿔 라벨 수를 제한
+_METRIC_PATH_SEGMENT_RE = re.compile(r"^[a-z][a-z_-]*$")
+
+
+def metric_endpoint(path):
+    return "/".join(s if not s or _METRIC_PATH_SEGMENT_RE.match(s) else ":id" for s in path.split("/"))
+
+
+# ── 요청 추적 ─────────────────────────────────────────────
+# 이벤트 하나를 처리하는 동안 단계별 구간(span)을 스레드 로컬에 기록한다.
+# 기준 시간을 넘긴 요청은 전부 느린 요청 버퍼에 남기고(!느린요청, /traces/slow),
+# 나머지는 TRACE_SAMPLE_RATE 비율만 최근 요청 버퍼에 남긴다(/traces/recent).
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.05'))
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', '3'))  # 초
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '50'))
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started", "depth")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.depth = self.trace["_depth"]
+        self.trace["_depth"] += 1
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        ended = time.monotonic()
+        trace = self.trace
+        trace["_depth"] -= 1
+        trace["spans"].append({
+            "name": self.name,
+            "start_ms": round((self.started - trace["_started"]) * 1000, 1),
+            "ms": round((ended - self.started) * 1000, 1),
+            "depth": self.depth,
+        })
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """스레드별 현재 추적 + 느린 요청/표본 요청 링 버퍼"""
+
+    def __init__(self, sample_rate, slow_threshold, size):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.slow = deque(maxlen=size)
+        self.recent = deque(maxlen=size)
+        self.finished = 0
+        self.slow_total = 0
+
+    def start(self, queued_at=None, **info):
+        """추적 시작. queued_at(monotonic)이 있으면 대기 시간을 첫 구간으로 기록"""
+        now = time.monotonic()
+        started = queued_at if queued_at is not None else now
+        trace = {"_started": started, "_depth": 0, "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                 "spans": [], **info}
+        if queued_at is not None:
+            trace["spans"].append({"name": "queue", "start_ms": 0.0,
+                                   "ms": round((now - queued_at) * 1000, 1), "depth": 0})
+        self._local.trace = trace
+
+    def span(self, name):
+        """with 블록을 현재 추적의 구간으로 기록 (추적 중이 아니면 아무것도 안 함)"""
+        trace = getattr(self._local, "trace", None)
+        return _NO_SPAN if trace is None else _Span(trace, name)
+
+    def annotate(self, **info):
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.update(info)
+
+    def finish(self):
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return
+        self._local.trace = None
+        total = time.monotonic() - trace.pop("_started")
+        trace.pop("_depth")
+        trace["total_ms"] = round(total * 1000, 1)
+        trace["spans"].sort(key=lambda s: (s["start_ms"], s["depth"]))  # 끝난 순서 → 시작 순서
+        slow = total >= self.slow_threshold
+        with self._lock:
+            self.finished += 1
+            if slow:
+                self.slow_total += 1
+                self.slow.append(trace)
+            elif random.random() < self.sample_rate:
+                self.recent.append(trace)
+        if slow:
+            logger.warning(f"느린 요청 {total:.1f}s [{trace.get('chat_id')}] {trace.get('msg', '')[:30]} "
+                           f"— {format_trace_spans(trace)}")
+
+    def snapshot(self, kind="slow", limit=None, redact=False):
+        """최근 것부터. redact=True면 메시지 본문과 보낸 사람을 빼고 명령어만 남김 (HTTP 조회용)"""
+        with self._lock:
+            traces = list(self.slow if kind == "slow" else self.recent)
+        traces.reverse()
+        traces = traces[:limit] if limit else traces
+        if redact:
+            traces = [_redact_trace(t) for t in traces]
+        return traces
+
+
+def _redact_trace(trace):
+    trace = {k: v for k, v in trace.items() if k not in ("msg", "sender")}
+    trace["msg"] = trace.get("command", "")  # 명령어 접두사 (명령이 아니면 빈 문자열)
+    return trace
+
+    def stats(self):
+        with self._lock:
+            return {"finished": self.finished, "slow": self.slow_total,
+                    "slow_buffered": len(self.slow), "recent_buffered": len(self.recent)}
+
+
+def format_trace_spans(trace, top=3):
+    """가장 오래 걸린 구간 top개: "wikibot /ask 19.8s, nickname 0.3s\""""
+    spans = sorted((s for s in trace["spans"] if s["depth"] == 0), key=lambda s: s["ms"], reverse=True)
+    return ", ".join(f"{s['name']} {s['ms'] / 1000:.1f}s" for s in spans[:top]) or "구간 없음"
+
+
+tracer = Tracer(TRACE_SAMPLE_RATE, SLOW_REQUEST_THRESHOLD, TRACE_BUFFER_SIZE)
+
+
+# ── 이벤트 시간 예산 ──────────────────────────────────────
+# 웹훅 이벤트 하나가 쓸 수 있는 전체 시간(초, 대기열에 들어간 시각부터). 방 설정·닉네임·
+# 기능 토글·검색 조회는 각자 타임아웃 대신 남은 예산만큼만 기다리고, 예산을 다 쓰면
+# 짧은 사과 답장으로 끝낸다. 처리 스레드에서는 스레드 로컬로, 실행기(executor)로 넘기는
+# 호출에는 deadline 인자로 명시적으로 전달한다.
+
+EVENT_BUDGET = float(os.getenv('EVENT_BUDGET', '25'))
+# 남은 예산이 이보다 적으면 upstream 호출을 시작하지 않음(초)
+EVENT_BUDGET_MIN_CALL = 0.2
+BUDGET_EXCEEDED_REPLY = "응답이 늦어져 처리하지 못했습니다. 잠시 후 다시 시도해주세요."
+
+
+class DeadlineExceeded(requests.Timeout):
+    """이벤트 시간 예산을 다 씀"""
+
+
+class Deadline:
+    """이벤트 하나의 마감 시각(monotonic)"""
+
+    __slots__ = ("expires_at", "exceeded")
+
+    def __init__(self, budget, started=None):
+        self.expires_at = (started if started is not None else time.monotonic()) + budget
+        self.exceeded = False  # 예산 부족으로 막거나 줄인 호출이 있었는지
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() < EVENT_BUDGET_MIN_CALL
+
+    def timeout(self, limit, what=""):
+        """limit과 남은 예산 중 작은 값. 남은 예산이 없으면 DeadlineExceeded"""
+        remaining = self.remaining()
+        if remaining < EVENT_BUDGET_MIN_CALL:
+            self.exceeded = True
+            raise DeadlineExceeded(f"시간 예산 초과 → {what} 생략")
+        return remaining if limit is None else min(limit, remaining)
+
+
+_deadline_local = threading.local()
+
+
+def current_deadline():
+    """지금 스레드에서 처리 중인 이벤트의 Deadline (없으면 None)"""
+    return getattr(_deadline_local, "deadline", None)
+
+
+def set_deadline(deadline):
+    _deadline_local.deadline = deadline
+
+
+# ── 워커 간 공유 캐시 ─────────────────────────────────────
+# 여러 워커 프로세스로 실행할 때(SERVER_WORKERS > 1) 방 설정·기능 토글·wikibot 응답을
+# 로컬 SQLite 파일 하나에 함께 둔다. 각 워커는 지금처럼 프로세스 안 dict를 먼저 보고,
+# 없을 때만 공유 파일을 읽으므로 새 워커도 다른 워커가 채운 캐시로 바로 시작한다.
+# 무효화(관리자 설정 변경, /features/invalidate)는 네임스페이스별 세대 번호를 올려 알리고,
+# 각 워커는 최대 SHARED_CACHE_SYNC_INTERVAL초 안에 로컬 사본을 비운다.
+
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '1'))
+SHARED_CACHE_PATH = os.getenv(
+    'SHARED_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".shared_cache.db") if SERVER_WORKERS > 1 else "",
+)
+SHARED_CACHE_SYNC_INTERVAL = 1.0  # 초
+SHARED_CACHE_PURGE_INTERVAL = 600  # 만료 항목 정리 주기(초)
+
+
+class SharedCache:
+    """프로세스 간 공유 키-값 캐시 (SQLite WAL). 만료 시각은 벽시계(time.time()) 기준"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        self._generations = {}  # ns → (세대, 다시 읽을 시각)
+        self._purge_at = 0
+        self.reads = 0
+        self.hits = 0
+        self.writes = 0
+        self.errors = 0
+
+    def _connect(self):
+        # fork 전에 열린 연결은 자식 프로세스에서 쓰지 않음
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")  # 캐시라 잃어도 다시 조회하면 됨
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL, "
+                "PRIMARY KEY (ns, key)) WITHOUT ROWID"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS generations (ns TEXT PRIMARY KEY, gen INTEGER NOT NULL)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db = db
+            self._pid = os.getpid()
+        return self._db
+
+    def get(self, ns, key, stale_for=0):
+        """(값, 만료 시각) 또는 None. stale_for초 전에 만료된 항목까지 돌려줌"""
+        try:
+            with self._lock:
+                self.reads += 1
+                row = self._connect().execute(
+                    "SELECT value, expires FROM cache WHERE ns = ? AND key = ? AND expires >= ?",
+                    (ns, key, time.time() - stale_for),
+                ).fetchone()
+                if row is None:
+                    return None
+                self.hits += 1
+            return json.loads(row[0]), row[1]
+        except sqlite3.Error as e:
+            self._error("읽기", e)
+            return None
+
+    def set(self, ns, key, value, ttl):
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+            with self._lock:
+                db = self._connect()
+                db.execute(
+                    "INSERT OR REPLACE INTO cache (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+                    (ns, key, payload, time.time() + ttl),
+                )
+                self.writes += 1
+                if time.monotonic() >= self._purge_at:
+                    self._purge_at = time.monotonic() + SHARED_CACHE_PURGE_INTERVAL
+                    # 만료 후 가장 오래 보관하는 응답 캐시 기준으로 정리
+                    db.execute("DELETE FROM cache WHERE expires < ?", (time.time() - RESPONSE_CACHE_STALE_FOR,))
+        except sqlite3.Error as e:
+            self._error("쓰기", e)
+
+    def invalidate(self, ns, key=None):
+        """항목(없으면 ns 전체) 삭제 후 세대 번호를 올려 다른 워커가 로컬 사본을 비우게 함"""
+        try:
+            with self._lock:
+                db = self._connect()
+                if key is None:
+                    db.execute("DELETE FROM cache WHERE ns = ?", (ns,))
+                else:
+                    db.execute("DELETE FROM cache WHERE ns = ? AND key = ?", (ns, key))
+                self._bump(db, ns)
+        except sqlite3.Error as e:
+            self._error("무효화", e)
+
+    def refund_token(self, name, burst):
+        """take_token으로 얻었지만 쓰지 못한 토큰 반환"""
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "UPDATE buckets SET tokens = MIN(?, tokens + 1) WHERE name = ?", (burst, name),
+                )
+        except sqlite3.Error as e:
+            self._error("토큰 버킷", e)
+
+    def notify(self, ns):
+        """항목은 그대로 두고 세대 번호만 올림 (새 값을 이미 써 둔 경우)"""
+        try:
+            with self._lock:
+                self._bump(self._connect(), ns)
+        except sqlite3.Error as e:
+            self._error("무효화", e)
+
+    def _bump(self, db, ns):
+        db.execute(
+            "INSERT INTO generations (ns, gen) VALUES (?, 1) "
+            "ON CONFLICT(ns) DO UPDATE SET gen = gen + 1", (ns,),
+        )
+        self._generations.pop(ns, None)
+
+    def generation(self, ns):
+        """ns의 무효화 세대 (최대 SHARED_CACHE_SYNC_INTERVAL초 전 값)"""
+        now = time.monotonic()
+        cached = self._generations.get(ns)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        try:
+            with self._lock:
+                row = self._connect().execute("SELECT gen FROM generations WHERE ns = ?", (ns,)).fetchone()
+        except sqlite3.Error as e:
+            self._error("세대 조회", e)
+            return cached[0] if cached else 0
+        gen = row[0] if row else 0
+        self._generations[ns] = (gen, now + SHARED_CACHE_SYNC_INTERVAL)
+        return gen
+
+    def take_token(self, name, rate, burst):
+        """워커 전체가 함께 쓰는 토큰 버킷에서 1개 사용. 얻으면 0, 없으면 기다릴 시간(초), 오류면 None"""
+        try:
+            with self._lock:
+                db = self._connect()
+                db.execute("BEGIN IMMEDIATE")  # 읽고 고치는 동안 다른 워커의 쓰기를 막음
+                try:
+                    now = time.time()
+                    row = db.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                    tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                    wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                    if not wait:
+                        tokens -= 1
+                    db.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                               (name, tokens, now))
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            return wait
+        except sqlite3.Error as e:
+            self._error("토큰 버킷", e)
+            return None
+
+    def _error(self, what, e):
+        self.errors += 1
+        logger.warning(f"공유 캐시 {what} 오류: {e}")
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "reads": self.reads,
+            "hits": self.hits,
+            "writes": self.writes,
+            "errors": self.errors,
+        }
+
+
+class SharedView:
+    """공유 캐시의 네임스페이스 하나. 다른 워커가 무효화했는지 확인(changed)할 세대 번호를 보관"""
+
+    def __init__(self, cache, ns):
+        self.cache = cache
+        self.ns = ns
+        self._seen = None
+
+    def changed(self):
+        """마지막 확인 이후 다른 워커(또는 자신)가 무효화했으면 True. 처음 호출은 False"""
+        gen = self.cache.generation(self.ns)
+        if self._seen is None or gen == self._seen:
+            self._seen = gen
+            return False
+        self._seen = gen
+        return True
+
+    def get(self, key, stale_for=0):
+        return self.cache.get(self.ns, key, stale_for)
+
+    def set(self, key, value, ttl):
+        self.cache.set(self.ns, key, value, ttl)
+
+    def invalidate(self, key=None):
+        self.cache.invalidate(self.ns, key)
+
+    def notify(self):
+        self.cache.notify(self.ns)
+
+
+shared_cache = SharedCache(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
+
+
+def shared_view(ns):
+    """공유 캐시를 쓰지 않으면 None"""
+    return SharedView(shared_cache, ns) if shared_cache is not None else None
+
+
+# 워커 프로세스 중 하나만 맡을 일(수집 스풀 재전송, 재시작 알림)을 정하는 파일 잠금
+_process_locks = {}
+
+
+def acquire_process_lock(name, blocking=False):
+    """잠금을 얻으면 True. 얻은 잠금은 프로세스가 끝날 때까지 유지된다(죽으면 OS가 풀어 줌)"""
+    if name in _process_locks:
+        return True
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f".{name}.lock")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    _process_locks[name] = fd
+    return True
+
+
+# ── HTTP 클라이언트 ───────────────────────────────────────
+
+# upstream별 keep-alive 연결 풀 크기
+WIKIBOT_POOL_SIZE = int(os.getenv('WIKIBOT_POOL_SIZE', '20'))
+IRIS_POOL_SIZE = int(os.getenv('IRIS_POOL_SIZE', '4'))
+# 엔드포인트별 타임아웃(초). 가장 긴 prefix가 일치하는 값 사용
+HTTP_DEFAULT_TIMEOUT = 5
+WIKIBOT_TIMEOUTS = {
+    "/ask": 30,
+    "/api/trade/query": 30,
+    "/api/trade/cleanup": 30,
+    "/api/party/query": 10,
+    "/api/features/check": 3,
+}
+IRIS_TIMEOUTS = {
+    "/reply": 5,
+}
+
+
+# 서킷 브레이커: 최근 요청 창 크기 / 열리는 실패 비율 / 비율 판단 최소 요청 수 / 연속 실패 수
+BREAKER_WINDOW = 20
+BREAKER_FAILURE_RATIO = 0.5
+BREAKER_MIN_CALLS = 10
+BREAKER_CONSECUTIVE_FAILURES = 5
+# 열린 뒤 시험 요청까지 대기(초). 시험이 실패할 때마다 두 배, 최대 BREAKER_OPEN_MAX
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '15'))
+BREAKER_OPEN_MAX = 120
+# 적응형 타임아웃: 엔드포인트별 최근 응답 시간 p99 × 배수 (하한 ~ 설정 타임아웃 사이)
+ADAPTIVE_TIMEOUT_MULTIPLIER = 3
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv('ADAPTIVE_TIMEOUT_MIN', '1'))
+ADAPTIVE_TIMEOUT_SAMPLES = 200
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20
+# upstream별 브레이커 그룹 (가장 긴 prefix 일치, 없으면 default)
+WIKIBOT_BREAKER_GROUPS = {
+    "/ask": "ask",
+    "/api/trade": "trade",
+    "/api/party": "party",
+    "/api/nickname": "nickname",
+    "/api/features": "features",
+    "/api/rooms": "rooms",
+}
+IRIS_BREAKER_GROUPS = {
+    "/reply": "reply",
+}
+
+
+class CircuitOpenError(requests.RequestException):
+    """서킷이 열려 있어 요청을 보내지 않음. retry_in: 다음 시험 요청까지 남은 시간(초)"""
+
+    def __init__(self, message, retry_in=0.0):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """closed → (실패 누적) open → (대기 후) half_open 시험 요청 1건 → closed / open"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name):
+        self.name = name
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=BREAKER_WINDOW)  # True=성공
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._open_for = BREAKER_OPEN_SECONDS
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """(보내도 되는지, 시험 요청인지)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True, False
+            if self.state == self.OPEN and time.monotonic() >= self._opened_at + self._open_for:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True, True
+            self.rejected += 1
+            return False, False
+
+    def rejecting(self):
+        """지금 보내면 거절될지 (거절이면 차단 수에 더함. 시험 요청 기회는 쓰지 않음)"""
+        with self._lock:
+            if self.state == self.OPEN:
+                rejected = time.monotonic() < self._opened_at + self._open_for
+            else:
+                rejected = self.state == self.HALF_OPEN and self._probing
+            self.rejected += rejected
+            return rejected
+
+    def cancel(self, probe):
+        """결과를 알 수 없이 끝난 요청. 시험 요청이었으면 다음 요청이 다시 시험하게 함"""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def record(self, ok):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self._close()
+                else:
+                    self._open(min(BREAKER_OPEN_MAX, self._open_for * 2))
+                return
+            if self.state == self.OPEN:
+                return  # 열리기 전에 나간 요청의 늦은 결과
+            self._results.append(ok)
+            self._consecutive = 0 if ok else self._consecutive + 1
+            failures = self._results.count(False)
+            if (self._consecutive >= BREAKER_CONSECUTIVE_FAILURES
+                    or (len(self._results) >= BREAKER_MIN_CALLS
+                        and failures / len(self._results) >= BREAKER_FAILURE_RATIO)):
+                self._open(BREAKER_OPEN_SECONDS)
+
+    def _open(self, open_for):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._open_for = open_for
+        self.opened += 1
+        logger.warning(f"서킷 열림: {self.name} ({open_for:.0f}초 후 시험 요청)")
+
+    def _close(self):
+        if self.state != self.CLOSED:
+            logger.info(f"서킷 닫힘: {self.name}")
+        self.state = self.CLOSED
+        self._results.clear()
+        self._consecutive = 0
+        self._open_for = BREAKER_OPEN_SECONDS
+
+    def reset(self):
+        with self._lock:
+            self._probing = False
+            self._close()
+
+    def retry_in(self):
+        """다시 보내 볼 수 있을 때까지 남은 시간(초). 시험 요청 결과를 기다리는 중이면 1초"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return max(0.0, self._opened_at + self._open_for - time.monotonic())
+            return 1.0 if self.state == self.HALF_OPEN and self._probing else 0.0
+
+    def stats(self):
+        with self._lock:
+            result = {
+                "state": self.state,
+                "calls": len(self._results),
+                "failures": self._results.count(False),
+                "rejected": self.rejected,
+                "opened": self.opened,
+            }
+        if result["state"] == self.OPEN:
+            result["retry_in"] = round(self.retry_in(), 1)
+        return result
+
+
+class AdaptiveTimeout:
+    """엔드포인트 하나의 최근 응답 시간으로 타임아웃 계산"""
+
+    __slots__ = ("samples", "value", "pending")
+
+    def __init__(self, initial):
+        self.samples = deque(maxlen=ADAPTIVE_TIMEOUT_SAMPLES)
+        self.value = initial
+        self.pending = 0  # 마지막 계산 이후 추가된 표본 수
+
+    def observe(self, elapsed, ceiling):
+        self.samples.append(elapsed)
+        self.pending += 1
+        # 매번 정렬하지 않고 표본이 어느 정도 쌓일 때마다 다시 계산
+        if len(self.samples) >= ADAPTIVE_TIMEOUT_MIN_SAMPLES and self.pending >= ADAPTIVE_TIMEOUT_MIN_SAMPLES // 2:
+            self.pending = 0
+            ordered = sorted(self.samples)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            self.value = min(ceiling, max(ADAPTIVE_TIMEOUT_MIN, p99 * ADAPTIVE_TIMEOUT_MULTIPLIER))
+
+    def timed_out(self, ceiling):
+        """타임아웃 발생 → upstream이 느려졌을 수 있으니 늘림"""
+        self.value = min(ceiling, self.value * 2)
+
+    def p99(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+class HttpClient:
+    """upstream 하나에 대한 공유 HTTP 클라이언트 (keep-alive 연결 풀, 그룹별 서킷 브레이커, 적응형 타임아웃)"""
+
+    def __init__(self, name, base_url, pool_size, timeouts, groups):
+        self.name = name
+        self.base_url = base_url
+        self.timeouts = timeouts
+        self.groups = groups
+        self.breakers = {g: CircuitBreaker(f"{name}/{g}") for g in set(groups.values()) | {"default"}}
+        self._adaptive = {}  # endpoint 라벨 → AdaptiveTimeout
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session = requests.Session()
+        self._session.mount("http://", self._adapter)
+        self._session.mount("https://", self._adapter)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @staticmethod
+    def _longest_prefix(table, path, default):
+        best, value = -1, default
+        for prefix, v in table.items():
+            if path.startswith(prefix) and len(prefix) > best:
+                best, value = len(prefix), v
+        return value
+
+    def timeout_for(self, path):
+        """설정 타임아웃 (적응형 타임아웃의 상한)"""
+        return self._longest_prefix(self.timeouts, path, HTTP_DEFAULT_TIMEOUT)
+
+    def group_for(self, path):
+        return self._longest_prefix(self.groups, path, "default")
+
+    def _adaptive_for(self, endpoint, ceiling):
+        adaptive = self._adaptive.get(endpoint)
+        if adaptive is None:
+            with self._lock:
+                adaptive = self._adaptive.setdefault(endpoint, AdaptiveTimeout(ceiling))
+        return adaptive
+
+    def check_circuit(self, path):
+        """서킷이 열려 있으면 CircuitOpenError. 속도 제한 대기열에 넣기 전에 빨리 실패하려고 사용"""
+        breaker = self.breakers[self.group_for(path)]
+        if breaker.rejecting():
+            UPSTREAM_ERRORS.inc(self.name, metric_endpoint(path), "circuit_open")
+            raise CircuitOpenError(f"{breaker.name} 서킷 열림 → {path} 요청 생략", breaker.retry_in())
+
+    def request(self, method, path, timeout=None, deadline=None, **kwargs):
+        """deadline: 이벤트 시간 예산 (없으면 지금 스레드의 것). 타임아웃은 남은 예산을 넘지 않는다"""
+        endpoint = metric_endpoint(path)
+        deadline = deadline or current_deadline()
+        if deadline is not None:
+            try:
+                deadline.timeout(None, path)
+            except DeadlineExceeded:
+                UPSTREAM_ERRORS.inc(self.name, endpoint, "deadline")
+                raise
+        breaker = self.breakers[self.group_for(path)]
+        allowed, probe = breaker.allow()
+        if not allowed:
+            UPSTREAM_ERRORS.inc(self.name, endpoint, "circuit_open")
+            raise CircuitOpenError(f"{breaker.name} 서킷 열림 → {path} 요청 생략", breaker.retry_in())
+
+        ceiling = self.timeout_for(path)
+        adaptive = self._adaptive_for(endpoint, ceiling)
+        if timeout is None:
+            # 시험 요청은 설정 타임아웃 전체를 써서 느려진 upstream도 회복을 확인할 수 있게 함
+            timeout = ceiling if probe else adaptive.value
+        # 예산 때문에 줄인 타임아웃으로 끊긴 것은 upstream 탓이 아니므로 서킷·적응형 타임아웃에 반영하지 않음
+        budget_bound = False
+        if deadline is not None and deadline.remaining() < timeout:
+            timeout, budget_bound = deadline.remaining(), True
+        with self._lock:
+            self.requests += 1
+        UPSTREAM_IN_FLIGHT.inc(self.name)
+        started = time.monotonic()
+        try:
+            with tracer.span(f"{self.name} {method} {endpoint}"):
+                resp = self._session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+        except Exception as e:
+            if budget_bound and isinstance(e, requests.Timeout):
+                deadline.exceeded = True
+                breaker.cancel(probe)
+                UPSTREAM_ERRORS.inc(self.name, endpoint, "deadline")
+                raise DeadlineExceeded(f"시간 예산 초과 → {path} 응답 대기 중단") from e
+            with self._lock:
+                self.errors += 1
+            breaker.record(False)
+            if isinstance(e, requests.Timeout):
+                kind = "timeout"
+                adaptive.timed_out(ceiling)
+            elif isinstance(e, requests.ConnectionError):
+                kind = "connection"
+            else:
+                kind = "other"
+            UPSTREAM_ERRORS.inc(self.name, endpoint, kind)
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.dec(self.name)
+            elapsed = time.monotonic() - started
+            UPSTREAM_SECONDS.observe(elapsed, self.name, endpoint)
+        ok = resp.status_code < 500
+        breaker.record(ok)
+        if ok:
+            adaptive.observe(elapsed, ceiling)
+        else:
+            UPSTREAM_ERRORS.inc(self.name, endpoint, "http_5xx")
+        return resp
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def reset_breakers(self, group=None):
+        """서킷 강제 닫기. 닫은 그룹 목록 반환"""
+        names = [group] if group else list(self.breakers)
+        for g in names:
+            self.breakers[g].reset()
+        return names
+
+    def timeouts_snapshot(self):
+        """엔드포인트별 현재 타임아웃과 p99(초)"""
+        with self._lock:
+            items = list(self._adaptive.items())
+        return {ep: {"timeout": round(a.value, 2), "p99": round(a.p99(), 3) if a.samples else None}
+                for ep, a in items}
+
+    def stats(self):
+        """요청 수 / 새로 연 연결 수 / 재사용 횟수 / 서킷 상태"""
+        connections = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": connections,
+            "reused": max(0, self.requests - self.errors - connections),
+            "breakers": {g: b.stats() for g, b in self.breakers.items()},
+            "timeouts": self.timeouts_snapshot(),
+        }
+
+
+wikibot_http = HttpClient("wikibot", WIKIBOT_URL, WIKIBOT_POOL_SIZE, WIKIBOT_TIMEOUTS, WIKIBOT_BREAKER_GROUPS)
+iris_http = HttpClient("iris", IRIS_URL, IRIS_POOL_SIZE, IRIS_TIMEOUTS, IRIS_BREAKER_GROUPS)
 
 
 # ── 유틸리티 ──────────────────────────────────────────────
 
 def send_reply(chat_id, message):
-    """Iris를 통해 채팅방에 메시지 전송"""
+    """채팅방 메시지 전송 예약 (Iris 전송 큐, 기다리지 않음)"""
+    with tracer.span("send_reply"):
+        reply_queue.send(str(chat_id), message)
+
+
+def post_reply(chat_id, message):
+    """Iris를 통해 채팅방에 메시지 전송. 성공 여부 반환 (서킷이 열려 있으면 CircuitOpenError)"""
     try:
         payload = {"type": "text", "room": str(chat_id), "data": message}
-        resp = requests.post(f"{IRIS_URL}/reply", json=payload, timeout=5)
+        resp = iris_http.post("/reply", json=payload)
         logger.info(f"Reply → {chat_id}: {resp.status_code}")
+        return resp.status_code < 500
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.error(f"Reply 전송 오류: {e}")
+    return False
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "waiting")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+        self.waiting = deque()  # (future, fn, args)
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class TokenBucketLimiter:
+    """키별 토큰 버킷 속도 제한기.
+
+    submit()은 스레드를 재우지 않고 바로 Future를 돌려준다. 토큰이 있으면 즉시,
+    없으면 키별 대기열에 넣었다가 토큰이 보충되는 대로 executor에서 실행한다.
+    """
+
+    def __init__(self, executor, limits_for):
+        self._executor = executor
+        self._limits_for = limits_for  # key → (초당 보충량, 버스트)
+        self._buckets = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, key, fn, *args):
+        future = Future()
+        with self._cond:
+            now = time.monotonic()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst = self._limits_for(key)
+                bucket = self._buckets[key] = _Bucket(rate, burst, now)
+            bucket.refill(now)
+            if not bucket.waiting and bucket.tokens >= 1:
+                bucket.tokens -= 1
+                self._dispatch(future, fn, args)
+            else:
+                bucket.waiting.append((future, fn, args))
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="rate-limiter", daemon=True)
+                    self._thread.start()
+                self._cond.notify()
+        return future
+
+    def queued(self):
+        """토큰을 기다리는 작업 수"""
+        with self._cond:
+            return sum(len(b.waiting) for b in self._buckets.values())
+
+    def _dispatch(self, future, fn, args):
+        self._executor.submit(self._call, future, fn, args)
+
+    @staticmethod
+    def _call(future, fn, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _run(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                next_wake = None
+                for key, bucket in list(self._buckets.items()):
+                    bucket.refill(now)
+                    while bucket.waiting and bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        future, fn, args = bucket.waiting.popleft()
+                        self._dispatch(future, fn, args)
+                    if bucket.waiting:
+                        wait = (1 - bucket.tokens) / bucket.rate
+                        next_wake = wait if next_wake is None else min(next_wake, wait)
+                    elif bucket.tokens >= bucket.burst:
+                        # 가득 찬 유휴 버킷은 새로 만든 것과 같으므로 정리
+                        del self._buckets[key]
+                self._cond.wait(timeout=next_wake)
+
+
+class TTLCache:
+    """항목별 만료 시간이 있는 LRU 캐시. 크기는 값의 바이트 추정치 합으로 제한.
+    stale_for > 0이면 만료된 항목을 그만큼 더 보관해 get_stale로 꺼낼 수 있다.
+    shared(SharedView)가 있으면 로컬에 없는 항목을 공유 캐시에서 읽고, 저장은 양쪽에 한다"""
+
+    def __init__(self, max_bytes, stale_for=0, shared=None):
+        self.max_bytes = max_bytes
+        self.stale_for = stale_for
+        self.shared = shared
+        self._data = OrderedDict()  # key → (만료 시각, 크기, 값)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+
+    def get(self, key):
+        self._sync()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None and entry[0] + self.stale_for < time.monotonic():
+                self._remove(key)
+        value = self._get_shared(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.shared_hits += 1
+        return value
+
+    def get_stale(self, key):
+        """만료 여부와 관계없이 보관 중인 값 (보관 기간이 지났으면 None)"""
+        self._sync()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] + self.stale_for >= time.monotonic():
+                self.stale_hits += 1
+                return entry[2]
+            if entry is not None:
+                self._remove(key)
+        value = self._get_shared(key, stale=True)
+        if value is not None:
+            with self._lock:
+                self.stale_hits += 1
+        return value
+
+    def set(self, key, value, ttl, size):
+        if size > self.max_bytes:
+            return
+        self._set_local(key, value, ttl, size)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), value, ttl)
+
+    def _set_local(self, key, value, ttl, size):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        """전체 삭제 (공유 캐시 포함). 삭제한 항목 수 반환"""
+        if self.shared is not None:
+            self.shared.invalidate()
+        return self._clear_local()
+
+    def _clear_local(self):
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+            self._bytes = 0
+            return count
+
+    def _sync(self):
+        """다른 워커가 비웠으면 로컬 사본도 비움"""
+        if self.shared is not None and self.shared.changed():
+            self._clear_local()
+
+    @staticmethod
+    def _shared_key(key):
+        return json.dumps(key, ensure_ascii=False)
+
+    def _get_shared(self, key, stale=False):
+        """공유 캐시에서 읽어 로컬에도 저장. 없으면 None"""
+        if self.shared is None:
+            return None
+        row = self.shared.get(self._shared_key(key), self.stale_for if stale else 0)
+        if row is None:
+            return None
+        value, expires = row
+        size = len(json.dumps(value, ensure_ascii=False).encode())
+        if size <= self.max_bytes:
+            self._set_local(key, value, expires - time.time(), size)
+        return value
+
+    def _remove(self, key):
+        _expires, size, _value = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_hits": self.stale_hits,
+            "shared_hits": self.shared_hits,
+        }
 
 
-def ask_wikibot(endpoint, query="", max_length=500):
-    """wikibot 엔드포인트 호출"""
-    global last_request_time
-    try:
-        now = time.time()
-        wait = REQUEST_DELAY - (now - last_request_time)
-        if wait > 0:
+response_cache = TTLCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_STALE_FOR, shared_view("response"))
+
+
+class SingleFlight:
+    """같은 키의 호출이 진행 중이면 새로 호출하지 않고 그 Future를 함께 기다린다.
+
+    공유되는 Future이므로 호출 측에서 cancel()하면 안 된다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key → Future
+        self.saved = 0  # 합류로 아낀 upstream 호출 수
+
+    def do(self, key, start):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.saved += 1
+                return future
+            future = self._inflight[key] = start()
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        return {"inflight": len(self._inflight), "saved": self.saved}
+
+
+_wikibot_flight = SingleFlight()
+
+
+class ReplyQueue:
+    """채팅방별 순서를 지키는 Iris 전송 큐.
+
+    같은 방에 REPLY_COALESCE_WINDOW 안에 쌓인 메시지는 하나로 합쳐 보내고,
+    전송 속도는 IRIS_SEND_RATE/IRIS_SEND_BURST로 제한한다. 실패한 전송은
+    백오프 후 재시도하며, 그동안 같은 방의 뒤 메시지는 앞 메시지를 앞지르지 않는다.
+    Iris 서킷이 열려 있으면 재시도 횟수와 전송 토큰을 쓰지 않고 시험 요청이 가능해질 때까지 미룬다.
+    senders개 스레드가 서로 다른 방을 동시에 보내므로 느린 전송 하나가 다른 방을 막지 않는다
+    (한 방은 한 번에 한 스레드만 맡음).
+
+    shared(SharedCache)가 있으면(여러 워커) 전송 속도는 워커 전체 합으로 제한한다.
+    공유 버킷을 쓸 수 없을 때는 워커마다 rate / SERVER_WORKERS로 제한한다.
+    방별 순서는 이 워커가 받은 메시지끼리만 지켜진다.
+    """
+
+    def __init__(self, window, rate, burst, shared=None, senders=1):
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.shared = shared
+        self.senders = senders
+        local_rate = rate if shared is None else rate / max(1, SERVER_WORKERS)
+        self._bucket = _Bucket(local_rate, burst, time.monotonic())
+        self._bucket_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._rooms = {}  # chat_id → {"messages": [...], "ready_at": t, "attempts": n, "busy": bool}
+        self._threads = []
+        self.sent = 0
+        self.merged = 0
+        self.retries = 0
+        self.dropped = 0
+        self.deferred = 0
+
+    def send(self, chat_id, message):
+        with self._cond:
+            if not self._threads:
+                for i in range(self.senders):
+                    t = threading.Thread(target=self._run, name=f"reply-sender-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+            room = self._rooms.get(chat_id)
+            if room is None:
+                room = self._rooms[chat_id] = {
+                    "messages": [], "ready_at": time.monotonic() + self.window, "attempts": 0, "busy": False,
+                }
+            room["messages"].append(message)
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return sum(len(r["messages"]) for r in self._rooms.values())
+
+    def _next(self):
+        """보낼 차례가 된 방과 합친 메시지. 없으면 대기. 고른 방은 끝날 때까지 busy"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready = None
+                for chat_id, room in self._rooms.items():
+                    if room["busy"]:
+                        continue  # 다른 스레드가 보내는 중 (같은 방 순서 유지)
+                    if ready is None or room["ready_at"] < self._rooms[ready]["ready_at"]:
+                        ready = chat_id
+                if ready is not None and self._rooms[ready]["ready_at"] <= now:
+                    self._rooms[ready]["busy"] = True
+                    messages = self._rooms[ready]["messages"]
+                    count, length = 0, 0
+                    for m in messages:
+                        if count and length + len(m) > REPLY_MAX_CHARS:
+                            break
+                        count += 1
+                        length += len(m) + 2
+                    return ready, count, "\n\n".join(messages[:count])
+                timeout = None if ready is None else self._rooms[ready]["ready_at"] - now
+                self._cond.wait(timeout=timeout)
+
+    def _take_token(self):
+        """전송 토큰 1개를 얻을 때까지 대기. 어느 버킷에서 얻었는지 반환(shared=True)"""
+        while self.shared is not None:
+            wait = self.shared.take_token("iris_send", self.rate, self.burst)
+            if wait is None:
+                break  # 공유 버킷 오류 → 워커별 몫으로 제한
+            if not wait:
+                return True
+            time.sleep(wait)
+        while True:
+            with self._bucket_lock:
+                self._bucket.refill(time.monotonic())
+                if self._bucket.tokens >= 1:
+                    self._bucket.tokens -= 1
+                    return False
+                wait = (1 - self._bucket.tokens) / self._bucket.rate
             time.sleep(wait)
-        last_request_time = time.time()
 
-        resp = requests.post(
-            f"{WIKIBOT_URL}{endpoint}",
-            json={"query": query, "max_length": max_length},
-            timeout=30,
-        )
-        if resp.status_code == 200:
-            return resp.json()
+    def _refund_token(self, shared):
+        if shared:
+            self.shared.refund_token("iris_send", self.burst)
+        else:
+            with self._bucket_lock:
+                self._bucket.tokens = min(self._bucket.burst, self._bucket.tokens + 1)
+
+    def _defer(self, chat_id, e):
+        with self._cond:
+            self.deferred += 1
+            room = self._rooms[chat_id]
+            room["ready_at"] = time.monotonic() + max(e.retry_in, REPLY_RETRY_BASE)
+            room["busy"] = False
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            chat_id, count, text = self._next()
+            try:
+                # 서킷이 열려 있으면 토큰을 쓰기 전에 미룸 (장애 중에 전송 몫이 줄지 않게)
+                iris_http.check_circuit("/reply")
+                shared = self._take_token()
+            except CircuitOpenError as e:
+                self._defer(chat_id, e)
+                continue
+            try:
+                ok = post_reply(chat_id, text)
+            except CircuitOpenError as e:
+                self._refund_token(shared)  # 토큰을 기다리는 사이에 열림 → 보내지 않았으므로 돌려줌
+                self._defer(chat_id, e)
+                continue
+            with self._cond:
+                room = self._rooms[chat_id]
+                room["busy"] = False
+                self._cond.notify_all()
+                if ok or room["attempts"] >= REPLY_MAX_RETRIES:
+                    if ok:
+                        self.sent += 1
+                        self.merged += count - 1
+                    else:
+                        self.dropped += count
+                        logger.error(f"Reply 재시도 초과 → 버림 [{chat_id}] {count}건")
+                    del room["messages"][:count]
+                    room["attempts"] = 0
+                    if room["messages"]:
+                        room["ready_at"] = time.monotonic()
+                    else:
+                        del self._rooms[chat_id]
+                else:
+                    room["attempts"] += 1
+                    self.retries += 1
+                    room["ready_at"] = time.monotonic() + REPLY_RETRY_BASE * 2 ** (room["attempts"] - 1)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "rooms": len(self._rooms),
+                "queued": sum(len(r["messages"]) for r in self._rooms.values()),
+                "sent": self.sent,
+                "merged": self.merged,
+                "retries": self.retries,
+                "deferred": self.deferred,
+                "dropped": self.dropped,
+            }
+
+
+reply_queue = ReplyQueue(REPLY_COALESCE_WINDOW, IRIS_SEND_RATE, IRIS_SEND_BURST, shared_cache, REPLY_SENDERS)
+
+
+def _wikibot_limits(key):
+    endpoint, _room = key
+    return WIKIBOT_RATE_LIMITS.get(endpoint, (1.0 / REQUEST_DELAY, WIKIBOT_BURST))
+
+
+_wikibot_executor = ThreadPoolExecutor(max_workers=WIKIBOT_MAX_CONCURRENCY, thread_name_prefix="wikibot")
+_wikibot_limiter = TokenBucketLimiter(_wikibot_executor, _wikibot_limits)
+
+
+def _post_wikibot(endpoint, query, max_length):
+    # 여러 이벤트가 함께 기다리는 요청이므로 이벤트 예산이 아니라 엔드포인트 타임아웃만 적용
+    # (실행기 스레드에는 이벤트의 스레드 로컬 deadline도 없음)
+    resp = wikibot_http.post(
+        f"{endpoint}",
+        json={"query": query, "max_length": max_length},
+    )
+    if resp.status_code == 200:
+        return resp.json()
+    return None
+
+
+def _cache_response(cache_key, ttl, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if result is not None:
+        size = len(json.dumps(result, ensure_ascii=False).encode())
+        response_cache.set(cache_key, result, ttl, size)
+
+
+def _cache_key(endpoint, query, max_length):
+    return (endpoint, " ".join(query.split()).lower(), max_length)
+
+
+STALE_NOTE = "(서버 응답이 없어 이전에 조회한 결과입니다.)"
+
+
+def stale_response(endpoint, query="", max_length=500):
+    """만료됐지만 보관 중인 캐시 응답 (안내 문구 추가). 없으면 None"""
+    if not RESPONSE_CACHE_TTLS.get(endpoint):
+        return None
+    cached = response_cache.get_stale(_cache_key(endpoint, query, max_length))
+    if cached is None:
+        return None
+    result = dict(cached)
+    result["answer"] = f"{cached.get('answer', '')}\n\n{STALE_NOTE}".strip()
+    return result
+
+
+def ask_wikibot_async(endpoint, query="", max_length=500, room_id=None, deadline=None):
+    """wikibot 엔드포인트 호출 예약. 결과(dict 또는 None)를 담은 Future 반환.
+    deadline: 시간 예산 (없으면 지금 스레드에서 처리 중인 이벤트의 것). 예산이 이미 없으면
+    요청하지 않는다. 기다리는 시간은 호출 측이 future.result(timeout=...)로 제한한다"""
+    ttl = RESPONSE_CACHE_TTLS.get(endpoint)
+    cache_key = _cache_key(endpoint, query, max_length)
+    if ttl:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+    deadline = deadline or current_deadline()
+    try:
+        wikibot_http.check_circuit(endpoint)
+        if deadline is not None:
+            deadline.timeout(None, f"wikibot {endpoint}")
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+    # 같은 요청(캐시 키 기준)이 이미 진행 중이면 그 결과를 공유 (방 무관). 공유 요청은 어느
+    # 이벤트의 예산에도 묶이지 않고, 각 이벤트는 자기 예산만큼만 기다린다
+    key = (endpoint, room_id if RATE_LIMIT_PER_ROOM else None)
+    future = _wikibot_flight.do(
+        cache_key,
+        lambda: _wikibot_limiter.submit(key, _post_wikibot, endpoint, query, max_length),
+    )
+    if ttl:
+        future.add_done_callback(lambda f: _cache_response(cache_key, ttl, f))
+    return future
+
+
+def ask_wikibot(endpoint, query="", max_length=500, room_id=None):
+    """wikibot 엔드포인트 호출 (엔드포인트·방별 속도 제한). 실패하면 보관 중인 이전 응답.
+    이벤트 시간 예산을 다 썼고 이전 응답도 없으면 DeadlineExceeded"""
+    deadline = current_deadline()
+    try:
+        with tracer.span(f"wikibot {endpoint}"):
+            future = ask_wikibot_async(endpoint, query, max_length, room_id, deadline)
+            result = future.result(timeout=deadline.remaining() if deadline else None)
+        if result is not None:
+            return result
+    except (FutureTimeoutError, DeadlineExceeded):
+        pass  # 예산 초과 여부는 아래에서 이 이벤트의 deadline으로 판단
+    except CircuitOpenError as e:
+        logger.debug(f"wikibot 호출 생략: {e}")
     except Exception as e:
         logger.error(f"wikibot 통신 오류: {e}")
-    return None
+    stale = stale_response(endpoint, query, max_length)
+    if stale is None and deadline is not None and deadline.expired():
+        deadline.exceeded = True
+        raise DeadlineExceeded(f"시간 예산 초과 → wikibot {endpoint}")
+    return stale
 
 
 def format_search_result(result, sender):
@@ -80,19 +1568,18 @@ def format_search_result(result, sender):
     return response.strip()
 
 
-def check_feature_toggle(command, room_id):
-    """wikibot에 기능 토글 상태 확인. True=활성, False=비활성"""
+def fetch_feature_toggle(command, room_id):
+    """wikibot에 기능 토글 상태 조회. True=활성, False=비활성, None=조회 실패"""
     try:
-        resp = requests.post(
-            f"{WIKIBOT_URL}/api/features/check",
+        resp = wikibot_http.post(
+            "/api/features/check",
             json={"command": command, "room_id": room_id},
-            timeout=3,
         )
         if resp.status_code == 200:
             return resp.json().get("enabled", True)
     except Exception:
         pass
-    return True  # 오류 시 기본 활성
+    return None
 
 
 # 명령어 → 토글 키 매핑
@@ -109,548 +1596,2260 @@ COMMAND_TOGGLE_MAP = {
     "!통계": "!통계",
 }
 
+# 기능 토글 스냅샷 일괄 갱신 주기(초)
+FEATURE_REFRESH_INTERVAL = int(os.getenv('FEATURE_REFRESH_INTERVAL', '60'))
+# 공유 캐시(여러 워커)에서 만료 후에도 읽어 쓰는 시간(초)
+FEATURE_SHARED_KEEP = 3600
+
+
+class FeatureToggleSnapshot:
+    """방별 기능 토글 로컬 스냅샷.
+
+    명령 처리 시에는 dict만 조회하고, 최근에 쓰인 방의 토글 중 실제로 조회된 것만
+    백그라운드에서 주기적으로 갱신한다(한 주기 동안 쓰이지 않은 방은 비웠다가 다음에
+    쓰일 때 다시 읽음). wikibot이 /features/invalidate로 변경을 알리면 해당 항목을
+    바로 반영하거나 다시 읽는다. 조회 실패 시 기존 값 유지, 없으면 활성(기존 동작).
+    shared(SharedView)가 있으면 방별 토글을 워커끼리 공유한다. 통지로 받은 값은
+    공유 항목에 써 두고, 다른 워커는 세대 번호가 바뀌면 로컬 사본을 공유 항목으로 맞춘다.
+    """
+
+    def __init__(self, toggle_keys, interval, shared=None):
+        self.toggle_keys = sorted(set(toggle_keys))
+        self.interval = interval
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._rooms = {}  # room_id → {toggle_key: enabled}
+        self._used = {}  # room_id → 이번 주기에 조회된 toggle_key 집합
+        self._stale = set()  # 다음 갱신에서 먼저 읽을 room_id
+        self._wake = threading.Event()
+        self._thread = None
+        self.fetches = 0
+
+    def is_enabled(self, toggle_key, room_id):
+        if self.shared is not None and self.shared.changed():
+            self._sync_shared()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="feature-refresh", daemon=True)
+                self._thread.start()
+            self._used.setdefault(room_id, set()).add(toggle_key)
+            room = self._rooms.get(room_id)
+            if room is not None and toggle_key in room:
+                return room[toggle_key]
+
+        # 다른 워커가 읽어 둔 방
+        if self.shared is not None:
+            row = self.shared.get(room_id, FEATURE_SHARED_KEEP)
+            if row is not None and toggle_key in row[0]:
+                with self._lock:
+                    self._rooms.setdefault(room_id, {}).update(row[0])
+                return row[0][toggle_key]
+
+        # 처음 보는 토글: 이것만 바로 조회 (이후 갱신은 백그라운드)
+        enabled = self._fetch(toggle_key, room_id)
+        if enabled is None:
+            enabled = True
+        with self._lock:
+            room = self._rooms.setdefault(room_id, {})
+            room[toggle_key] = enabled
+            snapshot = dict(room)
+        if self.shared is not None:
+            self.shared.set(room_id, snapshot, self.interval)
+        return enabled
+
+    def _sync_shared(self):
+        """다른 워커의 통지 반영: 로컬 방을 공유 항목으로 맞추고, 공유 항목이 지워진 방만 다시 조회 예약"""
+        with self._lock:
+            rooms = list(self._rooms)
+        rows = {rid: self.shared.get(rid, FEATURE_SHARED_KEEP) for rid in rooms}
+        with self._lock:
+            for rid, row in rows.items():
+                if row is None:
+                    self._stale.add(rid)
+                elif rid in self._rooms:
+                    self._rooms[rid].update(row[0])
+        self._wake.set()
+
+    def invalidate(self, room_id=None, command=None, enabled=None):
+        """변경 통지 반영. enabled가 오면 바로 적용, 아니면 다시 조회 예약"""
+        pushed = bool(command) and isinstance(enabled, bool)
+        with self._lock:
+            rooms = [room_id] if room_id else list(self._rooms)
+            for rid in rooms:
+                if pushed:
+                    self._rooms.setdefault(rid, {})[command] = enabled
+                elif rid in self._rooms:  # 쓰이지 않는 방은 다음에 쓰일 때 읽음
+                    self._stale.add(rid)
+            snapshots = {rid: dict(self._rooms[rid]) for rid in rooms} if pushed else {}
+        if self.shared is not None:
+            if not pushed:
+                self.shared.invalidate(room_id)
+            else:
+                if room_id is None:
+                    self.shared.invalidate()  # 이 워커가 모르는 방의 공유 항목은 다시 읽게 함
+                # 받은 값을 공유 항목에 합쳐 두고 알림 → 다른 워커(와 자신)가 다시 조회하지 않음
+                for rid, snapshot in snapshots.items():
+                    row = self.shared.get(rid, FEATURE_SHARED_KEEP)
+                    merged = dict(row[0]) if row is not None else {}
+                    merged.update(snapshot)
+                    self.shared.set(rid, merged, self.interval)
+                if room_id is not None:
+                    self.shared.notify()
+        self._wake.set()
+
+    def refresh_room(self, room_id, keys, force=True):
+        """방의 토글(keys)을 다시 읽음. force=False면 다른 워커가 최근에 읽은 값을 그대로 씀"""
+        if not force and self.shared is not None:
+            row = self.shared.get(room_id)
+            if row is not None and all(key in row[0] for key in keys):
+                with self._lock:
+                    self._rooms.setdefault(room_id, {}).update(row[0])
+                return True
+        values = {}
+        for key in keys:
+            enabled = self._fetch(key, room_id)
+            if enabled is not None:
+                values[key] = enabled
+        with self._lock:
+            room = self._rooms.setdefault(room_id, {})
+            room.update(values)
+            snapshot = dict(room)
+        if self.shared is not None:
+            self.shared.set(room_id, snapshot, self.interval)
+        return len(values) == len(keys)
+
+    def _fetch(self, toggle_key, room_id):
+        self.fetches += 1
+        return fetch_feature_toggle(toggle_key, room_id)
+
+    def _run(self):
+        next_full = time.monotonic() + self.interval
+        while True:
+            self._wake.wait(timeout=max(0.0, next_full - time.monotonic()))
+            self._wake.clear()
+            full = time.monotonic() >= next_full
+            with self._lock:
+                stale = set(self._stale)
+                self._stale.clear()
+                if full:
+                    # 이번 주기에 쓰인 방·토글만 남기고 갱신, 나머지는 다음에 쓰일 때 다시 읽음
+                    used, self._used = self._used, {}
+                    for rid in list(self._rooms):
+                        keys = used.get(rid)
+                        if not keys and rid not in stale:
+                            del self._rooms[rid]
+                        elif keys:
+                            self._rooms[rid] = {k: v for k, v in self._rooms[rid].items() if k in keys}
+                    rooms = set(self._rooms) | stale
+                else:
+                    rooms = stale
+                jobs = [(rid, sorted(self._rooms.get(rid) or self.toggle_keys)) for rid in rooms]
+            for room_id, keys in jobs:
+                if not self.refresh_room(room_id, keys, force=room_id in stale):
+                    with self._lock:
+                        self._stale.add(room_id)
+            if full:
+                next_full = time.monotonic() + self.interval
+
+    def stats(self):
+        return {"rooms": len(self._rooms), "stale": len(self._stale), "fetches": self.fetches}
+
+
+feature_toggles = FeatureToggleSnapshot(COMMAND_TOGGLE_MAP.values(), FEATURE_REFRESH_INTERVAL,
+                                        shared_view("feature_toggle"))
+
 
-def multi_search(endpoint, query, sender):
-    """& 구분자로 여러 검색어 동시 검색"""
+def check_feature_toggle(command, room_id):
+    """기능 토글 상태 확인 (로컬 스냅샷). True=활성, False=비활성"""
+    return feature_toggles.is_enabled(command, room_id)
+
+# & 다중 검색: 최대 검색어 수 / 동시 실행 수 / 전체 마감 시간(초)
+MULTI_SEARCH_MAX_TERMS = 5
+MULTI_SEARCH_CONCURRENCY = int(os.getenv('MULTI_SEARCH_CONCURRENCY', '3'))
+MULTI_SEARCH_DEADLINE = float(os.getenv('MULTI_SEARCH_DEADLINE', '20'))
+
+
+def multi_search(endpoint, query, sender, room_id=None):
+    """& 구분자로 여러 검색어 동시 검색 (입력 순서대로, 전체 마감 시간 적용)"""
     queries = [q.strip() for q in query.split("&") if q.strip()]
     if len(queries) <= 1:
-        result = ask_wikibot(endpoint, query)
+        result = ask_wikibot(endpoint, query, room_id=room_id)
         return format_search_result(result, sender)
 
-    parts = []
-    for q in queries[:5]:
-        result = ask_wikibot(endpoint, q, max_length=300)
-        parts.append(f"【{q}】\n{format_search_result(result, sender)}")
-    return "\n\n".join(parts)
+    queries = queries[:MULTI_SEARCH_MAX_TERMS]
+    deadline = time.monotonic() + MULTI_SEARCH_DEADLINE
+    budget = current_deadline()
+    if budget is not None:
+        deadline = min(deadline, budget.expires_at - EVENT_BUDGET_MIN_CALL)
+    results = {}  # index → 결과 (완료된 것만)
+    running = {}  # future → index
+    next_index = 0
+
+    while True:
+        # 동시 실행 상한까지 하위 검색 시작
+        while next_index < len(queries) and len(running) < MULTI_SEARCH_CONCURRENCY:
+            future = ask_wikibot_async(endpoint, queries[next_index], max_length=300, room_id=room_id)
+            running[future] = next_index
+            next_index += 1
+        remaining = deadline - time.monotonic()
+        if not running or remaining <= 0:
+            break
+        with tracer.span(f"wikibot {endpoint} x{len(running)}"):
+            finished, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in finished:
+            index = running.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                if not isinstance(e, (CircuitOpenError, DeadlineExceeded)):
+                    logger.error(f"wikibot 통신 오류: {e}")
+                results[index] = None
+            if results[index] is None:
+                results[index] = stale_response(endpoint, queries[index], 300)
+
+    # 남은 검색은 취소하지 않음: 다른 방 요청과 공유 중일 수 있고, 늦게 끝나도 캐시에 남는다
+
+    parts = []
+    for i, q in enumerate(queries):
+        if i in results:
+            parts.append(f"【{q}】\n{format_search_result(results[i], sender)}")
+        else:
+            parts.append(f"【{q}】\n⏱ 시간 초과로 결과를 가져오지 못했습니다.")
+    return "\n\n".join(parts)
+
+
+# ── 로컬 검색 색인 ────────────────────────────────────────
+# game_data.json을 프로세스 안에서 BM25로 검색. 확실한 결과는 wikibot 없이 바로
+# 답하고, wikibot이 실패하면(오류·서킷 열림) 대신 답한다. 색인은 mmap으로 여는 파일로 두고
+# 원본이 바뀌었을 때만 다시 만든다. 원본이 없으면 색인 없이 기존처럼 동작.
+
+SEARCH_DATA_PATH = os.getenv(
+    'SEARCH_DATA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_data.json"))
+SEARCH_INDEX_PATH = os.getenv(
+    'SEARCH_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), ".search_index.bin"))
+# 바로 답할 기준: BM25 점수 하한 / 검색어 토큰 중 문서에 있는 비율 하한
+SEARCH_LOCAL_MIN_SCORE = float(os.getenv('SEARCH_LOCAL_MIN_SCORE', '4.0'))
+SEARCH_LOCAL_MIN_COVERAGE = float(os.getenv('SEARCH_LOCAL_MIN_COVERAGE', '0.6'))
+# wikibot 대신 답할 때의 BM25 점수 하한 / 일치 비율 하한
+# (흔한 단어 한두 개만 겹친 엉뚱한 문서로 답하지 않도록 점수도 함께 본다)
+SEARCH_FALLBACK_MIN_SCORE = float(os.getenv('SEARCH_FALLBACK_MIN_SCORE', '3.0'))
+SEARCH_FALLBACK_MIN_COVERAGE = float(os.getenv('SEARCH_FALLBACK_MIN_COVERAGE', '0.3'))
+SEARCH_ANSWER_MAX_CHARS = 500
+
+SEARCH_BM25_K1 = 1.2
+SEARCH_BM25_B = 0.75
+SEARCH_TITLE_WEIGHT = 2  # 제목 토큰은 본문보다 이만큼 더 센다
+SEARCH_TOKEN_RE = re.compile(r"[가-힣]+|[a-z0-9]+")
+SEARCH_INDEX_MAGIC = b"SIX2"
+# magic, 문서 수, 단어 수, 게시 목록 길이, 평균 문서 길이, 메타데이터(JSON) 길이
+SEARCH_INDEX_HEADER = struct.Struct("<4sIIIdI")
+
+
+def search_tokens(text):
+    """한글은 글자 2-gram, 영문·숫자는 단어 단위 토큰"""
+    tokens = []
+    for word in SEARCH_TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if len(word) > 1 and "가" <= word[0] <= "힣":
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def build_search_index(docs, path, source_hash=""):
+    """문서 목록으로 색인 파일 작성.
+
+    파일 구성: 헤더 | 메타데이터 JSON(문서 id·제목, 정렬된 단어 목록) | 4바이트 정렬 |
+    uint32 단어별 게시 목록 시작 위치[단어 수+1] | uint32 문서 번호[게시 수] |
+    uint32 문서 길이[문서 수] | uint16 단어 빈도[게시 수] | 4바이트 정렬 |
+    uint32 본문 시작 위치[문서 수+1] | UTF-8 본문 (본문은 여기에만 두고 필요할 때 읽음)
+    """
+    postings = {}
+    lengths = array("I")
+    for n, doc in enumerate(docs):
+        tokens = search_tokens(doc.get("title", "")) * SEARCH_TITLE_WEIGHT + search_tokens(doc.get("content", ""))
+        lengths.append(len(tokens))
+        counts = {}
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        for tok, tf in counts.items():
+            postings.setdefault(tok, []).append((n, min(tf, 0xFFFF)))
+
+    terms = sorted(postings)
+    offsets, doc_ids, freqs = array("I", [0]), array("I"), array("H")
+    for term in terms:
+        for n, tf in postings[term]:
+            doc_ids.append(n)
+            freqs.append(tf)
+        offsets.append(len(doc_ids))
+
+    bodies = [d.get("content", "").encode() for d in docs]
+    text_offsets = array("I", [0])
+    for body in bodies:
+        text_offsets.append(text_offsets[-1] + len(body))
+
+    meta = json.dumps({
+        "source_hash": source_hash,
+        "docs": [{"id": d.get("id"), "title": d.get("title", "")} for d in docs],
+        "terms": terms,
+    }, ensure_ascii=False).encode()
+    total = sum(lengths)
+    avgdl = total / len(lengths) if total else 1.0  # 문서가 없거나 모두 토큰이 없을 때 0으로 나누지 않게
+    header = SEARCH_INDEX_HEADER.pack(SEARCH_INDEX_MAGIC, len(docs), len(terms), len(doc_ids), avgdl, len(meta))
+    pad = -(len(header) + len(meta)) % 4
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(meta)
+        f.write(b"\0" * pad)
+        for arr in (offsets, doc_ids, lengths, freqs):
+            if sys.byteorder != "little":
+                arr.byteswap()
+            f.write(arr.tobytes())
+        f.write(b"\0" * (len(freqs) * 2 % 4))
+        if sys.byteorder != "little":
+            text_offsets.byteswap()
+        f.write(text_offsets.tobytes())
+        for body in bodies:
+            f.write(body)
+    os.replace(tmp, path)
+
+
+class SearchIndex:
+    """mmap으로 연 BM25 색인. 처음 검색할 때 열고, 원본이 바뀌었으면 다시 만든다"""
+
+    def __init__(self, data_path, index_path):
+        self.data_path = data_path
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._mmap = None
+        self.docs = []  # [{"id", "title"}] (본문은 색인 파일에서 읽음)
+        self.terms = {}
+        self.avgdl = 1.0
+        self.build_ms = 0.0
+        self.queries = 0
+        self.answered = 0
+        self.fallbacks = 0
+
+    def _source_hash(self):
+        with open(self.data_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _open(self, path):
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_docs, n_terms, n_postings, avgdl, meta_len = SEARCH_INDEX_HEADER.unpack_from(mm, 0)
+        if magic != SEARCH_INDEX_MAGIC:
+            mm.close()
+            raise ValueError("색인 파일 형식이 아닙니다")
+        pos = SEARCH_INDEX_HEADER.size
+        meta = json.loads(mm[pos:pos + meta_len].decode())
+        pos += meta_len + (-(pos + meta_len) % 4)
+        view = memoryview(mm)
+        sections = {}
+        for name, fmt, count in (("offsets", "I", n_terms + 1), ("doc_ids", "I", n_postings),
+                                 ("lengths", "I", n_docs), ("freqs", "H", n_postings),
+                                 ("text_offsets", "I", n_docs + 1)):
+            pos += -pos % 4
+            size = count * (4 if fmt == "I" else 2)
+            sections[name] = view[pos:pos + size].cast(fmt)
+            pos += size
+        sections["texts"] = pos
+        return mm, meta, avgdl, sections
+
+    def load(self):
+        """색인 열기 (원본 해시가 다르면 다시 만들기). 원본이 없으면 빈 색인"""
+        if not os.path.exists(self.data_path):
+            logger.info(f"로컬 검색 색인 비활성: {self.data_path} 없음")
+            self._loaded = True
+            return
+        source_hash = self._source_hash()
+        opened = None
+        if os.path.exists(self.index_path):
+            try:
+                opened = self._open(self.index_path)
+                if opened[1].get("source_hash") != source_hash:
+                    opened = None
+            except Exception as e:
+                logger.warning(f"로컬 검색 색인 읽기 실패, 다시 만듦: {e}")
+                opened = None
+        if opened is None:
+            started = time.monotonic()
+            with open(self.data_path, encoding="utf-8") as f:
+                docs = json.load(f)
+            build_search_index(docs, self.index_path, source_hash)
+            self.build_ms = (time.monotonic() - started) * 1000
+            opened = self._open(self.index_path)
+            logger.info(f"로컬 검색 색인 생성: 문서 {len(docs)}개, {self.build_ms:.1f}ms")
+        self._mmap, meta, avgdl, sections = opened
+        self.avgdl = avgdl or 1.0
+        self.docs = meta["docs"]
+        self.terms = {term: n for n, term in enumerate(meta["terms"])}
+        self._offsets = sections["offsets"]
+        self._doc_ids = sections["doc_ids"]
+        self._lengths = sections["lengths"]
+        self._freqs = sections["freqs"]
+        self._text_offsets = sections["text_offsets"]
+        self._texts = sections["texts"]
+        self._loaded = True
+
+    def document(self, n):
+        """n번 문서: {"id", "title", "content"}"""
+        start, end = self._texts + self._text_offsets[n], self._texts + self._text_offsets[n + 1]
+        return dict(self.docs[n], content=self._mmap[start:end].decode())
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                try:
+                    self.load()
+                except Exception as e:
+                    logger.error(f"로컬 검색 색인 오류: {e}")
+                    self._loaded = True
+
+    def search(self, query, limit=3):
+        """BM25 상위 문서 → [(점수, 문서, 검색어 토큰 일치 비율)]"""
+        self._ensure_loaded()
+        if not self.docs:
+            return []
+        query_terms = set(search_tokens(query))
+        if not query_terms:
+            return []
+        n_docs = len(self.docs)
+        scores = {}
+        matched = {}
+        for term in query_terms:
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            start, end = self._offsets[t], self._offsets[t + 1]
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for p in range(start, end):
+                n = self._doc_ids[p]
+                tf = self._freqs[p]
+                norm = SEARCH_BM25_K1 * (1 - SEARCH_BM25_B + SEARCH_BM25_B * self._lengths[n] / self.avgdl)
+                scores[n] = scores.get(n, 0.0) + idf * tf * (SEARCH_BM25_K1 + 1) / (tf + norm)
+                matched[n] = matched.get(n, 0) + 1
+        ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [(scores[n], self.document(n), matched[n] / len(query_terms)) for n in ranked]
+
+    def best(self, query):
+        """(대체 응답으로 쓸 만한 최고 결과 또는 None, 바로 답해도 되는지)"""
+        self.count("queries")
+        hits = self.search(query, limit=1)
+        if not hits:
+            return None, False
+        score, doc, coverage = hits[0]
+        if score < SEARCH_FALLBACK_MIN_SCORE or coverage < SEARCH_FALLBACK_MIN_COVERAGE:
+            return None, False
+        return doc, score >= SEARCH_LOCAL_MIN_SCORE and coverage >= SEARCH_LOCAL_MIN_COVERAGE
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        return {
+            "docs": len(self.docs),
+            "terms": len(self.terms),
+            "build_ms": round(self.build_ms, 1),
+            "queries": self.queries,
+            "answered": self.answered,
+            "fallbacks": self.fallbacks,
+        }
+
+
+search_index = SearchIndex(SEARCH_DATA_PATH, SEARCH_INDEX_PATH)
+
+
+def format_local_result(doc, fallback=False):
+    """로컬 검색 결과를 메시지로 포맷"""
+    content = doc.get("content", "")
+    if len(content) > SEARCH_ANSWER_MAX_CHARS:
+        content = content[:SEARCH_ANSWER_MAX_CHARS].rstrip() + "…"
+    response = f"📖 {doc.get('title', '')}\n{content}"
+    if fallback:
+        response += "\n\n(검색 서버 응답이 없어 내장 자료로 답변했습니다.)"
+    return response
+
+
+# ── 닉네임/입퇴장 ────────────────────────────────────────
+
+# 닉네임 캐시: 최대 항목 수 / 저장 파일(비우면 메모리만) / 저장 주기(초)
+NICKNAME_CACHE_SIZE = int(os.getenv('NICKNAME_CACHE_SIZE', '50000'))
+NICKNAME_CACHE_FILE = os.getenv('NICKNAME_CACHE_FILE', '')
+NICKNAME_CACHE_SAVE_INTERVAL = 60
+
+
+class NicknameCache:
+    """(user_id, room_id) → 마지막으로 본 발신자 이름 (LRU, 선택적으로 파일 저장)"""
+
+    def __init__(self, max_entries, path):
+        self.max_entries = max_entries
+        self.path = path
+        self._lock = threading.Lock()
+        self._names = None  # 첫 사용 시 파일에서 읽음
+        self._dirty = False
+        self._thread = None
+        self.skipped = 0
+        self.checked = 0
+
+    def _ensure_loaded(self):
+        if self._names is not None:
+            return
+        self._names = OrderedDict()
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for user_id, room_id, name in json.load(f)[-self.max_entries:]:
+                        self._names[(user_id, room_id)] = name
+            except Exception as e:
+                logger.error(f"닉네임 캐시 로드 오류: {e}")
+        if self.path:
+            self._thread = threading.Thread(target=self._save_loop, name="nickname-cache-save", daemon=True)
+            self._thread.start()
+
+    def unchanged(self, user_id, room_id, name):
+        """마지막으로 본 이름과 같으면 True (wikibot 호출 불필요)"""
+        with self._lock:
+            self._ensure_loaded()
+            key = (user_id, room_id)
+            if self._names.get(key) == name:
+                self._names.move_to_end(key)
+                self.skipped += 1
+                return True
+            self.checked += 1
+            return False
+
+    def remember(self, user_id, room_id, name):
+        with self._lock:
+            self._ensure_loaded()
+            key = (user_id, room_id)
+            self._names[key] = name
+            self._names.move_to_end(key)
+            while len(self._names) > self.max_entries:
+                self._names.popitem(last=False)
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [[u, r, n] for (u, r), n in self._names.items()]
+            self._dirty = False
+        tmp = f"{self.path}.{os.getpid()}.tmp"  # 워커 프로세스마다 따로 쓴 뒤 교체
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _save_loop(self):
+        while True:
+            time.sleep(NICKNAME_CACHE_SAVE_INTERVAL)
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"닉네임 캐시 저장 오류: {e}")
+
+    def stats(self):
+        return {
+            "entries": len(self._names or ()),
+            "skipped": self.skipped,
+            "checked": self.checked,
+        }
+
+
+nickname_cache = NicknameCache(NICKNAME_CACHE_SIZE, NICKNAME_CACHE_FILE)
+
+
+def check_nickname(sender_name, sender_id, room_id):
+    """wikibot 닉네임 변경 체크 (마지막으로 본 이름과 같으면 호출 생략)"""
+    if nickname_cache.unchanged(sender_id, room_id, sender_name):
+        return ""
+    try:
+        resp = wikibot_http.post(
+            "/api/nickname/check",
+            json={"sender_name": sender_name, "sender_id": sender_id, "room_id": room_id},
+        )
+        data = resp.json()
+        if resp.status_code == 200:
+            nickname_cache.remember(sender_id, room_id, sender_name)
+        if data.get("success") and data.get("notification"):
+            return data["notification"]
+    except Exception as e:
+        logger.error(f"닉네임 체크 오류: {e}")
+    return ""
+
+
+def log_member_event(user_id, nickname, room_id, event_type):
+    """wikibot 입퇴장 이벤트 기록"""
+    try:
+        resp = wikibot_http.post(
+            "/api/nickname/member-event",
+            json={"user_id": user_id, "nickname": nickname, "room_id": room_id, "event_type": event_type},
+        )
+        data = resp.json()
+        if data.get("success") and data.get("notification"):
+            return data["notification"]
+    except Exception as e:
+        logger.error(f"입퇴장 이벤트 오류: {e}")
+    return ""
+
+
+# ── 거래 가격 ────────────────────────────────────────────
+
+# 방 설정 캐시: 항목별 만료(초) / upstream 오류 시 재시도 백오프(초)
+ROOM_CACHE_TTL = 300  # 5분
+ROOM_CACHE_BACKOFF_BASE = 5
+ROOM_CACHE_BACKOFF_MAX = 300
+# 만료가 이 시간(초) 안으로 남은 방은 갱신할 때 같은 bulk 요청에 함께 담는다
+ROOM_CACHE_PREFETCH = 60
+# 공유 캐시(여러 워커)에서 만료 후에도 읽어 쓰는 시간(초). 읽은 뒤 백그라운드에서 갱신
+ROOM_CACHE_SHARED_KEEP = 3600
+# 설정을 알 수 없는 방(wikibot 오류)의 메시지를 다시 처리할 간격(초) / 최대 횟수
+ROOM_UNKNOWN_RETRY_DELAY = float(os.getenv('ROOM_UNKNOWN_RETRY_DELAY', '10'))
+ROOM_UNKNOWN_MAX_RETRIES = int(os.getenv('ROOM_UNKNOWN_MAX_RETRIES', '30'))
+
+
+class RoomConfigStore:
+    """거래방·파티방 설정을 함께 보관하는 방 설정 캐시.
+
+    - 항목마다 만료 시각을 따로 두어 한꺼번에 비워지지 않는다.
+    - 만료된 항목은 기존 값을 그대로 돌려주고 백그라운드에서 갱신한다.
+    - 갱신은 만료(임박)된 방을 모아 한 번의 bulk 요청(/api/rooms/config)으로 처리한다.
+      wikibot이 bulk API를 지원하지 않으면(404) 방별 room-check로 대체한다.
+    - upstream 오류 시 지터를 섞은 지수 백오프 동안 다시 요청하지 않는다.
+    - shared(SharedView)가 있으면 조회 결과를 워커끼리 공유한다. 로컬에 없는 방은
+      공유 캐시에서 먼저 찾고, 다른 워커가 이미 갱신한 방은 다시 조회하지 않는다.
+    """
+
+    def __init__(self, ttl, shared=None):
+        self.ttl = ttl
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._entries = {}  # chat_id → {"trade": room|None, "party": room|None, "expires": t}
+        self._refresh = set()
+        self._wake = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._retry_at = 0
+        self._bulk_retry_at = 0  # bulk API 미지원 시 다시 시도할 시각
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, chat_id):
+        """방 설정 반환: {"trade": ..., "party": ...}. 처음 보는 방을 조회하지 못하면 "unknown": True"""
+        if self.shared is not None and self.shared.changed():
+            with self._lock:
+                self._entries.clear()  # 다른 워커가 설정을 바꿈
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is not None:
+                if entry["expires"] > now:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    self._schedule(chat_id)
+                return entry
+            backing_off = now < self._retry_at
+
+        # 다른 워커가 조회해 둔 방
+        if self.shared is not None and not self._adopt_shared([chat_id], stale=True):
+            with self._lock:
+                self.hits += 1
+                entry = self._entries[chat_id]
+                if entry["expires"] <= now:
+                    self._schedule(chat_id)
+                return entry
+        with self._lock:
+            self.misses += 1
+
+        # 처음 보는 방은 바로 조회. 설정을 모르면 메시지를 분류할 수 없으므로 이벤트 예산과
+        # 관계없이 끝까지 기다린다(엔드포인트 타임아웃). 백오프 중이거나 실패하면 "알 수 없음"
+        if not backing_off:
+            deadline = current_deadline()
+            set_deadline(None)
+            try:
+                self._load([chat_id])
+            finally:
+                set_deadline(deadline)
+        with self._lock:
+            return self._entries.get(chat_id) or {"trade": None, "party": None, "unknown": True}
+
+    def invalidate(self, chat_id=None):
+        """설정 변경 후 호출. 다음 메시지에서 다시 조회한다 (다른 워커 포함)"""
+        with self._lock:
+            if chat_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(chat_id, None)
+        if self.shared is not None:
+            self.shared.invalidate(chat_id)
+
+    def _adopt_shared(self, chat_ids, stale=False):
+        """공유 캐시에 있는 방을 로컬에 반영. 공유 캐시에도 없는(stale=False면 만료된) 방 목록 반환"""
+        missing = []
+        for chat_id in chat_ids:
+            row = self.shared.get(chat_id, ROOM_CACHE_SHARED_KEEP if stale else 0)
+            if row is None:
+                missing.append(chat_id)
+                continue
+            config, expires = row
+            with self._lock:
+                self._entries[chat_id] = {
+                    "trade": config.get("trade"),
+                    "party": config.get("party"),
+                    "expires": time.monotonic() + expires - time.time(),
+                }
+        return missing
+
+    def _schedule(self, chat_id):
+        self._refresh.add(chat_id)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="room-config-refresh", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            with self._lock:
+                horizon = time.monotonic() + ROOM_CACHE_PREFETCH
+                rooms = self._refresh | {cid for cid, e in self._entries.items() if e["expires"] < horizon}
+                self._refresh = set()
+            if rooms and self.shared is not None:
+                # 다른 워커가 이미 갱신한 방은 공유 캐시 값을 그대로 씀
+                self._adopt_shared(sorted(rooms))
+                with self._lock:
+                    rooms = {cid for cid in rooms if cid not in self._entries or self._entries[cid]["expires"] < horizon}
+            if rooms and not self._load(sorted(rooms)):
+                with self._lock:
+                    self._refresh |= rooms
+                self._wake.set()
+
+    def _load(self, chat_ids):
+        """설정 조회 후 저장. 성공 여부 반환"""
+        try:
+            configs = self._fetch(chat_ids)
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+                delay = min(ROOM_CACHE_BACKOFF_MAX, ROOM_CACHE_BACKOFF_BASE * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + random.uniform(0.5, 1.0) * delay
+            logger.warning(f"방 설정 조회 실패 ({len(chat_ids)}개 방, {self._failures}회 연속): {e}")
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            self._failures = 0
+            self._retry_at = 0
+            for chat_id in chat_ids:
+                config = configs.get(chat_id) or {}
+                self._entries[chat_id] = {
+                    "trade": config.get("trade"),
+                    "party": config.get("party"),
+                    # 만료 시각을 흩어 같은 시점에 몰리지 않게 함
+                    "expires": now + self.ttl * random.uniform(0.9, 1.1),
+                }
+            fresh = [(cid, self._entries[cid]) for cid in chat_ids]
+        if self.shared is not None:
+            for chat_id, entry in fresh:
+                self.shared.set(chat_id, {"trade": entry["trade"], "party": entry["party"]},
+                                entry["expires"] - now)
+        return True
+
+    def _fetch(self, chat_ids):
+        if time.monotonic() >= self._bulk_retry_at:
+            resp = wikibot_http.post("/api/rooms/config", json={"room_ids": chat_ids})
+            if resp.status_code != 404:
+                data = resp.json()
+                if not data.get("success"):
+                    raise RuntimeError(data.get("message", "bulk 조회 실패"))
+                return data.get("rooms") or {}
+            self._bulk_retry_at = time.monotonic() + 3600
+
+        configs = {}
+        for chat_id in chat_ids:
+            configs[chat_id] = {
+                "trade": self._room_check("/api/trade/room-check", chat_id),
+                "party": self._room_check("/api/party/room-check", chat_id),
+            }
+        return configs
+
+    @staticmethod
+    def _room_check(path, chat_id):
+        data = wikibot_http.post(path, json={"room_id": chat_id}).json()
+        if not data.get("success"):
+            raise RuntimeError(data.get("message", "room-check 실패"))
+        return data.get("room")
+
+    def stats(self):
+        return {
+            "rooms": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "failures": self._failures,
+        }
+
+
+room_configs = RoomConfigStore(ROOM_CACHE_TTL, shared_view("room_config"))
+
+
+def check_trade_room(chat_id):
+    """거래방 설정 조회 (캐시). 반환: {'collect': bool} 또는 None"""
+    return room_configs.get(chat_id)["trade"]
+
+
+def check_party_room(chat_id):
+    """파티방 설정 조회 (캐시). 반환: {'collect': bool} 또는 None"""
+    return room_configs.get(chat_id)["party"]
+
+
+# 수집 메시지 배치 전송: 배치 크기 / 최대 대기 시간(초)
+COLLECT_BATCH_SIZE = int(os.getenv('COLLECT_BATCH_SIZE', '50'))
+COLLECT_FLUSH_INTERVAL = float(os.getenv('COLLECT_FLUSH_INTERVAL', '2'))
+# 수집 종류 → 단건 엔드포인트 (bulk 엔드포인트는 뒤에 /bulk)
+COLLECT_ENDPOINTS = {
+    "trade": "/api/trade/collect",
+    "party": "/api/party/collect",
+}
+# 수집 스풀 (wikibot 재시작 중에도 메시지를 잃지 않도록 먼저 디스크에 기록)
+COLLECT_SPOOL_PATH = os.getenv(
+    'COLLECT_SPOOL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".collect_spool.db"),
+)
+COLLECT_REPLAY_RATE = float(os.getenv('COLLECT_REPLAY_RATE', '5'))  # 초당 최대 전송 배치 수
+COLLECT_RETRY_BASE = 2  # 전송 실패 시 재시도 백오프(초)
+COLLECT_RETRY_MAX = 60
+
+
+class CollectSpool:
+    """수집 메시지 append-only 로컬 스풀 (SQLite WAL). 프로세스 재시작 후에도 유지된다."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS spool_kind ON spool (kind, id)")
+            self._db = db
+        return self._db
+
+    def append(self, kind, item):
+        payload = json.dumps(item, ensure_ascii=False)
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO spool (kind, payload, created) VALUES (?, ?, ?)",
+                (kind, payload, time.time()),
+            )
+
+    def peek(self, kind, limit):
+        """가장 오래된 메시지부터 최대 limit개: ([id], [item])"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, payload FROM spool WHERE kind = ? ORDER BY id LIMIT ?",
+                (kind, limit),
+            ).fetchall()
+        return [r[0] for r in rows], [json.loads(r[1]) for r in rows]
+
+    def oldest(self, kind):
+        """가장 오래된 메시지의 기록 시각 (없으면 None)"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT created FROM spool WHERE kind = ? ORDER BY id LIMIT 1", (kind,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, ids):
+        with self._lock:
+            self._connect().executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+
+    def depth(self):
+        with self._lock:
+            rows = self._connect().execute("SELECT kind, COUNT(*) FROM spool GROUP BY kind").fetchall()
+        return dict(rows)
+
+
+def _route_missing(resp):
+    """엔드포인트 자체가 없는 404인지. 처리 함수가 JSON으로 돌려준 404(알 수 없는 종류 등)는 아님"""
+    if resp.status_code != 404:
+        return False
+    try:
+        body = resp.json()
+    except ValueError:
+        return True  # Flask 등의 기본 HTML 404
+    return body == {"detail": "Not Found"}  # FastAPI 기본 404
+
+
+class CollectBatcher:
+    """거래/파티 수집 메시지를 스풀에 기록한 뒤 종류별 배치로 bulk 엔드포인트에 전송.
+
+    스풀에 COLLECT_BATCH_SIZE개가 쌓이거나 가장 오래된 메시지가 COLLECT_FLUSH_INTERVAL을
+    넘기면 {"items": [...]}로 보내고, 전달된 것만 스풀에서 지운다. 전송에 실패하면
+    백오프 후 나머지만 다시 보내며, 밀린 스풀은 COLLECT_REPLAY_RATE 속도로 재전송한다.
+    wikibot에 bulk 엔드포인트 자체가 없으면(경로 404) 단건 엔드포인트로 하나씩 보낸다.
+    여러 워커 프로세스가 같은 스풀에 기록하면 파일 잠금을 얻은 한 프로세스만 재전송한다.
+    """
+
+    def __init__(self, spool, endpoints, batch_size, interval):
+        self.spool = spool
+        self.endpoints = endpoints
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._depth = None  # kind → 스풀 대기 건수 (시작 시 스풀에서 읽음)
+        self._wake = threading.Event()
+        self._thread = None
+        self.leader = False  # 이 프로세스가 재전송을 맡고 있는지
+        self._failures = 0
+        self._retry_at = 0
+        self._sent = deque()  # 최근 60초 전송 기록 (시각, 건수)
+        self._stats = {kind: {"batches": 0, "items": 0, "max_batch": 0, "failed_batches": 0,
+                              "flush_ms_total": 0.0, "flush_ms_max": 0.0} for kind in endpoints}
+
+    def start(self):
+        """재전송 스레드 시작 (이전 실행에서 남은 스풀도 전송)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._depth = {kind: 0 for kind in self.endpoints}
+            self._depth.update(self.spool.depth())
+            self._thread = threading.Thread(target=self._run, name="collect-replay", daemon=True)
+            self._thread.start()
+
+    def add(self, kind, item):
+        self.start()
+        self.spool.append(kind, item)
+        with self._lock:
+            # 재전송 담당이 아니어도 센다 (담당이 되는 순간 스풀을 다시 읽는 것과 겹쳐도 빠지지 않게)
+            self._depth[kind] += 1
+            if self._depth[kind] >= self.batch_size:
+                self._wake.set()
+
+    def _reload_depth(self):
+        depth = self.spool.depth()
+        with self._lock:
+            self._depth = {kind: depth.get(kind, 0) for kind in self.endpoints}
+
+    def _run(self):
+        # 잠금을 얻을 때까지 대기 (재전송하던 워커가 끝나면 이어받음)
+        acquire_process_lock("collect_replay", blocking=True)
+        self._reload_depth()
+        with self._lock:
+            self.leader = True
+        if SERVER_WORKERS > 1:
+            logger.info(f"수집 스풀 재전송 담당: pid {os.getpid()}")
+        while True:
+            self._wake.wait(timeout=self._next_wait())
+            self._wake.clear()
+            self._reload_depth()  # 다른 워커가 기록한 것과 세는 중에 끼어든 add() 포함
+            for kind in self.endpoints:
+                while time.monotonic() >= self._retry_at and self._due(kind):
+                    ids, items = self.spool.peek(kind, self.batch_size)
+                    if not items:
+                        break
+                    sent = self._flush(kind, items)
+                    if sent:
+                        self.spool.delete(ids[:sent])
+                        with self._lock:
+                            self._depth[kind] -= sent
+                    if sent < len(items):
+                        # 전달된 앞부분만 지웠으므로 재시도 때 나머지만 다시 보냄
+                        self._failures += 1
+                        delay = min(COLLECT_RETRY_MAX, COLLECT_RETRY_BASE * 2 ** (self._failures - 1))
+                        self._retry_at = time.monotonic() + random.uniform(0.5, 1.0) * delay
+                        break
+                    self._failures = 0
+                    time.sleep(1.0 / COLLECT_REPLAY_RATE)
+
+    def _due(self, kind):
+        with self._lock:
+            depth = self._depth[kind]
+        if depth <= 0:
+            return False
+        if depth >= self.batch_size:
+            return True
+        oldest = self.spool.oldest(kind)
+        return oldest is not None and time.time() - oldest >= self.interval
+
+    def _next_wait(self):
+        if self._retry_at > time.monotonic():
+            return self._retry_at - time.monotonic()
+        waits = []
+        for kind in self.endpoints:
+            oldest = self.spool.oldest(kind)
+            if oldest is not None:
+                waits.append(oldest + self.interval - time.time())
+        return max(0.0, min(waits)) if waits else self.interval
+
+    def _flush(self, kind, items):
+        """배치 전송 후 통계 기록. 전달된 건수(앞에서부터) 반환"""
+        started = time.monotonic()
+        sent = self.send(kind, items)
+        now = time.monotonic()
+        elapsed_ms = (now - started) * 1000
+        with self._lock:
+            st = self._stats[kind]
+            st["flush_ms_total"] += elapsed_ms
+            st["flush_ms_max"] = max(st["flush_ms_max"], elapsed_ms)
+            if sent < len(items):
+                st["failed_batches"] += 1
+            if sent:
+                st["batches"] += 1
+                st["items"] += sent
+                st["max_batch"] = max(st["max_batch"], sent)
+                self._sent.append((now, sent))
+            while self._sent and self._sent[0][0] < now - 60:
+                self._sent.popleft()
+        return sent
+
+    def send(self, kind, items):
+        """배치 전송. wikibot에 전달된 건수 반환 (items 앞에서부터 센다)"""
+        endpoint = self.endpoints[kind]
+        sent = 0
+        try:
+            resp = wikibot_http.post(f"{endpoint}/bulk", json={"items": items})
+            if not _route_missing(resp):
+                if resp.status_code != 200:
+                    raise requests.HTTPError(f"bulk 응답 {resp.status_code}")
+                return min(len(items), int(resp.json().get("received", len(items))))
+            # bulk 미지원 → 단건 전송 (실패하면 거기서 멈추고 나머지는 다음에)
+            for item in items:
+                wikibot_http.post(endpoint, json=item).raise_for_status()
+                sent += 1
+            return sent
+        except Exception as e:
+            logger.error(f"{kind} 수집 전송 오류 ({len(items) - sent}/{len(items)}건 스풀 보관): {e}")
+            return sent
+
+    def stats(self):
+        # 재전송 담당이 아닌 워커는 줄어든 것을 모르므로 스풀에서 직접 셈
+        spool_depth = None if self.leader else self.spool.depth()
+        with self._lock:
+            now = time.monotonic()
+            if spool_depth is None:
+                spool_depth = self._depth or {}
+            result = {
+                "leader": self.leader,
+                "replay_items_per_sec": round(sum(n for t, n in self._sent if t >= now - 60) / 60, 2),
+                "failures": self._failures,
+                "retry_in": round(max(0.0, self._retry_at - now), 1),
+            }
+            for kind, st in self._stats.items():
+                batches = st["batches"]
+                attempts = batches + st["failed_batches"]
+                result[kind] = {
+                    "spool_depth": spool_depth.get(kind, 0),
+                    "batches": batches,
+                    "items": st["items"],
+                    "failed_batches": st["failed_batches"],
+                    "max_batch": st["max_batch"],
+                    "avg_batch": round(st["items"] / batches, 1) if batches else 0,
+                    "flush_ms_avg": round(st["flush_ms_total"] / attempts, 1) if attempts else 0,
+                    "flush_ms_max": round(st["flush_ms_max"], 1),
+                }
+            return result
+
+
+collect_batcher = CollectBatcher(
+    CollectSpool(COLLECT_SPOOL_PATH), COLLECT_ENDPOINTS, COLLECT_BATCH_SIZE, COLLECT_FLUSH_INTERVAL,
+)
+
+
+# ── 별칭 색인 ──
+# wikibot 별칭 표(/api/trade/alias)의 로컬 사본. !가격 검색어를 정식명으로 바꿔
+# 같은 품목이 같은 upstream 요청·캐시 키가 되게 하고, 수집 분류기의 품목명 검색에 쓴다.
+
+# 별칭 표 전체 갱신 주기(초). 관리자 명령으로 바뀐 항목은 즉시 반영
+ALIAS_REFRESH_INTERVAL = int(os.getenv('ALIAS_REFRESH_INTERVAL', '600'))
+
+# 강화 수치: 앞쪽 "5강", "+5" / 뒤쪽 "5강"
+ENHANCE_PREFIX_RE = re.compile(r"^\s*(?:(\d+)\s*강|\+(\d+))\s*")
+ENHANCE_SUFFIX_RE = re.compile(r"\s*(\d+)\s*강\s*$")
+ALIAS_STRIP_RE = re.compile(r"[\s\-_.·]+")
+
+
+def normalize_alias(text):
+    """비교용 정규화: 호환 자모/전각 문자 통일(NFKD 자모 분해), 소문자, 공백·구분 기호 제거"""
+    return ALIAS_STRIP_RE.sub("", unicodedata.normalize("NFKD", text)).lower()
+
+
+def fetch_aliases():
+    """wikibot 별칭 목록 조회 → [(줄임말, 정식명)]. 실패 시 None"""
+    try:
+        resp = wikibot_http.get("/api/trade/alias")
+        data = resp.json()
+        if not data.get("success"):
+            return None
+        return [(a.get("alias", ""), a.get("canonical_name", "")) for a in data.get("aliases", [])]
+    except Exception as e:
+        logger.error(f"별칭 목록 조회 오류: {e}")
+        return None
+
+
+class AliasIndex:
+    """정규화한 줄임말·정식명 → 정식명 트라이.
+
+    처음 사용할 때부터 백그라운드에서 ALIAS_REFRESH_INTERVAL마다 전체를 다시 읽고,
+    !별칭 추가/삭제/목록 결과는 add/remove/load로 바로 반영한다.
+    트라이는 변경 때마다 새로 만들어 통째로 교체하므로 조회는 잠금 없이 한다.
+    interval이 0이면 백그라운드 갱신 없이 load/add/remove로만 채운다.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._aliases = {}  # 줄임말 → 정식명
+        self._trie = {}  # 글자 → 하위 노드, None 키에 정식명
+        self._thread = None
+        self._loaded_at = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _build(aliases):
+        trie = {}
+        for name, canonical in list(aliases.items()) + [(c, c) for c in set(aliases.values())]:
+            # 한 글자 이름은 일반 대화와 너무 자주 겹쳐 제외
+            key = normalize_alias(name)
+            if len(name) < 2 or not key:
+                continue
+            node = trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            # 줄임말이 다른 정식명과 겹치면 줄임말 우선
+            if node.get(None) is None or name != canonical:
+                node[None] = canonical
+        return trie
+
+    def load(self, pairs):
+        """별칭 목록 전체 교체"""
+        aliases = {a.strip(): c.strip() for a, c in pairs if a and c and a.strip() and c.strip()}
+        trie = self._build(aliases)
+        with self._lock:
+            self._aliases = aliases
+            self._trie = trie
+            self._loaded_at = time.monotonic()
+
+    def add(self, alias, canonical):
+        with self._lock:
+            aliases = dict(self._aliases)
+        aliases[alias.strip()] = canonical.strip()
+        self._swap(aliases)
+
+    def remove(self, alias):
+        with self._lock:
+            aliases = dict(self._aliases)
+        if aliases.pop(alias.strip(), None) is not None:
+            self._swap(aliases)
+
+    def _swap(self, aliases):
+        trie = self._build(aliases)
+        with self._lock:
+            self._aliases = aliases
+            self._trie = trie
+
+    def _run(self):
+        while True:
+            pairs = fetch_aliases()
+            if pairs is not None:
+                self.load(pairs)
+            time.sleep(self.interval)
+
+    def _ensure_started(self):
+        if self._thread is None and self.interval > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="alias-refresh", daemon=True)
+                    self._thread.start()
+
+    def lookup(self, name):
+        """줄임말/정식명 → 정식명. 없으면 None"""
+        self._ensure_started()
+        node = self._trie
+        for ch in normalize_alias(name):
+            node = node.get(ch)
+            if node is None:
+                return None
+        return node.get(None)
+
+    def find(self, text):
+        """문장 안에 나오는 품목명(정식명) 목록 (위치마다 가장 긴 일치)"""
+        self._ensure_started()
+        trie = self._trie
+        if not trie:
+            return []
+        key = normalize_alias(text)
+        found = []
+        i = 0
+        while i < len(key):
+            node, match, end = trie, None, i
+            for j in range(i, len(key)):
+                node = node.get(key[j])
+                if node is None:
+                    break
+                if node.get(None) is not None:
+                    match, end = node[None], j + 1
+            if match is None:
+                i += 1
+            else:
+                found.append(match)
+                i = end
+        return found
+
+    def canonicalize(self, query):
+        """!가격 검색어 정규화: "5강강세", "강세 5강", "+5 강세" → "5강 강화된세피어링".
+        별칭에 없으면 공백만 정리해 그대로 사용"""
+        text = " ".join(query.split())
+        level = None
+        m = ENHANCE_PREFIX_RE.match(text)
+        if m:
+            level, text = m.group(1) or m.group(2), text[m.end():]
+        else:
+            m = ENHANCE_SUFFIX_RE.search(text)
+            if m and m.start() > 0:
+                level, text = m.group(1), text[:m.start()]
+        canonical = self.lookup(text) if text else None
+        with self._lock:
+            if canonical is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        name = canonical or text
+        return f"{int(level)}강 {name}" if level is not None and name else (name or query.strip())
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "aliases": len(self._aliases),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0,
+                "loaded_ago": round(time.monotonic() - self._loaded_at) if self._loaded_at else None,
+            }
+
+
+alias_index = AliasIndex(ALIAS_REFRESH_INTERVAL)
+
+
+# ── 수집 사전 분류 ──
+# 수집방의 인사·이모티콘·잡담은 wikibot으로 보내지 않고 로컬에서 거른다.
+# 놓치면 시세/파티 정보가 사라지므로 애매하면 통과(재현율 우선)
+
+# 사전 분류 사용 여부 (0이면 모든 메시지 전달, 기존 동작)
+COLLECT_PREFILTER = os.getenv('COLLECT_PREFILTER', '1') == '1'
+
+# 내용이 없는 메시지 (카카오 시스템 문구, 자음·기호만)
+COLLECT_NOISE_RE = re.compile(
+    r"^(?:이모티콘을 보냈습니다\.?|사진(?: \d+장)?|동영상|파일: .*|삭제된 메시지입니다\.?"
+    r"|[ㄱ-ㅎㅏ-ㅣ\s.,!?~^;:()\-_=+*♡♥]*)$"
+)
+TRADE_KEYWORD_RE = re.compile(
+    r"팝니다|팔아|팔아요|판매|팜|ㅍㅍ|(?:^|\s)ㅍ(?:\s|$)|삽니다|사요|(?:^|\s)삼(?:\s|$|[:)\]])|ㅅㅅ|구매|매입"
+    r"|구합|구해|구함|처분|교환|시세|얼마|가격|파실|사실|넘겨|매물|경매|급처|떨이|흥정|네고"
+)
+# 숫자+단위(억/만/천/원/골드/k/m), N강, 두 자리 이상 숫자
+TRADE_PRICE_RE = re.compile(
+    r"\d+(?:[.,]\d+)*\s*(?:억|만|천|백|원|골드|골|[kKmM](?![a-zA-Z]))|\d+\s*강|\d{2,}"
+)
+PARTY_KEYWORD_RE = re.compile(
+    r"파티|팟|구인|구직|구합|구해|구함|급구|모집|자리|출발|레이드|사냥|보스|오늘|내일|모레|저녁|새벽"
+    r"|전사|도적|법사|마법사|직자|성직자|도가|도사|데빌|귓"
+)
+# 시간(9시, 21:30), 인원(2/4), 날짜(12월)
+PARTY_SLOT_RE = re.compile(r"\d+\s*시|\d{1,2}:\d{2}|\d\s*/\s*\d|\d+\s*월|\d+\s*인|\d+\s*명")
+
+
+class CollectClassifier:
+    """수집방 메시지 사전 분류: 시세/파티 정보가 있을 수 있는 메시지만 통과.
+
+    키워드·가격 패턴은 미리 컴파일하고, 품목명은 별칭 색인(AliasIndex)에서 찾는다.
+    """
+
+    def __init__(self, aliases, enabled=True):
+        self.aliases = aliases
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {kind: {"forwarded": 0, "dropped": 0} for kind in ("trade", "party")}
+
+    def is_trade(self, msg):
+        text = msg.strip()
+        if COLLECT_NOISE_RE.match(text):
+            return False
+        if TRADE_KEYWORD_RE.search(text) or TRADE_PRICE_RE.search(text):
+            return True
+        return bool(self.aliases.find(text))
+
+    def is_party(self, msg):
+        text = msg.strip()
+        if COLLECT_NOISE_RE.match(text):
+            return False
+        return bool(PARTY_KEYWORD_RE.search(text) or PARTY_SLOT_RE.search(text))
+
+    def accept(self, kind, msg):
+        """수집 대상이면 True (kind: trade / party)"""
+        if not self.enabled:
+            return True
+        ok = self.is_trade(msg) if kind == "trade" else self.is_party(msg)
+        with self._lock:
+            self._stats[kind]["forwarded" if ok else "dropped"] += 1
+        return ok
+
+    def stats(self):
+        with self._lock:
+            result = {"enabled": self.enabled}
+            for kind, st in self._stats.items():
+                total = st["forwarded"] + st["dropped"]
+                result[kind] = dict(st, dropped_ratio=round(st["dropped"] / total, 3) if total else 0)
+            return result
+
+
+collect_classifier = CollectClassifier(alias_index, COLLECT_PREFILTER)
+
+
+def collect_party_message(msg, sender, chat_id):
+    """파티방 메시지를 수집 스풀에 추가 (wikibot에서 파티 수집)"""
+    try:
+        sender_name = sender.split('/')[0].strip() if '/' in sender else sender
+        collect_batcher.add("party", {
+            "message": msg,
+            "sender_name": sender_name,
+            "room_id": chat_id,
+        })
+    except Exception as e:
+        logger.error(f"파티 수집 오류: {e}")
+
+
+def parse_trade_sender(sender):
+    """발신자 정보 파싱: '이름/레벨/서버' 또는 '이름 레벨 서버' → (이름, 레벨, 서버)"""
+    sender_name = sender
+    sender_level = None
+    server = None
+
+    parts = sender.split('/')
+    if len(parts) >= 2:
+        sender_name = parts[0].strip()
+        for p in parts[1:]:
+            p = p.strip()
+            if p.isdigit():
+                sender_level = int(p)
+            elif p in ('세오', '베라', '도가', '세오의서'):
+                server = p
+    else:
+        space_parts = sender.split()
+        if len(space_parts) >= 2:
+            sender_name = space_parts[0]
+            for p in space_parts[1:]:
+                if p.isdigit():
+                    sender_level = int(p)
+                elif p in ('세오', '베라', '도가'):
+                    server = p
+    return sender_name, sender_level, server
+
+
+def collect_trade_message(msg, sender, chat_id):
+    """거래방 메시지를 수집 스풀에 추가 (wikibot에서 시세 수집)"""
+    try:
+        sender_name, sender_level, server = parse_trade_sender(sender)
+        collect_batcher.add("trade", {
+            "message": msg,
+            "sender_name": sender_name,
+            "sender_level": sender_level,
+            "server": server,
+            "trade_date": datetime.now().strftime('%Y-%m-%d'),
+        })
+    except Exception as e:
+        logger.error(f"거래 수집 오류: {e}")
+
+
+# ── 명령 라우터 ───────────────────────────────────────────
+
+class Command:
+    """명령 정의: 접두어, 처리 함수, 허용 방 종류, 기능 토글 키, 인자 파서"""
+
+    __slots__ = ("prefix", "handler", "exact", "rooms", "toggle", "parse", "static")
+
+    def __init__(self, prefix, handler, exact=False, rooms=None, toggle=None, parse=None, static=False):
+        self.prefix = prefix
+        self.handler = handler
+        self.exact = exact  # True면 메시지 전체가 접두어와 같을 때만
+        self.rooms = rooms  # 허용 방 종류 (None=전체)
+        self.toggle = toggle  # 기능 토글 키 (COMMAND_TOGGLE_MAP 값)
+        self.parse = parse  # 접두어 뒤 문자열 → 처리 함수 인자 (None=그대로)
+        self.static = static  # True면 방 설정·닉네임·토글 조회 없이 바로 처리
+
+
+class CommandRouter:
+    """접두어 트라이 기반 명령 라우터.
+
+    메시지 앞부분을 한 글자씩 따라가며 가장 긴 접두어의 명령을 고르므로
+    등록된 명령 수와 무관하게 조회 비용은 명령어 길이 정도로 일정하다.
+    ("!파티설정"은 "!파티"보다, "!관리자등록"은 "!관리자"보다 우선)
+    """
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, prefix, handler, **options):
+        node = self._root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node[None] = Command(prefix, handler, **options)
+
+    def command(self, *prefixes, **options):
+        """데코레이터: @router.command("!별칭 추가", "!별칭추가", ...)"""
+        def register(handler):
+            for prefix in prefixes:
+                self.add(prefix, handler, **options)
+            return handler
+        return register
+
+    def resolve(self, msg):
+        """(Command, 인자) 반환. 일치하는 명령이 없으면 (None, None)"""
+        found = None
+        node = self._root
+        for i, ch in enumerate(msg):
+            node = node.get(ch)
+            if node is None:
+                break
+            command = node.get(None)
+            if command is not None and (not command.exact or i == len(msg) - 1):
+                found = command
+        if found is None:
+            return None, None
+        rest = msg[len(found.prefix):].strip()
+        return found, (found.parse(rest) if found.parse else rest)
+
+
+# ── 관리자 명령 ───────────────────────────────────────────
+
+def verify_admin(sender_id):
+    """관리자 권한 확인. 권한이 없으면 안내 메시지, 있으면 None 반환"""
+    try:
+        resp = wikibot_http.post(
+            "/api/nickname/admin/verify",
+            json={"admin_id": sender_id},
+        )
+        data = resp.json()
+        if not data.get("success"):
+            return data.get("message", "권한이 없습니다.")
+    except DeadlineExceeded:
+        raise  # 예산 초과 답장은 process_event가 보냄
+    except Exception:
+        return "권한 확인 중 오류가 발생했습니다."
+    return None
+
+
+ADMIN_COMMANDS = CommandRouter()
+
+
+def handle_admin_command(msg, sender_id, room_id=None):
+    """관리자 명령 처리. 응답 메시지 반환."""
+    command, _args = ADMIN_COMMANDS.resolve(msg)
+    if command is None:
+        return None
+    with ADMIN_COMMAND_SECONDS.time(command.prefix):
+        return command.handler(msg, sender_id, room_id)
+
+
+@ADMIN_COMMANDS.command("!관리자등록")
+def admin_register(msg, sender_id, room_id):
+    """최초 관리자 등록"""
+    try:
+        resp = wikibot_http.post(
+            "/api/nickname/admin/register",
+            json={"admin_id": sender_id},
+        )
+        return resp.json().get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"관리자 등록 오류: {e}")
+        return "관리자 등록 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!닉변감지 추가")
+def admin_nick_room_add(msg, sender_id, room_id):
+    """닉네임 감시 채팅방 추가"""
+    parts = msg.split()
+    if len(parts) < 3:
+        return "사용법: !닉변감지 추가 [room_id] [room_name(선택)]"
+    target_room = parts[2]
+    room_name = " ".join(parts[3:]) if len(parts) > 3 else ""
+    try:
+        resp = wikibot_http.post(
+            "/api/nickname/admin/rooms",
+            json={"admin_id": sender_id, "room_id": target_room, "room_name": room_name},
+        )
+        return resp.json().get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"채팅방 추가 오류: {e}")
+        return "채팅방 추가 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!닉변감지 제거")
+def admin_nick_room_remove(msg, sender_id, room_id):
+    """닉네임 감시 채팅방 제거"""
+    parts = msg.split()
+    if len(parts) < 3:
+        return "사용법: !닉변감지 제거 [room_id]"
+    target_room = parts[2]
+    try:
+        resp = wikibot_http.delete(
+            f"/api/nickname/admin/rooms/{target_room}",
+            json={"admin_id": sender_id},
+        )
+        return resp.json().get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"채팅방 제거 오류: {e}")
+        return "채팅방 제거 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!닉변감지 목록")
+def admin_nick_room_list(msg, sender_id, room_id):
+    """닉네임 감시 채팅방 목록"""
+    try:
+        resp = wikibot_http.get(
+            "/api/nickname/admin/rooms",
+            params={"admin_id": sender_id},
+        )
+        data = resp.json()
+        if not data.get("success"):
+            return data.get("message", "조회 실패")
+        rooms = data.get("rooms", [])
+        if not rooms:
+            return "감시 중인 채팅방이 없습니다."
+        lines = ["[감시 채팅방 목록]"]
+        for r in rooms:
+            status = "활성" if r.get("enabled") else "비활성"
+            name = r.get("room_name") or r.get("room_id")
+            lines.append(f"- {name} ({r.get('room_id')}) [{status}]")
+        return "\n".join(lines)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"채팅방 목록 오류: {e}")
+        return "채팅방 목록 조회 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!닉변이력")
+def admin_nick_history(msg, sender_id, room_id):
+    """닉네임 변경 이력 조회"""
+    parts = msg.split()
+    if len(parts) < 2:
+        return "사용법: !닉변이력 [room_id]"
+    target_room = parts[1]
+    try:
+        resp = wikibot_http.get(
+            f"/api/nickname/history/{target_room}",
+            params={"admin_id": sender_id},
+        )
+        data = resp.json()
+        if not data.get("success"):
+            return data.get("message", "조회 실패")
+        history = data.get("history", [])
+        if not history:
+            return "닉네임 변경 이력이 없습니다."
+        lines = ["[닉네임 변경 이력]"]
+        for h in history:
+            changes = h.get('changes', '')
+            last_changed = h.get('last_changed', '')[:16]  # 초 제외
+            lines.append(f"• {changes}")
+            lines.append(f"  ({last_changed})")
+        return "\n".join(lines)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"이력 조회 오류: {e}")
+        return "이력 조회 중 오류가 발생했습니다."
+
+
+# ── 가격 방 설정 ──
+
+@ADMIN_COMMANDS.command("!가격설정 추가", "!가격설정 수집")
+def admin_trade_room_add(msg, sender_id, room_id):
+    """가격 방 추가 (추가: 조회만, 수집: 수집+조회)"""
+    is_collect = msg.startswith("!가격설정 수집")
+    parts = msg.split()
+    if len(parts) < 3:
+        return "사용법: !가격설정 추가 [room_id] [방이름(선택)]\n!가격설정 수집 [room_id] [방이름(선택)]\n\n추가: 가격 조회만 가능\n수집: 시세 수집 + 가격 조회"
+    target_room = parts[2]
+    room_name = " ".join(parts[3:]) if len(parts) > 3 else ""
+    try:
+        resp = wikibot_http.post(
+            "/api/trade/rooms",
+            json={"admin_id": sender_id, "room_id": target_room, "room_name": room_name, "collect": is_collect},
+        )
+        data = resp.json()
+        # 캐시 초기화
+        room_configs.invalidate(target_room)
+        return data.get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"가격 방 추가 오류: {e}")
+        return "가격 방 추가 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!가격설정 제거")
+def admin_trade_room_remove(msg, sender_id, room_id):
+    """가격 방 제거"""
+    parts = msg.split()
+    if len(parts) < 3:
+        return "사용법: !가격설정 제거 [room_id]"
+    target_room = parts[2]
+    try:
+        resp = wikibot_http.delete(
+            f"/api/trade/rooms/{target_room}",
+            json={"admin_id": sender_id},
+        )
+        data = resp.json()
+        # 캐시 초기화
+        room_configs.invalidate(target_room)
+        return data.get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"가격 방 제거 오류: {e}")
+        return "가격 방 제거 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!가격설정 목록")
+def admin_trade_room_list(msg, sender_id, room_id):
+    """가격 방 목록"""
+    try:
+        resp = wikibot_http.get(
+            "/api/trade/rooms",
+            params={"admin_id": sender_id},
+        )
+        data = resp.json()
+        if not data.get("success"):
+            return data.get("message", "조회 실패")
+        rooms = data.get("rooms", [])
+        if not rooms:
+            return "설정된 가격 방이 없습니다."
+        lines = ["[가격 방 목록]"]
+        for r in rooms:
+            mode = "수집+조회" if r.get("collect") else "조회만"
+            name = r.get("room_name") or r.get("room_id")
+            lines.append(f"- {name} ({r.get('room_id')}) [{mode}]")
+        return "\n".join(lines)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"가격 방 목록 오류: {e}")
+        return "가격 방 목록 조회 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!가격설정")
+def admin_trade_room_usage(msg, sender_id, room_id):
+    """!가격설정 사용법"""
+    return "사용법:\n!가격설정 추가 [room_id] [방이름] - 조회만\n!가격설정 수집 [room_id] [방이름] - 수집+조회\n!가격설정 제거 [room_id]\n!가격설정 목록"
 
 
-# ── 닉네임/입퇴장 ────────────────────────────────────────
+# ── 파티방 설정 ──
 
-def check_nickname(sender_name, sender_id, room_id):
-    """wikibot 닉네임 변경 체크"""
+@ADMIN_COMMANDS.command("!파티설정 추가", "!파티설정 수집")
+def admin_party_room_add(msg, sender_id, room_id):
+    """파티 방 추가 (추가: 조회만, 수집: 수집+조회)"""
+    is_collect = msg.startswith("!파티설정 수집")
+    parts = msg.split()
+    if len(parts) < 3:
+        return "사용법: !파티설정 추가 [room_id] [방이름(선택)]\n!파티설정 수집 [room_id] [방이름(선택)]\n\n추가: 파티 조회만 가능\n수집: 파티 수집 + 조회"
+    target_room = parts[2]
+    room_name = " ".join(parts[3:]) if len(parts) > 3 else ""
     try:
-        resp = requests.post(
-            f"{WIKIBOT_URL}/api/nickname/check",
-            json={"sender_name": sender_name, "sender_id": sender_id, "room_id": room_id},
-            timeout=5,
+        resp = wikibot_http.post(
+            "/api/party/rooms",
+            json={"admin_id": sender_id, "room_id": target_room, "room_name": room_name, "collect": is_collect},
         )
         data = resp.json()
-        if data.get("success") and data.get("notification"):
-            return data["notification"]
+        # 캐시 초기화
+        room_configs.invalidate(target_room)
+        return data.get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        logger.error(f"닉네임 체크 오류: {e}")
-    return ""
+        logger.error(f"파티 방 추가 오류: {e}")
+        return "파티 방 추가 중 오류가 발생했습니다."
 
 
-def log_member_event(user_id, nickname, room_id, event_type):
-    """wikibot 입퇴장 이벤트 기록"""
+@ADMIN_COMMANDS.command("!파티설정 제거")
+def admin_party_room_remove(msg, sender_id, room_id):
+    """파티 방 제거"""
+    parts = msg.split()
+    if len(parts) < 3:
+        return "사용법: !파티설정 제거 [room_id]"
+    target_room = parts[2]
     try:
-        resp = requests.post(
-            f"{WIKIBOT_URL}/api/nickname/member-event",
-            json={"user_id": user_id, "nickname": nickname, "room_id": room_id, "event_type": event_type},
-            timeout=5,
+        resp = wikibot_http.delete(
+            f"/api/party/rooms/{target_room}",
+            json={"admin_id": sender_id},
         )
         data = resp.json()
-        if data.get("success") and data.get("notification"):
-            return data["notification"]
+        room_configs.invalidate(target_room)
+        return data.get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        logger.error(f"입퇴장 이벤트 오류: {e}")
-    return ""
+        logger.error(f"파티 방 제거 오류: {e}")
+        return "파티 방 제거 중 오류가 발생했습니다."
 
 
-# ── 거래 가격 ────────────────────────────────────────────
-
-# 방 설정 캐시 (5분마다 갱신)
-_room_cache = {}
-_room_cache_time = 0
-ROOM_CACHE_TTL = 300  # 5분
+@ADMIN_COMMANDS.command("!파티설정 목록")
+def admin_party_room_list(msg, sender_id, room_id):
+    """파티 방 목록"""
+    try:
+        resp = wikibot_http.get(
+            "/api/party/rooms",
+            params={"admin_id": sender_id},
+        )
+        data = resp.json()
+        if not data.get("success"):
+            return data.get("message", "조회 실패")
+        rooms = data.get("rooms", [])
+        if not rooms:
+            return "설정된 파티 방이 없습니다."
+        lines = ["[파티 방 목록]"]
+        for r in rooms:
+            mode = "수집+조회" if r.get("collect") else "조회만"
+            name = r.get("room_name") or r.get("room_id")
+            lines.append(f"- {name} ({r.get('room_id')}) [{mode}]")
+        return "\n".join(lines)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"파티 방 목록 오류: {e}")
+        return "파티 방 목록 조회 중 오류가 발생했습니다."
 
-# 파티방 설정 캐시
-_party_room_cache = {}
-_party_room_cache_time = 0
 
+@ADMIN_COMMANDS.command("!파티설정")
+def admin_party_room_usage(msg, sender_id, room_id):
+    """!파티설정 사용법"""
+    return "사용법:\n!파티설정 추가 [room_id] [방이름] - 조회만\n!파티설정 수집 [room_id] [방이름] - 수집+조회\n!파티설정 제거 [room_id]\n!파티설정 목록"
 
-def check_trade_room(chat_id):
-    """방 설정 조회 (캐시). 반환: {'collect': bool} 또는 None"""
-    global _room_cache, _room_cache_time
-    now = time.time()
-    if now - _room_cache_time > ROOM_CACHE_TTL:
-        _room_cache = {}
-        _room_cache_time = now
 
-    if chat_id in _room_cache:
-        return _room_cache[chat_id]
+# ── 별칭(줄임말) 관리 ──
 
+@ADMIN_COMMANDS.command("!별칭 추가", "!별칭추가")
+def admin_alias_add(msg, sender_id, room_id):
+    """별칭(줄임말) 등록"""
+    parts = msg.split()
+    if len(parts) < 4:
+        return "사용법: !별칭 추가 [줄임말] [정식명]\n예: !별칭 추가 강세 강화된세피어링"
+    alias_name = parts[2]
+    canonical = parts[3]
     try:
-        resp = requests.post(
-            f"{WIKIBOT_URL}/api/trade/room-check",
-            json={"room_id": chat_id},
-            timeout=5,
+        resp = wikibot_http.post(
+            "/api/trade/alias",
+            json={"alias": alias_name, "canonical_name": canonical},
         )
         data = resp.json()
-        if not data.get("success"):
-            return None  # 서버 오류 시 캐시하지 않음
-        room = data.get("room")
-        _room_cache[chat_id] = room  # 성공 응답만 캐시 (None 포함 = 미등록 방)
-        return room
-    except Exception:
-        return None  # 통신 오류 시 캐시하지 않음 → 다음 요청에서 재시도
+        if data.get("success"):
+            alias_index.add(alias_name, canonical)
+            return f"별칭 등록 완료: {alias_name} → {canonical}"
+        return data.get("message", "별칭 등록 실패")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"별칭 추가 오류: {e}")
+        return "별칭 추가 중 오류가 발생했습니다."
 
 
-def check_party_room(chat_id):
-    """파티방 설정 조회 (캐시). 반환: {'collect': bool} 또는 None"""
-    global _party_room_cache, _party_room_cache_time
-    now = time.time()
-    if now - _party_room_cache_time > ROOM_CACHE_TTL:
-        _party_room_cache = {}
-        _party_room_cache_time = now
+@ADMIN_COMMANDS.command("!별칭 삭제", "!별칭삭제")
+def admin_alias_remove(msg, sender_id, room_id):
+    """별칭 삭제"""
+    parts = msg.split()
+    if len(parts) < 3:
+        return "사용법: !별칭 삭제 [줄임말]"
+    alias_name = parts[2]
+    try:
+        resp = wikibot_http.delete(f"/api/trade/alias/{alias_name}")
+        data = resp.json()
+        if resp.status_code == 200 and data.get("success", True):
+            alias_index.remove(alias_name)
+        return data.get("message", "처리 완료")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"별칭 삭제 오류: {e}")
+        return "별칭 삭제 중 오류가 발생했습니다."
 
-    if chat_id in _party_room_cache:
-        return _party_room_cache[chat_id]
 
+@ADMIN_COMMANDS.command("!별칭 목록", "!별칭목록")
+def admin_alias_list(msg, sender_id, room_id):
+    """별칭 목록 (정식명별 그룹)"""
     try:
-        resp = requests.post(
-            f"{WIKIBOT_URL}/api/party/room-check",
-            json={"room_id": chat_id},
-            timeout=5,
+        resp = wikibot_http.get(
+            "/api/trade/alias",
         )
         data = resp.json()
         if not data.get("success"):
-            return None
-        room = data.get("room")
-        _party_room_cache[chat_id] = room
-        return room
-    except Exception:
-        return None
+            return "별칭 목록 조회 실패"
+        aliases = data.get("aliases", [])
+        alias_index.load([(a.get("alias", ""), a.get("canonical_name", "")) for a in aliases])
+        if not aliases:
+            return "등록된 별칭이 없습니다."
+        # 정식명별로 그룹화
+        groups = {}
+        for a in aliases:
+            cn = a.get("canonical_name", "")
+            if cn not in groups:
+                groups[cn] = []
+            groups[cn].append(a.get("alias", ""))
+        lines = ["[별칭 목록]"]
+        for cn, alias_list in sorted(groups.items()):
+            lines.append(f"· {cn}: {', '.join(alias_list)}")
+        if len(lines) > 30:
+            lines = lines[:30]
+            lines.append(f"... 외 {len(groups) - 29}개")
+        return "\n".join(lines)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"별칭 목록 오류: {e}")
+        return "별칭 목록 조회 중 오류가 발생했습니다."
 
 
-def collect_party_message(msg, sender, chat_id):
-    """파티방 메시지를 wikibot에 전달하여 파티 수집"""
+@ADMIN_COMMANDS.command("!별칭")
+def admin_alias_usage(msg, sender_id, room_id):
+    """!별칭 사용법"""
+    return "사용법:\n!별칭 추가 [줄임말] [정식명]\n!별칭 삭제 [줄임말]\n!별칭 목록"
+
+
+# ── 가격 데이터 정리 ──
+
+@ADMIN_COMMANDS.command("!시세정리")
+def admin_trade_cleanup(msg, sender_id, room_id):
+    """가격 데이터 정리"""
+    parts = msg.split()
+    since_date = parts[1] if len(parts) >= 2 else None
     try:
-        sender_name = sender.split('/')[0].strip() if '/' in sender else sender
-        requests.post(
-            f"{WIKIBOT_URL}/api/party/collect",
-            json={
-                "message": msg,
-                "sender_name": sender_name,
-                "room_id": chat_id,
-            },
-            timeout=5,
+        payload = {}
+        if since_date:
+            payload["since_date"] = since_date
+        resp = wikibot_http.post(
+            "/api/trade/cleanup",
+            json=payload,
         )
+        data = resp.json()
+        if data.get("success"):
+            lines = [
+                "[가격 데이터 정리 완료]",
+                f"· 제거: {data.get('removed', 0)}개 항목",
+                f"· 유지: {data.get('kept', 0)}개 항목",
+            ]
+            examples = data.get("examples", [])
+            if examples:
+                lines.append(f"\n제거된 항목:")
+                for ex in examples[:10]:
+                    lines.append(f"  - {ex}")
+                if len(examples) > 10:
+                    lines.append(f"  ... 외 {len(examples) - 10}개")
+            return "\n".join(lines)
+        return data.get("message", "정리 실패")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        logger.error(f"파티 수집 오류: {e}")
-
+        logger.error(f"가격 정리 오류: {e}")
+        return "가격 데이터 정리 중 오류가 발생했습니다."
+
+
+@ADMIN_COMMANDS.command("!캐시초기화")
+def admin_cache_clear(msg, sender_id, room_id):
+    """응답 캐시 초기화"""
+    denied = verify_admin(sender_id)
+    if denied:
+        return denied
+    before = response_cache.stats()
+    removed = response_cache.clear()
+    logger.info(f"응답 캐시 초기화 (by {sender_id}): {removed}개")
+    return (
+        f"응답 캐시 초기화 완료 ({removed}개 항목 삭제)\n"
+        f"· 적중 {before['hits']} / 미적중 {before['misses']}"
+    )
+
+
+@ADMIN_COMMANDS.command("!느린요청")
+def admin_slow_requests(msg, sender_id, room_id):
+    """최근 느린 요청 (단계별 시간)"""
+    denied = verify_admin(sender_id)
+    if denied:
+        return denied
+    parts = msg.split()
+    limit = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 5
+    traces = tracer.snapshot("slow", min(limit, 20))
+    if not traces:
+        return f"{SLOW_REQUEST_THRESHOLD:g}초 넘게 걸린 요청이 없습니다."
+    lines = [f"[느린 요청 {len(traces)}건, 기준 {SLOW_REQUEST_THRESHOLD:g}초]"]
+    for t in traces:
+        lines.append(f"· {t['time'][5:]} {t.get('msg', '')[:20]} — {t['total_ms'] / 1000:.1f}s")
+        lines.append(f"  {format_trace_spans(t)}")
+    return "\n".join(lines)
+
+
+_CIRCUIT_STATE_LABELS = {CircuitBreaker.CLOSED: "정상", CircuitBreaker.HALF_OPEN: "시험 중", CircuitBreaker.OPEN: "차단"}
+
+
+@ADMIN_COMMANDS.command("!서킷")
+def admin_circuit(msg, sender_id, room_id):
+    """upstream 서킷 상태 / 강제 닫기"""
+    parts = msg.split()
+    subcmd = parts[1] if len(parts) > 1 else ""
+
+    if subcmd == "초기화":
+        denied = verify_admin(sender_id)
+        if denied:
+            return denied
+        group = parts[2] if len(parts) > 2 else None
+        closed = []
+        for client in (wikibot_http, iris_http):
+            if group is None or group in client.breakers:
+                closed += [f"{client.name}/{g}" for g in client.reset_breakers(group)]
+        if not closed:
+            return f"'{group}' 그룹이 없습니다."
+        return f"서킷을 닫았습니다: {', '.join(closed)}"
+
+    # 조회는 관리자 확인 없이: 서킷이 열려 wikibot에 물어볼 수 없을 때도 봐야 함
+    lines = ["[upstream 서킷]"]
+    for client in (wikibot_http, iris_http):
+        timeouts = client.timeouts_snapshot()
+        for group, breaker in sorted(client.breakers.items()):
+            st = breaker.stats()
+            if group == "default" and not st["calls"] and st["state"] == CircuitBreaker.CLOSED:
+                continue
+            line = f"· {client.name}/{group}: {_CIRCUIT_STATE_LABELS[st['state']]}"
+            if st["calls"]:
+                line += f", 실패 {st['failures']}/{st['calls']}"
+            if "retry_in" in st:
+                line += f", {st['retry_in']:g}초 후 시험"
+            if st["rejected"]:
+                line += f", 차단 {st['rejected']}건"
+            lines.append(line)
+        for endpoint, t in sorted(timeouts.items()):
+            p99 = f"{t['p99'] * 1000:.0f}ms" if t["p99"] is not None else "-"
+            lines.append(f"  {endpoint}: 타임아웃 {t['timeout']:g}s, p99 {p99}")
+    lines.append("\n!서킷 초기화 [그룹] - 서킷 강제 닫기")
+    return "\n".join(lines)
+
+
+@ADMIN_COMMANDS.command("!서버재시작")
+def admin_restart(msg, sender_id, room_id):
+    """서버 재시작 (배포 트리거)"""
+    denied = verify_admin(sender_id)
+    if denied:
+        return denied
 
-def collect_trade_message(msg, sender, chat_id):
-    """거래방 메시지를 wikibot에 전달하여 시세 수집"""
     try:
-        # 발신자 정보 파싱
-        sender_name = sender
-        sender_level = None
-        server = None
-
-        parts = sender.split('/')
-        if len(parts) >= 2:
-            sender_name = parts[0].strip()
-            for p in parts[1:]:
-                p = p.strip()
-                if p.isdigit():
-                    sender_level = int(p)
-                elif p in ('세오', '베라', '도가', '세오의서'):
-                    server = p
-        else:
-            space_parts = sender.split()
-            if len(space_parts) >= 2:
-                sender_name = space_parts[0]
-                for p in space_parts[1:]:
-                    if p.isdigit():
-                        sender_level = int(p)
-                    elif p in ('세오', '베라', '도가'):
-                        server = p
-
-        today = datetime.now().strftime('%Y-%m-%d')
-        requests.post(
-            f"{WIKIBOT_URL}/api/trade/collect",
-            json={
-                "message": msg,
-                "sender_name": sender_name,
-                "sender_level": sender_level,
-                "server": server,
-                "trade_date": today,
-            },
-            timeout=5,
-        )
+        # 재시작 완료 알림을 보낼 방 저장
+        if room_id:
+            save_restart_room(room_id)
+
+        # 배포 트리거 파일 생성 (호스트의 cron이 감지 후 deploy.sh 실행)
+        with open(DEPLOY_TRIGGER_FILE, 'w') as f:
+            f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        logger.info(f"서버 재시작 요청 (by {sender_id}) in room {room_id}")
+        return "서버 재시작을 시작합니다. (최대 1분 내 실행)"
     except Exception as e:
-        logger.error(f"거래 수집 오류: {e}")
+        logger.error(f"서버 재시작 오류: {e}")
+        return f"서버 재시작 실패: {e}"
 
 
-# ── 관리자 명령 ───────────────────────────────────────────
+# ── 명령어 ────────────────────────────────────────────────
 
-def handle_admin_command(msg, sender_id, room_id=None):
-    """관리자 명령 처리. 응답 메시지 반환."""
-    global _room_cache, _room_cache_time
+# 방 종류
+ROOM_NORMAL = "normal"
+ROOM_TRADE_COLLECT = "trade_collect"  # 거래 수집방: 자동 수집 + !가격만 응답
+ROOM_PARTY_COLLECT = "party_collect"  # 파티 수집방: 자동 수집 + !파티만 응답
 
-    if msg.startswith("!관리자등록"):
-        try:
-            resp = requests.post(
-                f"{WIKIBOT_URL}/api/nickname/admin/register",
-                json={"admin_id": sender_id},
-                timeout=5,
-            )
-            return resp.json().get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"관리자 등록 오류: {e}")
-            return "관리자 등록 중 오류가 발생했습니다."
-
-    if msg.startswith("!닉변감지 추가"):
-        parts = msg.split()
-        if len(parts) < 3:
-            return "사용법: !닉변감지 추가 [room_id] [room_name(선택)]"
-        target_room = parts[2]
-        room_name = " ".join(parts[3:]) if len(parts) > 3 else ""
-        try:
-            resp = requests.post(
-                f"{WIKIBOT_URL}/api/nickname/admin/rooms",
-                json={"admin_id": sender_id, "room_id": target_room, "room_name": room_name},
-                timeout=5,
-            )
-            return resp.json().get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"채팅방 추가 오류: {e}")
-            return "채팅방 추가 중 오류가 발생했습니다."
-
-    if msg.startswith("!닉변감지 제거"):
-        parts = msg.split()
-        if len(parts) < 3:
-            return "사용법: !닉변감지 제거 [room_id]"
-        target_room = parts[2]
-        try:
-            resp = requests.delete(
-                f"{WIKIBOT_URL}/api/nickname/admin/rooms/{target_room}",
-                json={"admin_id": sender_id},
-                timeout=5,
-            )
-            return resp.json().get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"채팅방 제거 오류: {e}")
-            return "채팅방 제거 중 오류가 발생했습니다."
+PARTY_LINK_MESSAGE = "📋 파티 빈자리 현황\n\n아래 링크에서 실시간 파티 빈자리를 확인하세요!\n👉 https://party.milddok.cc/\n\n* 어둠의전설 나겔파티 오픈톡 데이터 기반\n* 수집상태에 따라 오차가 있을 수 있습니다."
 
-    if msg.startswith("!닉변감지 목록"):
-        try:
-            resp = requests.get(
-                f"{WIKIBOT_URL}/api/nickname/admin/rooms",
-                params={"admin_id": sender_id},
-                timeout=5,
-            )
-            data = resp.json()
-            if not data.get("success"):
-                return data.get("message", "조회 실패")
-            rooms = data.get("rooms", [])
-            if not rooms:
-                return "감시 중인 채팅방이 없습니다."
-            lines = ["[감시 채팅방 목록]"]
-            for r in rooms:
-                status = "활성" if r.get("enabled") else "비활성"
-                name = r.get("room_name") or r.get("room_id")
-                lines.append(f"- {name} ({r.get('room_id')}) [{status}]")
-            return "\n".join(lines)
-        except Exception as e:
-            logger.error(f"채팅방 목록 오류: {e}")
-            return "채팅방 목록 조회 중 오류가 발생했습니다."
-
-    if msg.startswith("!닉변이력"):
-        parts = msg.split()
-        if len(parts) < 2:
-            return "사용법: !닉변이력 [room_id]"
-        target_room = parts[1]
-        try:
-            resp = requests.get(
-                f"{WIKIBOT_URL}/api/nickname/history/{target_room}",
-                params={"admin_id": sender_id},
-                timeout=5,
-            )
-            data = resp.json()
-            if not data.get("success"):
-                return data.get("message", "조회 실패")
-            history = data.get("history", [])
-            if not history:
-                return "닉네임 변경 이력이 없습니다."
-            lines = ["[닉네임 변경 이력]"]
-            for h in history:
-                changes = h.get('changes', '')
-                last_changed = h.get('last_changed', '')[:16]  # 초 제외
-                lines.append(f"• {changes}")
-                lines.append(f"  ({last_changed})")
-            return "\n".join(lines)
-        except Exception as e:
-            logger.error(f"이력 조회 오류: {e}")
-            return "이력 조회 중 오류가 발생했습니다."
-
-    # ── 가격 방 설정 ──
-    if msg.startswith("!가격설정 추가") or msg.startswith("!가격설정 수집"):
-        is_collect = msg.startswith("!가격설정 수집")
-        parts = msg.split()
-        if len(parts) < 3:
-            return "사용법: !가격설정 추가 [room_id] [방이름(선택)]\n!가격설정 수집 [room_id] [방이름(선택)]\n\n추가: 가격 조회만 가능\n수집: 시세 수집 + 가격 조회"
-        target_room = parts[2]
-        room_name = " ".join(parts[3:]) if len(parts) > 3 else ""
-        try:
-            resp = requests.post(
-                f"{WIKIBOT_URL}/api/trade/rooms",
-                json={"admin_id": sender_id, "room_id": target_room, "room_name": room_name, "collect": is_collect},
-                timeout=5,
-            )
-            data = resp.json()
-            # 캐시 초기화
-            _room_cache.clear()
-            _room_cache_time = 0
-            return data.get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"가격 방 추가 오류: {e}")
-            return "가격 방 추가 중 오류가 발생했습니다."
-
-    if msg.startswith("!가격설정 제거"):
-        parts = msg.split()
-        if len(parts) < 3:
-            return "사용법: !가격설정 제거 [room_id]"
-        target_room = parts[2]
-        try:
-            resp = requests.delete(
-                f"{WIKIBOT_URL}/api/trade/rooms/{target_room}",
-                json={"admin_id": sender_id},
-                timeout=5,
-            )
-            data = resp.json()
-            # 캐시 초기화
-            _room_cache.clear()
-            return data.get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"가격 방 제거 오류: {e}")
-            return "가격 방 제거 중 오류가 발생했습니다."
+ADMIN_HELP = """🔧 관리자 명령어
 
-    if msg.startswith("!가격설정 목록"):
-        try:
-            resp = requests.get(
-                f"{WIKIBOT_URL}/api/trade/rooms",
-                params={"admin_id": sender_id},
-                timeout=5,
-            )
-            data = resp.json()
-            if not data.get("success"):
-                return data.get("message", "조회 실패")
-            rooms = data.get("rooms", [])
-            if not rooms:
-                return "설정된 가격 방이 없습니다."
-            lines = ["[가격 방 목록]"]
-            for r in rooms:
-                mode = "수집+조회" if r.get("collect") else "조회만"
-                name = r.get("room_name") or r.get("room_id")
-                lines.append(f"- {name} ({r.get('room_id')}) [{mode}]")
-            return "\n".join(lines)
-        except Exception as e:
-            logger.error(f"가격 방 목록 오류: {e}")
-            return "가격 방 목록 조회 중 오류가 발생했습니다."
-
-    if msg.startswith("!가격설정"):
-        return "사용법:\n!가격설정 추가 [room_id] [방이름] - 조회만\n!가격설정 수집 [room_id] [방이름] - 수집+조회\n!가격설정 제거 [room_id]\n!가격설정 목록"
-
-    # ── 파티방 설정 ──
-    if msg.startswith("!파티설정 추가") or msg.startswith("!파티설정 수집"):
-        is_collect = msg.startswith("!파티설정 수집")
-        parts = msg.split()
-        if len(parts) < 3:
-            return "사용법: !파티설정 추가 [room_id] [방이름(선택)]\n!파티설정 수집 [room_id] [방이름(선택)]\n\n추가: 파티 조회만 가능\n수집: 파티 수집 + 조회"
-        target_room = parts[2]
-        room_name = " ".join(parts[3:]) if len(parts) > 3 else ""
-        try:
-            resp = requests.post(
-                f"{WIKIBOT_URL}/api/party/rooms",
-                json={"admin_id": sender_id, "room_id": target_room, "room_name": room_name, "collect": is_collect},
-                timeout=5,
-            )
-            data = resp.json()
-            # 캐시 초기화
-            _party_room_cache.clear()
-            return data.get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"파티 방 추가 오류: {e}")
-            return "파티 방 추가 중 오류가 발생했습니다."
-
-    if msg.startswith("!파티설정 제거"):
-        parts = msg.split()
-        if len(parts) < 3:
-            return "사용법: !파티설정 제거 [room_id]"
-        target_room = parts[2]
-        try:
-            resp = requests.delete(
-                f"{WIKIBOT_URL}/api/party/rooms/{target_room}",
-                json={"admin_id": sender_id},
-                timeout=5,
-            )
-            data = resp.json()
-            _party_room_cache.clear()
-            return data.get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"파티 방 제거 오류: {e}")
-            return "파티 방 제거 중 오류가 발생했습니다."
+[가격]
+!가격 [아이템명] - 시세 조회
+!가격설정 수집/추가/제거/목록
 
-    if msg.startswith("!파티설정 목록"):
-        try:
-            resp = requests.get(
-                f"{WIKIBOT_URL}/api/party/rooms",
-                params={"admin_id": sender_id},
-                timeout=5,
-            )
-            data = resp.json()
-            if not data.get("success"):
-                return data.get("message", "조회 실패")
-            rooms = data.get("rooms", [])
-            if not rooms:
-                return "설정된 파티 방이 없습니다."
-            lines = ["[파티 방 목록]"]
-            for r in rooms:
-                mode = "수집+조회" if r.get("collect") else "조회만"
-                name = r.get("room_name") or r.get("room_id")
-                lines.append(f"- {name} ({r.get('room_id')}) [{mode}]")
-            return "\n".join(lines)
-        except Exception as e:
-            logger.error(f"파티 방 목록 오류: {e}")
-            return "파티 방 목록 조회 중 오류가 발생했습니다."
-
-    if msg.startswith("!파티설정"):
-        return "사용법:\n!파티설정 추가 [room_id] [방이름] - 조회만\n!파티설정 수집 [room_id] [방이름] - 수집+조회\n!파티설정 제거 [room_id]\n!파티설정 목록"
-
-    # ── 별칭(줄임말) 관리 ──
-    if msg.startswith("!별칭 추가") or msg.startswith("!별칭추가"):
-        parts = msg.split()
-        if len(parts) < 4:
-            return "사용법: !별칭 추가 [줄임말] [정식명]\n예: !별칭 추가 강세 강화된세피어링"
-        alias_name = parts[2]
-        canonical = parts[3]
-        try:
-            resp = requests.post(
-                f"{WIKIBOT_URL}/api/trade/alias",
-                json={"alias": alias_name, "canonical_name": canonical},
-                timeout=5,
-            )
-            data = resp.json()
-            if data.get("success"):
-                return f"별칭 등록 완료: {alias_name} → {canonical}"
-            return data.get("message", "별칭 등록 실패")
-        except Exception as e:
-            logger.error(f"별칭 추가 오류: {e}")
-            return "별칭 추가 중 오류가 발생했습니다."
-
-    if msg.startswith("!별칭 삭제") or msg.startswith("!별칭삭제"):
-        parts = msg.split()
-        if len(parts) < 3:
-            return "사용법: !별칭 삭제 [줄임말]"
-        alias_name = parts[2]
-        try:
-            resp = requests.delete(
-                f"{WIKIBOT_URL}/api/trade/alias/{alias_name}",
-                timeout=5,
-            )
-            data = resp.json()
-            return data.get("message", "처리 완료")
-        except Exception as e:
-            logger.error(f"별칭 삭제 오류: {e}")
-            return "별칭 삭제 중 오류가 발생했습니다."
+[파티]
+!파티 [날짜] [직업] - 빈자리 조회
+!파티설정 수집/추가/제거/목록
 
-    if msg.startswith("!별칭 목록") or msg.startswith("!별칭목록"):
-        try:
-            resp = requests.get(
-                f"{WIKIBOT_URL}/api/trade/alias",
-                timeout=5,
-            )
-            data = resp.json()
-            if not data.get("success"):
-                return "별칭 목록 조회 실패"
-            aliases = data.get("aliases", [])
-            if not aliases:
-                return "등록된 별칭이 없습니다."
-            # 정식명별로 그룹화
-            groups = {}
-            for a in aliases:
-                cn = a.get("canonical_name", "")
-                if cn not in groups:
-                    groups[cn] = []
-                groups[cn].append(a.get("alias", ""))
-            lines = ["[별칭 목록]"]
-            for cn, alias_list in sorted(groups.items()):
-                lines.append(f"· {cn}: {', '.join(alias_list)}")
-            if len(lines) > 30:
-                lines = lines[:30]
-                lines.append(f"... 외 {len(groups) - 29}개")
-            return "\n".join(lines)
-        except Exception as e:
-            logger.error(f"별칭 목록 오류: {e}")
-            return "별칭 목록 조회 중 오류가 발생했습니다."
+[기타]
+!별칭 추가/삭제/목록
+!시세정리 - 가격 데이터 정리
+!닉변감지 추가/제거/목록
+!닉변이력 [방ID]
 
-    if msg.startswith("!별칭"):
-        return "사용법:\n!별칭 추가 [줄임말] [정식명]\n!별칭 삭제 [줄임말]\n!별칭 목록"
+[시스템]
+!관리자등록 - 최초 관리자 등록
+!서버재시작 - 서버 재배포
+!캐시초기화 - 검색 응답 캐시 비우기
+!느린요청 [개수] - 최근 느린 요청 단계별 시간
+!서킷 [초기화 그룹] - upstream 서킷 상태 / 강제 닫기
+!방확인 - 현재 방 ID 확인"""
 
-    # ── 가격 데이터 정리 ──
-    if msg.startswith("!시세정리"):
-        parts = msg.split()
-        since_date = parts[1] if len(parts) >= 2 else None
-        try:
-            payload = {}
-            if since_date:
-                payload["since_date"] = since_date
-            resp = requests.post(
-                f"{WIKIBOT_URL}/api/trade/cleanup",
-                json=payload,
-                timeout=30,
-            )
-            data = resp.json()
-            if data.get("success"):
-                lines = [
-                    "[가격 데이터 정리 완료]",
-                    f"· 제거: {data.get('removed', 0)}개 항목",
-                    f"· 유지: {data.get('kept', 0)}개 항목",
-                ]
-                examples = data.get("examples", [])
-                if examples:
-                    lines.append(f"\n제거된 항목:")
-                    for ex in examples[:10]:
-                        lines.append(f"  - {ex}")
-                    if len(examples) > 10:
-                        lines.append(f"  ... 외 {len(examples) - 10}개")
-                return "\n".join(lines)
-            return data.get("message", "정리 실패")
-        except Exception as e:
-            logger.error(f"가격 정리 오류: {e}")
-            return "가격 데이터 정리 중 오류가 발생했습니다."
 
-    if msg.startswith("!서버재시작"):
-        try:
-            resp = requests.post(
-                f"{WIKIBOT_URL}/api/nickname/admin/verify",
-                json={"admin_id": sender_id},
-                timeout=5,
-            )
-            data = resp.json()
-            if not data.get("success"):
-                return data.get("message", "권한이 없습니다.")
-        except Exception:
-            return "권한 확인 중 오류가 발생했습니다."
+class MessageContext:
+    """메시지 처리 컨텍스트.
+
+    방 설정, 기능 토글, 닉네임 체크는 처리 함수가 처음 필요로 할 때 한 번만 조회한다.
+    """
+
+    def __init__(self, msg, room, chat_id, sender, user_id):
+        self.msg = msg
+        self.room = room
+        self.chat_id = chat_id
+        self.sender = sender
+        self.user_id = user_id
+        self._config = None
+        self._room_kind = None
+        self._toggles = {}
+
+    def _room_config(self):
+        if self._config is None:
+            with tracer.span("room_config"):
+                self._config = room_configs.get(self.chat_id)
+        return self._config
+
+    @property
+    def room_unknown(self):
+        """방 설정을 조회하지 못해 방 종류를 알 수 없음"""
+        return self._room_config().get("unknown", False)
+
+    @property
+    def is_price_room(self):
+        """수집방 또는 조회방"""
+        return self._room_config()["trade"] is not None
+
+    @property
+    def is_party_room(self):
+        return self._room_config()["party"] is not None
+
+    @property
+    def is_trade_collect(self):
+        trade_room = self._room_config()["trade"]
+        return bool(trade_room and trade_room.get('collect'))
+
+    @property
+    def room_kind(self):
+        if self._room_kind is None:
+            party_room = self._room_config()["party"]
+            if party_room and party_room.get('collect'):
+                self._room_kind = ROOM_PARTY_COLLECT
+            elif self.is_trade_collect:
+                self._room_kind = ROOM_TRADE_COLLECT
+            else:
+                self._room_kind = ROOM_NORMAL
+        return self._room_kind
+
+    def feature_enabled(self, toggle_key):
+        if toggle_key not in self._toggles:
+            with tracer.span("feature_toggle"):
+                self._toggles[toggle_key] = check_feature_toggle(toggle_key, self.chat_id)
+        return self._toggles[toggle_key]
+
+
+COMMANDS = CommandRouter()
+
+
+def parse_party_args(args):
+    """!파티 [날짜] [직업] 인자 → 파티 조회 payload. 인자가 없으면 None"""
+    if not args:
+        return None
+    payload = {}
+    job_keywords = ['전사', '데빌', '도적', '법사', '직자', '도가']
+    for part in args.split():
+        if any(job in part for job in job_keywords):
+            payload["job"] = part
+        elif part in ['오늘', '내일'] or '/' in part or '월' in part:
+            payload["date"] = part
+    return payload
+
+
+def build_help(is_price_room, is_party_room):
+    """명령어 안내 (방에서 쓸 수 있는 명령만)"""
+    lines = [
+        "📋 명령어 안내",
+        "!아이템 [이름] - 아이템 검색",
+        "!스킬 [이름] - 스킬/마법 검색",
+        "!현자 [키워드] - 현자게시판[세오]내 글 재목 검색",
+        "!검색 [키워드] - 통합 검색",
+        "!공지 [날짜] - 공지사항 (예: !공지 2/5)",
+        "!업데이트 [날짜] - 업데이트 내역",
+    ]
+    if is_price_room:
+        lines.append("!가격 [아이템명] - 거래 시세 조회")
+    if is_party_room:
+        lines.append("!파티 [날짜] [직업] - 빈자리 파티 조회")
+    lines.append("")
+    lines.append("💡 &로 여러 개 동시 검색 가능")
+    lines.append("예: !아이템 오리하르콘 & 미스릴")
+    return "\n".join(lines)
+
+
+# 방 기능 조합별 도움말 (미리 만들어 둠): (가격방 여부, 파티방 여부) → 안내문
+HELP_TEXTS = {
+    (is_price_room, is_party_room): build_help(is_price_room, is_party_room)
+    for is_price_room in (False, True)
+    for is_party_room in (False, True)
+}
 
-        try:
-            # 재시작 완료 알림을 보낼 방 저장
-            if room_id:
-                save_restart_room(room_id)
 
-            # 배포 트리거 파일 생성 (호스트의 cron이 감지 후 deploy.sh 실행)
-            with open(DEPLOY_TRIGGER_FILE, 'w') as f:
-                f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            logger.info(f"서버 재시작 요청 (by {sender_id}) in room {room_id}")
-            return "서버 재시작을 시작합니다. (최대 1분 내 실행)"
-        except Exception as e:
-            logger.error(f"서버 재시작 오류: {e}")
-            return f"서버 재시작 실패: {e}"
+@COMMANDS.command("!방확인", exact=True, static=True)
+def cmd_room_info(ctx, args):
+    """방 확인"""
+    return f"[방 정보]\nroom: {ctx.room}\nchat_id: {ctx.chat_id}\nsender: {ctx.sender}\nuser_id: {ctx.user_id}"
+
+
+@COMMANDS.command("!관리자등록", "!닉변감지", "!닉변이력", "!서버재시작", "!캐시초기화", "!느린요청", "!서킷",
+                  rooms=(ROOM_NORMAL,))
+@COMMANDS.command("!가격설정", "!시세정리", "!별칭", rooms=(ROOM_NORMAL, ROOM_TRADE_COLLECT))
+@COMMANDS.command("!파티설정", rooms=(ROOM_NORMAL, ROOM_PARTY_COLLECT))
+def cmd_admin(ctx, args):
+    """관리자 명령 (DM 또는 그룹, 수집방은 해당 설정만)"""
+    return handle_admin_command(ctx.msg, ctx.user_id, room_id=ctx.chat_id)
+
+
+@COMMANDS.command("!아이템", rooms=(ROOM_NORMAL,), toggle="!검색")
+def cmd_item(ctx, query):
+    """아이템 검색"""
+    if not query:
+        return "검색어를 입력해주세요. 예: !아이템 오리하르콘"
+    return multi_search("/ask/item", query, ctx.sender, room_id=ctx.chat_id)
+
+
+@COMMANDS.command("!스킬", "!마법", rooms=(ROOM_NORMAL,), toggle="!검색")
+def cmd_skill(ctx, query):
+    """스킬/마법 검색"""
+    if not query:
+        return "검색어를 입력해주세요. 예: !스킬 메테오"
+    return multi_search("/ask/skill", query, ctx.sender, room_id=ctx.chat_id)
+
+
+@COMMANDS.command("!현자", rooms=(ROOM_NORMAL,), toggle="!현자")
+def cmd_community(ctx, query):
+    """게시판 검색"""
+    if not query:
+        return "검색어를 입력해주세요. 예: !현자 발록"
+    result = ask_wikibot("/ask/community", query, room_id=ctx.chat_id)
+    return format_search_result(result, ctx.sender)
+
+
+@COMMANDS.command("!공지", rooms=(ROOM_NORMAL,), toggle="!공지")
+def cmd_notice(ctx, query):
+    """공지사항"""
+    result = ask_wikibot("/ask/notice", query, room_id=ctx.chat_id)
+    return format_search_result(result, ctx.sender)
+
+
+@COMMANDS.command("!업데이트", rooms=(ROOM_NORMAL,), toggle="!업데이트")
+def cmd_update(ctx, query):
+    """업데이트"""
+    result = ask_wikibot("/ask/update", query, room_id=ctx.chat_id)
+    return format_search_result(result, ctx.sender)
 
-    return None
+
+@COMMANDS.command("!파티", rooms=(ROOM_NORMAL, ROOM_PARTY_COLLECT), toggle="!파티", parse=parse_party_args)
+def cmd_party(ctx, payload):
+    """!파티: 빈자리 안내 링크 (방 제한 없음) / !파티 [날짜] [직업]: 파티 조회 (설정된 방에서만)"""
+    if payload is None:
+        return PARTY_LINK_MESSAGE
+    if not ctx.is_party_room:
+        return "파티 조회가 활성화된 방에서만 사용 가능합니다.\n(관리자: !파티설정 추가/수집 [room_id])"
+    try:
+        resp = wikibot_http.post("/api/party/query", json=payload)
+        return resp.json().get("answer", "파티 정보가 없습니다.")
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"파티 조회 오류: {e}")
+        return "파티 조회에 실패했습니다."
+
+
+@COMMANDS.command("!가격", rooms=(ROOM_NORMAL, ROOM_TRADE_COLLECT))
+def cmd_price(ctx, query):
+    """가격 조회 (설정된 방에서만)"""
+    if not ctx.is_price_room:
+        return None
+    if not query:
+        return "사용법: !가격 [아이템명]\n예: !가격 암목\n예: !가격 5강 나겔반지"
+    result = ask_wikibot("/api/trade/query", alias_index.canonicalize(query), room_id=ctx.chat_id)
+    if result:
+        return result.get("answer", "가격 정보가 없습니다.")
+    return "가격 조회에 실패했습니다."
+
+
+@COMMANDS.command("!검색", "!질문", rooms=(ROOM_NORMAL,), toggle="!검색")
+def cmd_search(ctx, query):
+    """통합 검색"""
+    if not query:
+        return "검색어를 입력해주세요. 예: !검색 메테오"
+    # 내장 자료로 확실히 답할 수 있으면 wikibot 호출 없이 응답
+    local, confident = search_index.best(query)
+    if confident:
+        search_index.count("answered")
+        return format_local_result(local)
+    # 느린 RAG 응답도 정답이므로 이벤트 예산 전체를 기다리고, 로컬 자료는 wikibot이 실패했을 때만 쓴다
+    deadline = current_deadline()
+    failed = False
+    try:
+        with tracer.span("wikibot /ask"):
+            future = ask_wikibot_async("/ask", query, room_id=ctx.chat_id, deadline=deadline)
+            result = future.result(timeout=deadline.remaining() if deadline else None)
+        failed = result is None  # 200이 아닌 응답
+    except (FutureTimeoutError, DeadlineExceeded):
+        result = None  # 예산 초과: 응답은 계속 받아 캐시에 남김
+    except CircuitOpenError:
+        result, failed = None, True
+    except Exception as e:
+        logger.error(f"wikibot 통신 오류: {e}")
+        result, failed = None, True
+    if result is None:
+        result = stale_response("/ask", query)
+    if result is None and failed and local:
+        search_index.count("fallbacks")
+        return format_local_result(local, fallback=True)
+    if result is None and deadline is not None and deadline.expired():
+        raise DeadlineExceeded("시간 예산 초과 → wikibot /ask")
+    return format_search_result(result, ctx.sender)
+
+
+@COMMANDS.command("!도움말", "도움말", exact=True, rooms=(ROOM_NORMAL,))
+def cmd_help(ctx, args):
+    """도움말 ("도움말"은 느낌표 없이도)"""
+    return HELP_TEXTS[(ctx.is_price_room, ctx.is_party_room)]
+
+
+@COMMANDS.command("!관리자", exact=True, static=True)
+def cmd_admin_help(ctx, args):
+    """관리자 도움말"""
+    return ADMIN_HELP
 
 
 # ── 시스템 메시지 처리 ────────────────────────────────────
@@ -685,6 +3884,139 @@ def handle_system_message(data, chat_id):
         logger.error(f"시스템 메시지 처리 오류: {e}")
 
 
+# ── 이벤트 워커 풀 ───────────────────────────────────────
+
+# 웹훅 이벤트 처리 워커 수 / 최대 대기 이벤트 수
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '8'))
+WEBHOOK_QUEUE_MAX = int(os.getenv('WEBHOOK_QUEUE_MAX', '1000'))
+
+
+class RoomDispatcher:
+    """채팅방별 순서를 보장하는 고정 크기 워커 풀.
+
+    같은 chat_id의 이벤트는 도착 순서대로 하나씩 처리하고,
+    서로 다른 방의 이벤트는 워커 수만큼 병렬로 처리한다.
+    프로세스 하나 안에서만 동작하므로 SERVER_WORKERS > 1이면 순서를 보장하지 않는다
+    (gunicorn이 같은 방의 웹훅을 서로 다른 워커 프로세스에 나눠 줄 수 있음).
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._rooms = {}  # chat_id → 대기 이벤트 deque (처리 중인 방만 존재)
+        self._ready = queue.Queue()  # 처리할 차례가 된 chat_id
+        self._pending = 0
+        self._threads = []
+
+    def submit(self, chat_id, fn, *args):
+        """이벤트 추가. 대기열이 가득 찼으면 False"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            if not self._threads:
+                self._start()
+            self._pending += 1
+            room_queue = self._rooms.get(chat_id)
+            if room_queue is None:
+                self._rooms[chat_id] = deque([(fn, args)])
+                self._ready.put(chat_id)
+            else:
+                room_queue.append((fn, args))
+        return True
+
+    def pending(self):
+        return self._pending
+
+    def _start(self):
+        # 워커는 첫 이벤트에서 시작 (import 시점에 스레드를 만들지 않음)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"event-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _run(self):
+        while True:
+            chat_id = self._ready.get()
+            with self._lock:
+                fn, args = self._rooms[chat_id][0]
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"이벤트 워커 오류 [{chat_id}]: {e}")
+            with self._lock:
+                room_queue = self._rooms[chat_id]
+                room_queue.popleft()
+                self._pending -= 1
+                if room_queue:
+                    # 다른 방에 차례를 넘긴 뒤 이어서 처리
+                    self._ready.put(chat_id)
+                else:
+                    del self._rooms[chat_id]
+
+
+_dispatcher = RoomDispatcher(WEBHOOK_WORKERS, WEBHOOK_QUEUE_MAX)
+
+
+class EventRetryQueue:
+    """방 종류를 알 수 없어 처리하지 못한 이벤트를 delay초 뒤 다시 처리 대기열에 넣는다.
+
+    수집방 메시지를 일반 방 메시지로 잘못 분류해 버리지 않도록, 방 설정을 조회할 수 있을
+    때까지 최대 max_retries번 미룬다. 그래도 모르면 버린다(로그·통계에 남김).
+    """
+
+    def __init__(self, dispatcher, delay, max_retries):
+        self.dispatcher = dispatcher
+        self.delay = delay
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._heap = []  # (다시 넣을 시각, 순번, chat_id, data)
+        self._seq = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self.deferred = 0
+        self.dropped = 0
+
+    def defer(self, chat_id, data):
+        """다시 처리 예약. 재시도 횟수를 다 썼으면 False"""
+        retries = data.get("_room_retries", 0)
+        if retries >= self.max_retries:
+            with self._lock:
+                self.dropped += 1
+            return False
+        data = dict(data, _room_retries=retries + 1)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-retry", daemon=True)
+                self._thread.start()
+            self._seq += 1
+            heapq.heappush(self._heap, (time.monotonic() + self.delay, self._seq, chat_id, data))
+            self.deferred += 1
+        self._wake.set()
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                wait = self._heap[0][0] - time.monotonic() if self._heap else None
+            if wait is None or wait > 0:
+                self._wake.wait(timeout=wait)
+                self._wake.clear()
+                continue
+            with self._lock:
+                _, _, chat_id, data = heapq.heappop(self._heap)
+            if not self.dispatcher.submit(chat_id, process_event, data, time.monotonic()):
+                logger.warning(f"이벤트 대기열 초과 → 미룬 이벤트 버림 [{chat_id}]")
+                with self._lock:
+                    self.dropped += 1
+
+    def stats(self):
+        return {"pending": len(self._heap), "deferred": self.deferred, "dropped": self.dropped}
+
+
+_event_retries = EventRetryQueue(_dispatcher, ROOM_UNKNOWN_RETRY_DELAY, ROOM_UNKNOWN_MAX_RETRIES)
+
+
 # ── 웹훅 엔드포인트 ──────────────────────────────────────
 
 @app.route('/health', methods=['GET'])
@@ -692,6 +4024,145 @@ def health():
     return jsonify({"status": "healthy"})
 
 
+# 내부 API(wikibot 통지, 추적 조회) 인증 토큰. 요청은 X-Internal-Token 헤더로 보낸다.
+# 비워 두면 루프백·사설망(도커 네트워크) 주소에서 온 요청만 받는다
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN', '')
+
+
+def internal_request_allowed():
+    """내부 API 호출 허용 여부"""
+    if INTERNAL_API_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Internal-Token', ''), INTERNAL_API_TOKEN)
+    try:
+        addr = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return addr.is_loopback or addr.is_private
+
+
+@app.route('/features/invalidate', methods=['POST'])
+def features_invalidate():
+    """wikibot → 봇: 기능 토글 변경 통지. {room_id?, command?, enabled?(true/false)}"""
+    if not internal_request_allowed():
+        return jsonify({"status": "forbidden"}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "message": "JSON 객체가 필요합니다"}), 400
+    room_id = data.get('room_id')
+    command = data.get('command')
+    enabled = data.get('enabled')
+    # "false"·0 같은 값을 bool()로 바꾸면 켜짐이 되므로 JSON true/false만 받는다
+    if enabled is not None and not isinstance(enabled, bool):
+        return jsonify({"status": "error", "message": "enabled는 true/false여야 합니다"}), 400
+    if command is not None and not isinstance(command, str):
+        return jsonify({"status": "error", "message": "command는 문자열이어야 합니다"}), 400
+    if room_id is not None and (isinstance(room_id, bool) or not isinstance(room_id, (str, int))):
+        return jsonify({"status": "error", "message": "room_id는 문자열이어야 합니다"}), 400
+    feature_toggles.invalidate(
+        room_id=str(room_id) if room_id else None,
+        command=command,
+        enabled=enabled,
+    )
+    return jsonify({"status": "ok"})
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """내부 상태 (연결 풀 등)"""
+    return jsonify({
+        "http": {c.name: c.stats() for c in (wikibot_http, iris_http)},
+        "response_cache": response_cache.stats(),
+        "wikibot_singleflight": _wikibot_flight.stats(),
+        "feature_toggles": feature_toggles.stats(),
+        "room_configs": room_configs.stats(),
+        "event_retries": _event_retries.stats(),
+        "collect": collect_batcher.stats(),
+        "collect_prefilter": collect_classifier.stats(),
+        "alias_index": alias_index.stats(),
+        "search_index": search_index.stats(),
+        "tracing": tracer.stats(),
+        "reply_queue": reply_queue.stats(),
+        "nickname_cache": nickname_cache.stats(),
+        # 여러 워커로 실행하면 아래 값과 위 통계는 이 요청을 받은 워커 것
+        "pid": os.getpid(),
+        "shared_cache": shared_cache.stats() if shared_cache is not None else None,
+    })
+
+
+
+def _cache_ratio(stats):
+    total = stats["hits"] + stats.get("stale_hits", 0) + stats["misses"]
+    return round((stats["hits"] + stats.get("stale_hits", 0)) / total, 4) if total else 0
+
+
+MetricFunc("bot_response_cache_hits_total", "wikibot 응답 캐시 적중", "counter",
+           lambda: response_cache.hits)
+MetricFunc("bot_response_cache_misses_total", "wikibot 응답 캐시 미스", "counter",
+           lambda: response_cache.misses)
+MetricFunc("bot_response_cache_hit_ratio", "wikibot 응답 캐시 적중률", "gauge",
+           lambda: _cache_ratio(response_cache.stats()))
+MetricFunc("bot_room_config_lookups_total", "방 설정 조회 (hit/stale/miss)", "counter",
+           lambda: {("hit",): room_configs.hits, ("stale",): room_configs.stale_hits, ("miss",): room_configs.misses},
+           ("result",))
+MetricFunc("bot_room_config_hit_ratio", "방 설정 캐시 적중률 (stale 포함)", "gauge",
+           lambda: _cache_ratio(room_configs.stats()))
+MetricFunc("bot_event_queue_depth", "처리 대기 중인 웹훅 이벤트", "gauge", lambda: _dispatcher.pending())
+MetricFunc("bot_wikibot_queue_depth", "속도 제한으로 대기 중인 wikibot 요청", "gauge",
+           lambda: _wikibot_limiter.queued())
+MetricFunc("bot_wikibot_singleflight_inflight", "진행 중인 wikibot 요청 (같은 요청 공유)", "gauge",
+           lambda: _wikibot_flight.stats()["inflight"])
+MetricFunc("bot_reply_queue_depth", "전송 대기 중인 Iris 메시지", "gauge", lambda: reply_queue.pending())
+MetricFunc("bot_reply_sent_total", "Iris로 보낸 메시지(합친 뒤)", "counter", lambda: reply_queue.sent)
+MetricFunc("bot_reply_dropped_total", "재시도 후에도 못 보낸 메시지", "counter", lambda: reply_queue.dropped)
+MetricFunc("bot_collect_spool_depth", "수집 스풀에 남은 메시지", "gauge",
+           lambda: {(kind,): st["spool_depth"] for kind, st in collect_batcher.stats().items() if isinstance(st, dict)},
+           ("kind",))
+MetricFunc("bot_collect_prefilter_total", "수집 사전 분류 결과", "counter",
+           lambda: {(kind, result): st[kind][result] for st in [collect_classifier.stats()]
+                    for kind in ("trade", "party") for result in ("forwarded", "dropped")},
+           ("kind", "result"))
+MetricFunc("bot_nickname_checks_total", "닉네임 확인 (checked=upstream 조회, skipped=변경 없음)", "counter",
+           lambda: {("checked",): nickname_cache.checked, ("skipped",): nickname_cache.skipped}, ("result",))
+
+_CIRCUIT_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+MetricFunc("bot_circuit_state", "서킷 상태 (0=closed, 1=half_open, 2=open)", "gauge",
+           lambda: {(c.name, g): _CIRCUIT_STATE_VALUES[b.state]
+                    for c in (wikibot_http, iris_http) for g, b in c.breakers.items()},
+           ("upstream", "group"))
+MetricFunc("bot_circuit_rejected_total", "서킷이 열려 보내지 않은 요청", "counter",
+           lambda: {(c.name, g): b.rejected for c in (wikibot_http, iris_http) for g, b in c.breakers.items()},
+           ("upstream", "group"))
+MetricFunc("bot_circuit_opened_total", "서킷이 열린 횟수", "counter",
+           lambda: {(c.name, g): b.opened for c in (wikibot_http, iris_http) for g, b in c.breakers.items()},
+           ("upstream", "group"))
+MetricFunc("bot_upstream_adaptive_timeout_seconds", "엔드포인트별 현재 적응형 타임아웃", "gauge",
+           lambda: {(c.name, ep): t["timeout"] for c in (wikibot_http, iris_http)
+                    for ep, t in c.timeouts_snapshot().items()},
+           ("upstream", "endpoint"))
+
+
+@app.route('/traces/<kind>', methods=['GET'])
+def traces(kind):
+    """느린 요청(slow) / 표본 요청(recent) 추적 기록. ?limit=N
+    내부 API라 접근을 제한하고, 채팅 내용은 !느린요청(관리자)에서만 보여 준다"""
+    if not internal_request_allowed():
+        return jsonify({"error": "forbidden"}), 403
+    if kind not in ("slow", "recent"):
+        return jsonify({"error": "kind는 slow 또는 recent"}), 404
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        "threshold": SLOW_REQUEST_THRESHOLD,
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "traces": tracer.snapshot(kind, limit, redact=True),
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 텍스트 형식 메트릭"""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 # ── 대시보드 ──────────────────────────────────────────────
 
 DASHBOARD_HTML = '''
@@ -978,330 +4449,135 @@ def dashboard():
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
+    """Iris 이벤트 수신. 검증 후 워커 풀에 넣고 바로 응답한다."""
     try:
-        data = request.get_json(silent=True) or {}
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            WEBHOOK_EVENTS.inc("ignored")
+            return jsonify({"status": "ok"})
         logger.info(f"받은 데이터: {data}")
 
+        json_info = data.get('json') or {}
+        msg_type = str(json_info.get('type', '1'))
+        chat_id = str(json_info.get('chat_id', data.get('room', '')))
+        sender = data.get('sender', '')
+
+        # 시스템 메시지(입퇴장)가 아니면서 sender 없음 / 봇 자신의 메시지 → 무시
+        if msg_type != '0' and (not sender or sender == 'Iris'):
+            WEBHOOK_EVENTS.inc("ignored")
+            return jsonify({"status": "ok"})
+
+        if not _dispatcher.submit(chat_id, process_event, data, time.monotonic()):
+            WEBHOOK_EVENTS.inc("busy")
+            logger.warning(f"이벤트 대기열 초과 → 버림 [{chat_id}]")
+            return jsonify({"status": "busy"}), 503
+
+        WEBHOOK_EVENTS.inc("accepted")
+        return jsonify({"status": "ok"})
+
+    except Exception as e:
+        WEBHOOK_EVENTS.inc("error")
+        logger.error(f"Webhook error: {e}")
+        return jsonify({"status": "error"}), 500
+
+
+def process_event(data, queued_at=None):
+    """웹훅 이벤트 처리 (워커 스레드에서 실행, 같은 방은 순서대로 — 프로세스 하나일 때만).
+    queued_at: 대기열에 넣은 시각(monotonic)"""
+    EVENTS_IN_FLIGHT.inc()
+    started = time.monotonic()
+    deadline = Deadline(EVENT_BUDGET, queued_at)
+    set_deadline(deadline)
+    try:
         msg = data.get('msg', '')
         room = data.get('room', '')
         sender = data.get('sender', '')
-        is_group = data.get('isGroupChat', True)
-        json_info = data.get('json', {})
+        json_info = data.get('json') or {}
         msg_type = str(json_info.get('type', '1'))
         chat_id = str(json_info.get('chat_id', room))
         user_id = str(json_info.get('user_id', ''))
+        tracer.start(queued_at, chat_id=chat_id, sender=sender, msg=msg)
 
         # ── 시스템 메시지 (입퇴장) ──
         if msg_type == '0':
-            handle_system_message(data, chat_id)
-            return jsonify({"status": "ok"})
-
-        # sender 없으면 무시
-        if not sender:
-            return jsonify({"status": "ok"})
-
-        # 봇 자신의 메시지 무시
-        if sender == 'Iris':
-            return jsonify({"status": "ok"})
+            with tracer.span("system_message"):
+                handle_system_message(data, chat_id)
+            return
 
         logger.info(f"[{room}] {sender}: {msg}")
 
-        # ── 방 설정 조회 ──
         msg_stripped = msg.strip()
-        trade_room = check_trade_room(chat_id)
-        is_collect_room = trade_room and trade_room.get('collect')
-        is_price_room = trade_room is not None  # 수집방 또는 조회방
-
-        # 파티방 설정 조회
-        party_room = check_party_room(chat_id)
-        is_party_collect_room = party_room and party_room.get('collect')
-        is_party_room = party_room is not None
-
-        # ── 닉네임 변경 체크 (수집방 제외) ──
-        if not is_collect_room and user_id and chat_id:
-            notification = check_nickname(sender, user_id, chat_id)
-            if notification:
-                send_reply(chat_id, notification)
-
-        # ── 파티 수집방: 자동 수집 + !파티만 응답 ──
-        if is_party_collect_room:
-            if not msg_stripped.startswith('!'):
-                collect_party_message(msg, sender, chat_id)
-                return jsonify({"status": "ok"})
-
-            # 파티 수집방에서도 관리자 명령 허용
-            if msg_stripped.startswith("!파티설정"):
-                result = handle_admin_command(msg_stripped, user_id, room_id=chat_id)
-                if result:
-                    send_reply(chat_id, result)
-                return jsonify({"status": "ok"})
-
-            # 파티 수집방에서 !파티만 입력 → 웹사이트 안내
-            if msg_stripped == "!파티":
-                send_reply(chat_id, "📋 파티 빈자리 현황\n\n아래 링크에서 실시간 파티 빈자리를 확인하세요!\n👉 https://party.milddok.cc/\n\n* 어둠의전설 나겔파티 오픈톡 데이터 기반\n* 수집상태에 따라 오차가 있을 수 있습니다.")
-                return jsonify({"status": "ok"})
-
-            # 파티 수집방에서는 !파티 [인자]로 조회
-            if msg_stripped.startswith("!파티"):
-                # !파티 [날짜] [직업] 파싱
-                args = msg_stripped[3:].strip()
-                date_arg = None
-                job_arg = None
-
-                if args:
-                    job_keywords = ['전사', '데빌', '도적', '법사', '직자', '도가']
-                    parts = args.split()
-                    for part in parts:
-                        if any(job in part for job in job_keywords):
-                            job_arg = part
-                        elif part in ['오늘', '내일'] or '/' in part or '월' in part:
-                            date_arg = part
-
-                try:
-                    payload = {}
-                    if date_arg:
-                        payload["date"] = date_arg
-                    if job_arg:
-                        payload["job"] = job_arg
-
-                    resp = requests.post(
-                        f"{WIKIBOT_URL}/api/party/query",
-                        json=payload,
-                        timeout=10,
-                    )
-                    data = resp.json()
-                    send_reply(chat_id, data.get("answer", "파티 정보가 없습니다."))
-                except Exception as e:
-                    logger.error(f"파티 조회 오류: {e}")
-                    send_reply(chat_id, "파티 조회에 실패했습니다.")
-            return jsonify({"status": "ok"})
-
-        # ── 거래 수집방: 자동 수집 + !가격만 응답 ──
-        if is_collect_room:
-            if not msg_stripped.startswith('!'):
-                collect_trade_message(msg, sender, chat_id)
-                return jsonify({"status": "ok"})
-
-            # 수집방에서도 관리자 명령 허용
-            if msg_stripped.startswith("!가격설정") or msg_stripped.startswith("!시세정리") or msg_stripped.startswith("!별칭"):
-                result = handle_admin_command(msg_stripped, user_id, room_id=chat_id)
-                if result:
-                    send_reply(chat_id, result)
-                return jsonify({"status": "ok"})
-
-            # 수집방에서는 !가격만 허용
-            if msg_stripped.startswith("!가격"):
-                query = msg_stripped[3:].strip()
-                if query:
-                    result = ask_wikibot("/api/trade/query", query)
-                    if result:
-                        send_reply(chat_id, result.get("answer", "가격 정보가 없습니다."))
-                    else:
-                        send_reply(chat_id, "가격 조회에 실패했습니다.")
-                else:
-                    send_reply(chat_id, "사용법: !가격 [아이템명]\n예: !가격 암목\n예: !가격 5강 나겔반지")
-            return jsonify({"status": "ok"})
-
-        # ── 명령어 처리 (일반 방) ──
-        response_msg = None
-
-        # 방 확인
-        if msg_stripped == "!방확인":
-            response_msg = f"[방 정보]\nroom: {room}\nchat_id: {chat_id}\nsender: {sender}\nuser_id: {user_id}"
-
-        # 관리자 명령 (DM 또는 그룹)
-        elif msg_stripped.startswith("!관리자등록") or msg_stripped.startswith("!닉변감지") or msg_stripped.startswith("!닉변이력") or msg_stripped.startswith("!가격설정") or msg_stripped.startswith("!별칭") or msg_stripped.startswith("!시세정리") or msg_stripped.startswith("!파티설정"):
-            result = handle_admin_command(msg_stripped, user_id, room_id=chat_id)
-            if result:
-                response_msg = result
-
-        # 서버 재시작
-        elif msg_stripped.startswith("!서버재시작"):
-            result = handle_admin_command(msg_stripped, user_id, room_id=chat_id)
-            if result:
-                response_msg = result
-
-        # ── 기능 토글 체크 (관리자/도움말/방확인 제외) ──
-        # 토글 대상 명령어는 비활성 여부 먼저 확인
-        elif msg_stripped.startswith("!"):
-            cmd_word = msg_stripped.split()[0] if msg_stripped.split() else ""
-            toggle_key = COMMAND_TOGGLE_MAP.get(cmd_word)
-            toggled_off = toggle_key and not check_feature_toggle(toggle_key, chat_id)
-
-            if toggled_off:
-                pass  # 비활성 명령어는 무응답
-
-            # 아이템 검색
-            elif msg_stripped.startswith("!아이템"):
-                query = msg_stripped[4:].strip()
-                if query:
-                    response_msg = multi_search("/ask/item", query, sender)
-                else:
-                    response_msg = "검색어를 입력해주세요. 예: !아이템 오리하르콘"
+        ctx = MessageContext(msg_stripped, room, chat_id, sender, user_id)
+        command, args = COMMANDS.resolve(msg_stripped)
+        if command is not None:
+            tracer.annotate(command=command.prefix)
+
+        # ── 고정 응답 명령: 방 설정·닉네임·토글 조회 없이 바로 응답 ──
+        if command is not None and command.static:
+            with COMMAND_SECONDS.time(command.prefix):
+                send_reply(chat_id, command.handler(ctx, args))
+            return
 
-            # 스킬/마법 검색
-            elif msg_stripped.startswith("!스킬") or msg_stripped.startswith("!마법"):
-                query = msg_stripped[3:].strip()
-                if query:
-                    response_msg = multi_search("/ask/skill", query, sender)
-                else:
-                    response_msg = "검색어를 입력해주세요. 예: !스킬 메테오"
-
-            # 게시판 검색
-            elif msg_stripped.startswith("!현자"):
-                query = msg_stripped[4:].strip()
-                if query:
-                    result = ask_wikibot("/ask/community", query)
-                    response_msg = format_search_result(result, sender)
-                else:
-                    response_msg = "검색어를 입력해주세요. 예: !현자 발록"
-
-            # 공지사항
-            elif msg_stripped.startswith("!공지"):
-                query = msg_stripped[3:].strip()
-                result = ask_wikibot("/ask/notice", query)
-                response_msg = format_search_result(result, sender)
-
-            # 업데이트
-            elif msg_stripped.startswith("!업데이트"):
-                query = msg_stripped[5:].strip()
-                result = ask_wikibot("/ask/update", query)
-                response_msg = format_search_result(result, sender)
-
-            # 파티 빈자리 안내 (방 제한 없음)
-            elif msg_stripped == "!파티":
-                response_msg = "📋 파티 빈자리 현황\n\n아래 링크에서 실시간 파티 빈자리를 확인하세요!\n👉 https://party.milddok.cc/\n\n* 어둠의전설 나겔파티 오픈톡 데이터 기반\n* 수집상태에 따라 오차가 있을 수 있습니다."
-
-            # 파티 조회 (설정된 방에서만)
-            elif msg_stripped.startswith("!파티") and not msg_stripped.startswith("!파티설정"):
-                if is_party_room:
-                    args = msg_stripped[3:].strip()
-                    date_arg = None
-                    job_arg = None
-
-                    if args:
-                        job_keywords = ['전사', '데빌', '도적', '법사', '직자', '도가']
-                        parts = args.split()
-                        for part in parts:
-                            if any(job in part for job in job_keywords):
-                                job_arg = part
-                            elif part in ['오늘', '내일'] or '/' in part or '월' in part:
-                                date_arg = part
-
-                    try:
-                        payload = {}
-                        if date_arg:
-                            payload["date"] = date_arg
-                        if job_arg:
-                            payload["job"] = job_arg
-
-                        resp = requests.post(
-                            f"{WIKIBOT_URL}/api/party/query",
-                            json=payload,
-                            timeout=10,
-                        )
-                        data = resp.json()
-                        response_msg = data.get("answer", "파티 정보가 없습니다.")
-                    except Exception as e:
-                        logger.error(f"파티 조회 오류: {e}")
-                        response_msg = "파티 조회에 실패했습니다."
-                else:
-                    response_msg = "파티 조회가 활성화된 방에서만 사용 가능합니다.\n(관리자: !파티설정 추가/수집 [room_id])"
-
-            # 가격 조회 (설정된 방에서만)
-            elif msg_stripped.startswith("!가격") and not msg_stripped.startswith("!가격설정"):
-                if is_price_room:
-                    query = msg_stripped[3:].strip()
-                    if query:
-                        result = ask_wikibot("/api/trade/query", query)
-                        if result:
-                            response_msg = result.get("answer", "가격 정보가 없습니다.")
-                        else:
-                            response_msg = "가격 조회에 실패했습니다."
-                    else:
-                        response_msg = "사용법: !가격 [아이템명]\n예: !가격 암목\n예: !가격 5강 나겔반지"
-
-            # 통합 검색
-            elif msg_stripped.startswith("!검색") or msg_stripped.startswith("!질문"):
-                query = msg_stripped[3:].strip()
-                if query:
-                    result = ask_wikibot("/ask", query)
-                    response_msg = format_search_result(result, sender)
-                else:
-                    response_msg = "검색어를 입력해주세요. 예: !검색 메테오"
-
-            # 도움말
-            elif msg_stripped == "!도움말":
-                lines = [
-                    "📋 명령어 안내",
-                    "!아이템 [이름] - 아이템 검색",
-                    "!스킬 [이름] - 스킬/마법 검색",
-                    "!현자 [키워드] - 현자게시판[세오]내 글 재목 검색",
-                    "!검색 [키워드] - 통합 검색",
-                    "!공지 [날짜] - 공지사항 (예: !공지 2/5)",
-                    "!업데이트 [날짜] - 업데이트 내역",
-                ]
-                if is_price_room:
-                    lines.append("!가격 [아이템명] - 거래 시세 조회")
-                if is_party_room:
-                    lines.append("!파티 [날짜] [직업] - 빈자리 파티 조회")
-                lines.append("")
-                lines.append("💡 &로 여러 개 동시 검색 가능")
-                lines.append("예: !아이템 오리하르콘 & 미스릴")
-                response_msg = "\n".join(lines)
-
-            # 관리자 도움말
-            elif msg_stripped == "!관리자":
-                response_msg = """🔧 관리자 명령어
+        # ── 방 설정을 몰라 수집방인지 알 수 없으면 나중에 다시 처리 (일반 방으로 취급하지 않음) ──
+        if ctx.room_unknown:
+            if _event_retries.defer(chat_id, data):
+                logger.info(f"방 설정 조회 실패 → {ROOM_UNKNOWN_RETRY_DELAY:g}초 뒤 다시 처리 [{chat_id}]")
+            else:
+                logger.warning(f"방 설정을 끝내 알 수 없어 메시지 버림 [{chat_id}] {msg[:30]}")
+            return
 
-[가격]
-!가격 [아이템명] - 시세 조회
-!가격설정 수집/추가/제거/목록
+        # ── 닉네임 변경 체크 (거래 수집방 제외) ──
+        if user_id and chat_id and not ctx.is_trade_collect:
+            with tracer.span("nickname"):
+                notification = check_nickname(sender, user_id, chat_id)
+            if notification:
+                send_reply(chat_id, notification)
 
-[파티]
-!파티 [날짜] [직업] - 빈자리 조회
-!파티설정 수집/추가/제거/목록
+        # ── 수집방: 명령어가 아닌 메시지는 자동 수집 ──
+        if not msg_stripped.startswith('!'):
+            if ctx.room_kind == ROOM_PARTY_COLLECT:
+                if collect_classifier.accept("party", msg):
+                    collect_party_message(msg, sender, chat_id)
+                return
+            if ctx.room_kind == ROOM_TRADE_COLLECT:
+                if collect_classifier.accept("trade", msg):
+                    collect_trade_message(msg, sender, chat_id)
+                return
 
-[기타]
-!별칭 추가/삭제/목록
-!시세정리 - 가격 데이터 정리
-!닉변감지 추가/제거/목록
-!닉변이력 [방ID]
+        # ── 명령어 처리 ──
+        if command is None or (command.rooms and ctx.room_kind not in command.rooms):
+            return
 
-[시스템]
-!관리자등록 - 최초 관리자 등록
-!서버재시작 - 서버 재배포
-!방확인 - 현재 방 ID 확인"""
+        # 기능 토글 (일반 방만 확인, 비활성 명령어는 무응답)
+        if command.toggle and ctx.room_kind == ROOM_NORMAL and not ctx.feature_enabled(command.toggle):
+            return
 
-        # "도움말" (느낌표 없이)
-        elif msg_stripped == "도움말":
-            lines = [
-                "📋 명령어 안내",
-                "!아이템 [이름] - 아이템 검색",
-                "!스킬 [이름] - 스킬/마법 검색",
-                "!현자 [키워드] - 현자게시판[세오]내 글 재목 검색",
-                "!검색 [키워드] - 통합 검색",
-                "!공지 [날짜] - 공지사항 (예: !공지 2/5)",
-                "!업데이트 [날짜] - 업데이트 내역",
-            ]
-            if is_price_room:
-                lines.append("!가격 [아이템명] - 거래 시세 조회")
-            if is_party_room:
-                lines.append("!파티 [날짜] [직업] - 빈자리 파티 조회")
-            lines.append("")
-            lines.append("💡 &로 여러 개 동시 검색 가능")
-            lines.append("예: !아이템 오리하르콘 & 미스릴")
-            response_msg = "\n".join(lines)
-
-        # 응답 전송
+        try:
+            # 방 설정·토글 조회에서 예산을 다 썼으면 처리하지 않고 사과 답장
+            if deadline.expired():
+                deadline.exceeded = True
+                raise DeadlineExceeded("시간 예산 초과 → 명령 처리 생략")
+            with COMMAND_SECONDS.time(command.prefix), tracer.span(f"handler {command.prefix}"):
+                response_msg = command.handler(ctx, args)
+        except DeadlineExceeded as e:
+            BUDGET_EXCEEDED.inc(command.prefix)
+            tracer.annotate(deadline_exceeded=True)
+            logger.warning(f"{e} [{chat_id}] {msg[:30]}")
+            response_msg = BUDGET_EXCEEDED_REPLY
+        except Exception:
+            COMMAND_ERRORS.inc(command.prefix)
+            raise
         if response_msg:
             send_reply(chat_id, response_msg)
 
-        return jsonify({"status": "ok"})
-
     except Exception as e:
-        logger.error(f"Webhook error: {e}")
-        return jsonify({"status": "error"}), 500
+        EVENT_ERRORS.inc()
+        logger.error(f"이벤트 처리 오류: {e}")
+    finally:
+        set_deadline(None)
+        EVENTS_IN_FLIGHT.dec()
+        EVENT_SECONDS.observe(time.monotonic() - started)
+        tracer.finish()
 
 
 # 재시작 요청 저장 파일
@@ -1319,7 +4595,10 @@ def save_restart_room(room_id):
 
 def send_startup_notification():
     """서버 시작 시 재시작 요청한 방에 알림 전송"""
-    import threading
+
+    # 여러 워커 프로세스로 실행해도 한 번만 알림
+    if not acquire_process_lock("startup_notify"):
+        return
 
     def notify():
         # wikibot이 준비될 때까지 대기
@@ -1349,6 +4628,84 @@ def send_startup_notification():
     thread.start()
 
 
+# ── 서버 실행 ─────────────────────────────────────────────
+# SERVER_WORKERS=1(기본): Flask 개발 서버 한 프로세스 (기존 동작)
+# SERVER_WORKERS>1: gunicorn 워커 프로세스 여러 개 (python app.py 그대로, gunicorn 설치 필요)
+#   - 방 설정·기능 토글·응답 캐시는 SHARED_CACHE_PATH(SQLite)로 공유
+#   - 수집 스풀 재전송·재시작 알림은 파일 잠금을 얻은 워커 하나만
+#   - Iris 전송 속도(IRIS_SEND_RATE)는 공유 캐시 파일의 토큰 버킷으로 워커 전체에 적용
+#   - 같은 방 메시지의 처리·답장 순서는 보장하지 않음 (순서가 필요하면 SERVER_WORKERS=1)
+#   - /stats, /metrics, !느린요청은 요청을 받은 워커의 값
+SERVER_BIND = os.getenv('SERVER_BIND', '0.0.0.0:5000')
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '4'))  # 워커당 HTTP 스레드 (웹훅은 대기열에 넣고 바로 응답)
+# 종료 신호 후 받아 둔 이벤트·답장을 처리할 시간(초). docker stop 기본 유예(10초)보다 짧게
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', '8'))
+SERVER_DRAIN_TIMEOUT = 5
+
+
+def drain(timeout):
+    """종료 전: 대기열의 이벤트와 보낼 답장을 timeout초까지 처리하고 닉네임 캐시 저장"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and (_dispatcher.pending() or reply_queue.pending()):
+        time.sleep(0.1)
+    left = _dispatcher.pending() + reply_queue.pending()
+    if left:
+        logger.warning(f"종료: 처리하지 못한 이벤트·답장 {left}건")
+    try:
+        nickname_cache.save()
+    except Exception as e:
+        logger.error(f"닉네임 캐시 저장 오류: {e}")
+
+
+def _gunicorn_post_fork(server, worker):
+    # 스레드는 fork 뒤 워커에서 시작 (마스터는 스레드 없이 fork만 함)
+    send_startup_notification()
+    collect_batcher.start()
+
+
+def _gunicorn_worker_exit(server, worker):
+    drain(SERVER_DRAIN_TIMEOUT)
+
+
+GUNICORN_OPTIONS = {
+    "bind": SERVER_BIND,
+    "workers": SERVER_WORKERS,
+    "worker_class": "gthread",
+    "threads": SERVER_THREADS,
+    "graceful_timeout": SERVER_GRACEFUL_TIMEOUT,
+    "timeout": 30,
+    "keepalive": 5,
+    "post_fork": _gunicorn_post_fork,
+    "worker_exit": _gunicorn_worker_exit,
+}
+
+
+def run_production():
+    """gunicorn으로 SERVER_WORKERS개 워커 실행. gunicorn이 없으면 False"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        return False
+
+    class BotServer(BaseApplication):
+        def load_config(self):
+            for key, value in GUNICORN_OPTIONS.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    logger.info(f"gunicorn 워커 {SERVER_WORKERS}개로 시작 ({SERVER_BIND}, 공유 캐시 {SHARED_CACHE_PATH})")
+    logger.warning("여러 워커로 실행: 같은 방 메시지의 처리·답장 순서는 보장되지 않습니다")
+    BotServer().run()
+    return True
+
+
 if __name__ == '__main__':
+    if SERVER_WORKERS > 1:
+        if run_production():
+            sys.exit(0)
+        logger.warning("gunicorn이 설치되지 않아 개발 서버 한 프로세스로 실행합니다 (pip install gunicorn)")
     send_startup_notification()
+    collect_batcher.start()
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+import threading
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+# app.py는 패키지가 아니라 저장소 루트의 단일 파일 (tools/ 스크립트와 같은 방식으로 import)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+class FakeUpstream:
+    """HttpClient 세션 대역. handler(path, body, timeout) → (상태 코드, 본문) 또는 예외.
+    본문이 str이면 그대로, 아니면 JSON으로 보낸다. 받은 요청은 calls에 (path, body)로 기록"""
+
+    def __init__(self, client, handler):
+        self.client = client
+        self.handler = handler
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, timeout=None, json=None, **kwargs):
+        path = urlsplit(url).path
+        with self._lock:
+            self.calls.append((path, json))
+        status, body = self.handler(path, json, timeout)
+        resp = requests.Response()
+        resp.status_code = status
+        resp.url = url
+        resp._content = (body if isinstance(body, str) else _json_dumps(body)).encode()
+        return resp
+
+
+def _json_dumps(body):
+    return json.dumps(body, ensure_ascii=False)
+
+
+_CLIENT_SETTINGS = {
+    "wikibot": (app.WIKIBOT_TIMEOUTS, app.WIKIBOT_BREAKER_GROUPS),
+    "iris": (app.IRIS_TIMEOUTS, app.IRIS_BREAKER_GROUPS),
+}
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    """fake_upstream("wikibot" | "iris", handler): app의 해당 HttpClient를 handler가 응답하는
+    새 클라이언트로 바꾸고 FakeUpstream을 돌려준다 (서킷·타임아웃 상태도 테스트마다 새로)"""
+
+    def install(name, handler):
+        client = app.HttpClient(name, f"http://{name}.test", 1, *_CLIENT_SETTINGS[name])
+        upstream = FakeUpstream(client, handler)
+        monkeypatch.setattr(client, "_session", upstream)
+        monkeypatch.setattr(app, f"{name}_http", client)
+        return upstream
+
+    return install
@@ -0,0 +1,30 @@
+"""add_game_data.py: 서버가 저장한 문서는 응답에 ID가 없어도 매니페스트에 기록한다"""
+import os
+
+import requests
+
+import add_game_data
+
+
+class FakeSession:
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    def post(self, url, json=None, timeout=None):
+        resp = requests.Response()
+        resp.status_code = self.status
+        resp._content = self.body.encode()
+        return resp
+
+
+def test_2xx_without_id_counts_as_added():
+    doc = {"title": "t", "content": "c", "category": "", "source_url": ""}
+    assert add_game_data.add_document(FakeSession(200, "{}"), doc) == (True, None)
+    assert add_game_data.add_document(FakeSession(201, ""), doc) == (True, None)
+    assert add_game_data.add_document(FakeSession(200, '{"id": 7}'), doc) == (True, 7)
+    assert add_game_data.add_document(FakeSession(400, "{}"), doc) == (False, None)
+
+
+def test_manifest_lives_next_to_the_script():
+    assert os.path.dirname(add_game_data.MANIFEST_FILE) == os.path.dirname(os.path.abspath(add_game_data.__file__))
@@ -0,0 +1,92 @@
+"""수집 배치 전송(CollectBatcher): 일부만 전달된 배치의 재전송과 스풀 대기 건수"""
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class FakeWikibot:
+    """수집 엔드포인트 대역. 단건으로 받은 항목을 순서대로 기록"""
+
+    def __init__(self, bulk_status=404, bulk_body="<html>404 Not Found</html>", fail_once=()):
+        self.bulk_status = bulk_status
+        self.bulk_body = bulk_body
+        self.fail_once = set(fail_once)
+        self.bulk_calls = 0
+        self.received = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path, body, timeout):
+        with self._lock:
+            if path.endswith("/bulk"):
+                self.bulk_calls += 1
+                return self.bulk_status, self.bulk_body
+            if body["id"] in self.fail_once:
+                self.fail_once.discard(body["id"])
+                return 500, {}
+            self.received.append(body["id"])
+            return 200, {"success": True}
+
+
+@pytest.fixture
+def batcher(tmp_path, monkeypatch, fake_upstream):
+    def make(wikibot, batch_size=5, interval=0.1):
+        fake_upstream("wikibot", wikibot)
+        monkeypatch.setattr(app, "COLLECT_RETRY_BASE", 0.05)
+        monkeypatch.setattr(app, "COLLECT_REPLAY_RATE", 1000)
+        spool = app.CollectSpool(str(tmp_path / "spool.db"))
+        return app.CollectBatcher(spool, {"trade": "/api/trade/collect"}, batch_size, interval)
+    return make
+
+
+def _drain(batcher, timeout=3):
+    end = time.monotonic() + timeout
+    while batcher.spool.depth().get("trade") and time.monotonic() < end:
+        time.sleep(0.02)
+
+
+def test_failed_item_resends_only_the_rest(batcher):
+    """단건 전송이 중간에 실패해도 이미 전달된 항목은 다시 보내지 않는다"""
+    wikibot = FakeWikibot(fail_once={"c"})
+    b = batcher(wikibot)
+    for item_id in "abcde":
+        b.add("trade", {"id": item_id})
+    _drain(b)
+    assert wikibot.received == list("abcde")
+    assert b.stats()["trade"]["items"] == 5
+
+
+def test_bulk_handler_404_does_not_fall_back(batcher):
+    """bulk 처리 함수가 돌려준 404는 경로가 없는 것이 아니므로 단건으로 보내지 않는다"""
+    wikibot = FakeWikibot(bulk_body='{"success": false, "message": "unknown kind"}')
+    b = batcher(wikibot)
+    assert b.send("trade", [{"id": "a"}, {"id": "b"}]) == 0
+    assert wikibot.received == []
+
+
+def test_add_during_depth_reload_is_counted(batcher, monkeypatch):
+    """재전송 담당이 대기 건수를 읽는 사이에 들어온 메시지도 배치 크기에 포함된다"""
+    wikibot = FakeWikibot(bulk_status=200, bulk_body='{"success": true, "received": 5}')
+    b = batcher(wikibot, interval=60)  # 시간 조건이 아니라 배치 크기로 전송되는지 확인
+    for item_id in "abcd":
+        b.spool.append("trade", {"id": item_id})
+    depth = b.spool.depth
+    raced = []
+
+    def depth_then_add():
+        result = depth()
+        if not raced and threading.current_thread().name == "collect-replay":
+            # 재전송 스레드의 첫 조회 직후 다른 스레드의 add()가 끼어든 상황
+            raced.append(True)
+            adder = threading.Thread(target=b.add, args=("trade", {"id": "e"}))
+            adder.start()
+            adder.join()
+        return result
+
+    monkeypatch.setattr(b.spool, "depth", depth_then_add)
+    b.start()
+    _drain(b)
+    assert wikibot.bulk_calls == 1
+    assert b.stats()["trade"]["spool_depth"] == 0
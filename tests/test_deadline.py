@@ -0,0 +1,39 @@
+"""이벤트 시간 예산을 넘긴 명령은 일반 오류 메시지가 아니라 예산 초과 답장을 보낸다"""
+import time
+
+import pytest
+import requests
+
+import app
+
+
+def _stall(path, body, timeout):
+    """타임아웃까지 응답하지 않는 wikibot"""
+    time.sleep(timeout)
+    raise requests.ReadTimeout(f"{path} 응답 없음")
+
+
+@pytest.fixture
+def slow_event(monkeypatch, fake_upstream):
+    """wikibot이 멈춘 상태에서 이벤트 하나를 처리하고 보낸 답장 목록을 돌려주는 함수"""
+    monkeypatch.setattr(app, "EVENT_BUDGET", 0.5)
+    wikibot = fake_upstream("wikibot", _stall)
+    monkeypatch.setattr(app.room_configs, "get", lambda chat_id: {"trade": None, "party": {"collect": False}})
+    monkeypatch.setattr(app, "check_feature_toggle", lambda command, room_id: True)
+    replies = []
+    monkeypatch.setattr(app, "send_reply", lambda chat_id, message: replies.append(message))
+
+    def run(msg):
+        app.process_event({"msg": msg, "room": "테스트방", "sender": "tester", "json": {"chat_id": "42"}})
+        assert wikibot.calls, "wikibot을 호출하지 않음"
+        return replies
+
+    return run
+
+
+def test_party_query_past_budget_sends_budget_reply(slow_event):
+    assert slow_event("!파티 오늘 법사") == [app.BUDGET_EXCEEDED_REPLY]
+
+
+def test_admin_command_past_budget_sends_budget_reply(slow_event):
+    assert slow_event("!캐시초기화") == [app.BUDGET_EXCEEDED_REPLY]
@@ -0,0 +1,82 @@
+"""기능 토글 스냅샷(FeatureToggleSnapshot)의 워커 간 공유와 갱신 범위"""
+import time
+
+import app
+
+
+class FakeCheck:
+    """/api/features/check 대역: 호출을 세고 values(없으면 활성)를 돌려줌"""
+
+    def __init__(self):
+        self.values = {}
+        self.calls = []
+
+    def __call__(self, command, room_id):
+        self.calls.append((command, room_id))
+        return self.values.get((command, room_id), True)
+
+
+def _worker(path, interval=3600):
+    return app.FeatureToggleSnapshot(app.COMMAND_TOGGLE_MAP.values(), interval,
+                                     app.SharedView(app.SharedCache(path), "feature_toggle"))
+
+
+def test_pushed_value_reaches_every_worker_without_refetch(tmp_path, monkeypatch):
+    """enabled가 담긴 통지는 다른 워커에도 그대로 적용되고, 다른 방은 다시 조회하지 않는다"""
+    check = FakeCheck()
+    monkeypatch.setattr(app, "fetch_feature_toggle", check)
+    monkeypatch.setattr(app, "SHARED_CACHE_SYNC_INTERVAL", 0)
+    path = str(tmp_path / "shared.db")
+    a, b = _worker(path), _worker(path)
+
+    assert a.is_enabled("!파티", "r1")
+    assert b.is_enabled("!파티", "r1")  # a가 읽어 둔 공유 항목
+    assert b.is_enabled("!검색", "r2")
+    assert len(check.calls) == 2
+
+    a.invalidate(room_id="r1", command="!파티", enabled=False)
+    assert a.is_enabled("!파티", "r1") is False
+    assert b.is_enabled("!파티", "r1") is False
+    assert b.is_enabled("!검색", "r2")
+    time.sleep(0.1)  # 백그라운드 갱신이 있다면 끝날 시간
+    assert len(check.calls) == 2
+
+
+def test_refresh_reads_only_used_toggles(monkeypatch):
+    """주기 갱신은 쓰인 방의 쓰인 토글만 다시 읽고, 쓰이지 않은 방은 비운다"""
+    check = FakeCheck()
+    monkeypatch.setattr(app, "fetch_feature_toggle", check)
+    toggles = app.FeatureToggleSnapshot(app.COMMAND_TOGGLE_MAP.values(), 0.2)
+
+    assert toggles.is_enabled("!검색", "r1")
+    assert toggles.is_enabled("!검색", "r2")
+    time.sleep(0.3)  # 첫 주기: r1, r2 모두 "!검색"만 다시 읽음
+    assert sorted(check.calls[2:]) == [("!검색", "r1"), ("!검색", "r2")]
+
+    toggles.is_enabled("!검색", "r1")
+    time.sleep(0.2)  # 둘째 주기: r2는 쓰이지 않아 비움
+    assert set(check.calls[4:]) == {("!검색", "r1")}
+    assert toggles.stats()["rooms"] == 1
+
+
+def test_invalidate_route_rejects_non_bool_and_outside_callers(monkeypatch):
+    """enabled는 JSON true/false만 받고, 토큰이 없으면 외부 주소의 통지는 거절한다"""
+    calls = []
+    monkeypatch.setattr(app.feature_toggles, "invalidate", lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(app, "INTERNAL_API_TOKEN", "")
+    client = app.app.test_client()
+
+    def post(body, addr="172.18.0.5", **kwargs):
+        return client.post("/features/invalidate", json=body, environ_base={"REMOTE_ADDR": addr}, **kwargs)
+
+    for bad in ("false", 0, 1, "true"):
+        assert post({"room_id": "1", "command": "!파티", "enabled": bad}).status_code == 400
+    assert post({"room_id": "1", "command": "!파티", "enabled": False}, addr="8.8.8.8").status_code == 403
+    assert calls == []
+
+    assert post({"room_id": "1", "command": "!파티", "enabled": False}).status_code == 200
+    assert calls == [{"room_id": "1", "command": "!파티", "enabled": False}]
+
+    monkeypatch.setattr(app, "INTERNAL_API_TOKEN", "s3cret")
+    assert post({"room_id": "1"}).status_code == 403
+    assert post({"room_id": "1"}, headers={"X-Internal-Token": "s3cret"}).status_code == 200
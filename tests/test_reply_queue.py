@@ -0,0 +1,85 @@
+"""Iris 서킷 브레이커와 전송 큐(ReplyQueue)의 상호작용"""
+import time
+
+import app
+
+
+def test_open_circuit_defers_replies_without_using_retries(monkeypatch, fake_upstream):
+    """Iris 장애가 재시도 백오프보다 짧아도 서킷이 열려 있는 동안 답장을 버리지 않는다"""
+    # 재시도(0.05+0.1+0.2초)는 서킷이 열려 있는 1초보다 훨씬 빨리 끝난다
+    monkeypatch.setattr(app, "BREAKER_OPEN_SECONDS", 1.0)
+    monkeypatch.setattr(app, "REPLY_RETRY_BASE", 0.05)
+    down_until = time.monotonic() + 0.3
+    iris = fake_upstream("iris", lambda path, body, timeout: (503 if time.monotonic() < down_until else 200, {}))
+
+    queue = app.ReplyQueue(0.0, 1000, 1000)
+    rooms = [f"room-{i}" for i in range(8)]
+    for room in rooms:
+        queue.send(room, "안녕하세요")
+
+    deadline = time.monotonic() + 10
+    while queue.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    stats = queue.stats()
+    breaker = iris.client.breakers["reply"].stats()
+    assert breaker["opened"] >= 1 and breaker["rejected"] >= 1  # 실제로 서킷이 열렸던 상황
+    assert stats["deferred"] >= 1
+    assert stats["dropped"] == 0
+    assert stats["sent"] == len(rooms)
+    delivered = [body["room"] for path, body in iris.calls if path == "/reply"][-len(rooms):]
+    assert sorted(delivered) == sorted(rooms)
+
+
+def _wait(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_open_circuit_does_not_spend_send_tokens(monkeypatch, fake_upstream):
+    """서킷이 열린 동안 미룬 답장은 전송 토큰을 쓰지 않아, 닫히면 버스트만큼 바로 나간다"""
+    monkeypatch.setattr(app, "REPLY_RETRY_BASE", 0.05)
+    iris = fake_upstream("iris", lambda path, body, timeout: (200, {}))
+    breaker = iris.client.breakers["reply"]
+    with breaker._lock:
+        breaker._open(0.3)
+
+    queue = app.ReplyQueue(0.0, 0.1, 2)  # 토큰 하나 보충에 10초
+    for room in ("a", "b"):
+        queue.send(room, "안녕하세요")
+    assert _wait(lambda: queue.stats()["sent"] == 2, 3)
+    assert queue.stats()["deferred"] >= 1
+
+
+def test_slow_room_does_not_block_other_rooms(fake_upstream):
+    """한 방의 전송이 느려도 다른 방 답장은 다른 전송 스레드가 보낸다"""
+    def reply(path, body, timeout):
+        if body["room"] == "slow":
+            time.sleep(1.0)
+        return 200, {}
+
+    iris = fake_upstream("iris", reply)
+    queue = app.ReplyQueue(0.0, 1000, 1000, senders=2)
+    queue.send("slow", "느린 방")
+    time.sleep(0.05)
+    queue.send("fast", "빠른 방")
+    assert _wait(lambda: any(body["room"] == "fast" for _, body in iris.calls), 0.5)
+
+
+def test_room_order_kept_across_senders(fake_upstream):
+    """전송 스레드가 여럿이어도 같은 방 메시지는 보낸 순서대로 나간다"""
+    def reply(path, body, timeout):
+        time.sleep(0.02)
+        return 200, {}
+
+    iris = fake_upstream("iris", reply)
+    queue = app.ReplyQueue(0.0, 1000, 1000, senders=4)
+    for i in range(20):
+        queue.send("r", str(i))
+        queue.send(f"other-{i % 3}", str(i))
+        time.sleep(0.005)
+    assert _wait(lambda: queue.pending() == 0, 5)
+    texts = [body["data"] for _, body in iris.calls if body["room"] == "r"]
+    assert "\n\n".join(texts).split("\n\n") == [str(i) for i in range(20)]
@@ -0,0 +1,47 @@
+"""방 설정을 모를 때(RoomConfigStore) 수집방 메시지를 일반 방 메시지로 처리하지 않는다"""
+import time
+
+import app
+
+PARTY_COLLECT = {"success": True, "rooms": {"42": {"trade": None, "party": {"room_id": "42", "collect": True}}}}
+
+
+def test_first_seen_room_is_not_cut_by_event_budget(fake_upstream, monkeypatch):
+    """처음 보는 방의 설정 조회는 이벤트 예산이 거의 없어도 끝까지 기다린다"""
+    def slow_config(path, body, timeout):
+        time.sleep(0.3)
+        return 200, PARTY_COLLECT
+
+    fake_upstream("wikibot", slow_config)
+    store = app.RoomConfigStore(300)
+    app.set_deadline(app.Deadline(0.1))
+    try:
+        config = store.get("42")
+    finally:
+        app.set_deadline(None)
+    assert not config.get("unknown")
+    assert config["party"]["collect"] is True
+
+
+def test_unknown_room_message_is_retried_until_config_loads(fake_upstream, monkeypatch):
+    """설정 조회가 실패한 방의 메시지는 미뤄 두었다가, 조회되면 수집방 메시지로 처리한다"""
+    wikibot_up = []
+    fake_upstream("wikibot", lambda path, body, timeout: (200, PARTY_COLLECT) if wikibot_up else (500, {}))
+    monkeypatch.setattr(app, "ROOM_CACHE_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(app, "room_configs", app.RoomConfigStore(300))
+    monkeypatch.setattr(app, "_event_retries", app.EventRetryQueue(app._dispatcher, 0.1, 20))
+    monkeypatch.setattr(app.collect_classifier, "accept", lambda kind, msg: True)
+    collected = []
+    monkeypatch.setattr(app, "collect_party_message", lambda msg, sender, chat_id: collected.append(msg))
+    replies = []
+    monkeypatch.setattr(app, "send_reply", lambda chat_id, message: replies.append(message))
+
+    app.process_event({"msg": "7시 파티 구해요", "room": "파티방", "sender": "tester", "json": {"chat_id": "42"}})
+    assert collected == [] and app._event_retries.stats()["deferred"] == 1
+
+    wikibot_up.append(True)
+    deadline = time.monotonic() + 5
+    while not collected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert collected == ["7시 파티 구해요"]
+    assert replies == []
@@ -0,0 +1,28 @@
+"""로컬 검색 색인(SearchIndex) 파일 생성과 읽기"""
+import json
+
+import app
+
+
+def _index(tmp_path, docs):
+    data = tmp_path / "game_data.json"
+    data.write_text(json.dumps(docs, ensure_ascii=False), encoding="utf-8")
+    index = app.SearchIndex(str(data), str(tmp_path / "index.bin"))
+    index.load()
+    return index
+
+
+def test_empty_or_tokenless_corpus(tmp_path):
+    """문서가 없거나 모든 문서에 토큰이 없어도 색인을 만들고 빈 결과를 돌려준다"""
+    assert _index(tmp_path, []).search("장비 강화") == []
+    assert _index(tmp_path, [{"id": 1, "title": "!!!", "content": "..."}]).search("장비 강화") == []
+
+
+def test_bodies_stored_once_and_read_back(tmp_path):
+    docs = [{"id": 1, "title": "장비 강화 팁", "content": "강화석은 +5까지는 실패 확률이 낮습니다. " * 20},
+            {"id": 2, "title": "골드 파밍", "content": "데일리 퀘스트를 완료하세요. " * 20}]
+    index = _index(tmp_path, docs)
+    score, doc, coverage = index.search("장비 강화")[0]
+    assert doc == docs[0]
+    raw = (tmp_path / "index.bin").read_bytes()
+    assert raw.count(docs[0]["content"].encode()) == 1
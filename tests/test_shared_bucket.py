@@ -0,0 +1,28 @@
+"""워커 간 공유 토큰 버킷으로 Iris 전송 속도 제한"""
+import multiprocessing
+import time
+
+import app
+
+
+def _take(path, n, out):
+    cache = app.SharedCache(path)
+    queue = app.ReplyQueue(0.0, 10, 2, cache)
+    for _ in range(n):
+        queue._take_token()
+    out.put(time.time())
+
+
+def test_send_rate_is_shared_across_processes(tmp_path):
+    # 두 프로세스가 같은 버킷을 나눠 쓰면 합계가 rate를 넘지 않아야 함
+    path = str(tmp_path / "shared.db")
+    out = multiprocessing.Queue()
+    start = time.time()
+    procs = [multiprocessing.Process(target=_take, args=(path, 6, out)) for _ in range(2)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=10)
+    elapsed = max(out.get(timeout=1) for _ in procs) - start
+    # 12개 - burst 2개 = 10개를 초당 10개로 → 약 1초 (워커별 버킷이면 0.4초)
+    assert elapsed >= 0.9
@@ -0,0 +1,20 @@
+"""/traces/<kind>는 내부 주소에서만 열리고 채팅 내용을 내보내지 않는다"""
+import app
+
+
+def test_traces_route_is_internal_and_redacted(monkeypatch):
+    tracer = app.Tracer(1.0, 0.0, 10)  # 모든 요청을 느린 요청으로 기록
+    monkeypatch.setattr(app, "tracer", tracer)
+    monkeypatch.setattr(app, "INTERNAL_API_TOKEN", "")
+    tracer.start(chat_id="42", sender="홍길동", msg="!검색 비밀 이야기")
+    tracer.annotate(command="!검색")
+    tracer.finish()
+    client = app.app.test_client()
+
+    assert client.get("/traces/slow", environ_base={"REMOTE_ADDR": "8.8.8.8"}).status_code == 403
+    resp = client.get("/traces/slow", environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    assert resp.status_code == 200
+    trace = resp.get_json()["traces"][0]
+    assert trace["msg"] == "!검색" and "sender" not in trace
+    assert "비밀" not in resp.get_data(as_text=True)
+    assert tracer.snapshot("slow")[0]["msg"] == "!검색 비밀 이야기"  # !느린요청은 그대로
@@ -0,0 +1,28 @@
+"""같은 wikibot 요청을 함께 기다리는 이벤트(ask_wikibot_async)의 예산과 키"""
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+import app
+
+
+def test_joiner_waits_with_its_own_budget(fake_upstream):
+    """먼저 요청한 이벤트의 예산이 끝나도 공유 요청은 계속되고, 예산이 남은 이벤트는 결과를 받는다"""
+    def slow_answer(path, body, timeout):
+        time.sleep(0.6)
+        return 200, {"answer": body["query"], "sources": []}
+
+    wikibot = fake_upstream("wikibot", slow_answer)
+    query = f"암목 {uuid.uuid4().hex}"  # 다른 테스트의 응답 캐시와 겹치지 않게
+
+    short = app.Deadline(0.5)
+    first = app.ask_wikibot_async("/ask/item", query, room_id="1", deadline=short)
+    joined = app.ask_wikibot_async("/ask/item", f"  {query.upper()} ", room_id="2", deadline=app.Deadline(5))
+
+    assert joined is first  # 공백·대소문자만 다른 검색어는 같은 요청
+    with pytest.raises(FutureTimeoutError):
+        first.result(timeout=short.remaining())
+    assert joined.result(timeout=5)["answer"] == query
+    assert len(wikibot.calls) == 1
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+수집방 사전 분류기 벤치마크
+
+라벨이 붙은 예시 메시지(tools/collect_corpus.jsonl)로 collect_classifier의
+정밀도·재현율과 wikibot 전달을 얼마나 줄였는지, 메시지당 처리 시간을 측정합니다.
+업스트림 호출 없이 별칭 색인은 --items 목록으로 채웁니다.
+
+코퍼스 형식 (한 줄에 하나):
+    {"kind": "trade" | "party", "text": "메시지", "label": true | false}
+
+사용법:
+    python tools/bench_classifier.py
+    python tools/bench_classifier.py --corpus my_corpus.jsonl --repeat 2000 --show-errors
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import AliasIndex, CollectClassifier  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "collect_corpus.jsonl")
+DEFAULT_ITEMS = "강세,강화된세피어링,암목,암흑의목걸이,나겔반지,세피어링,오리하르콘,미스릴,드래곤비늘,고대의서"
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(classifier, samples, kind):
+    tp = fp = fn = tn = 0
+    errors = []
+    for s in samples:
+        predicted = classifier.is_trade(s["text"]) if kind == "trade" else classifier.is_party(s["text"])
+        if predicted and s["label"]:
+            tp += 1
+        elif predicted:
+            fp += 1
+            errors.append(("오탐", s["text"]))
+        elif s["label"]:
+            fn += 1
+            errors.append(("누락", s["text"]))
+        else:
+            tn += 1
+    return tp, fp, fn, tn, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="수집 사전 분류기 벤치마크")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--items", default=DEFAULT_ITEMS, help="쉼표로 구분한 품목명(별칭 목록 대신)")
+    parser.add_argument("--repeat", type=int, default=1000, help="처리 시간 측정 반복 횟수")
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    aliases = AliasIndex(interval=0)  # 백그라운드 갱신(wikibot 조회) 없음
+    aliases.load((name, name) for name in args.items.split(","))
+    classifier = CollectClassifier(aliases)
+    corpus = load_corpus(args.corpus)
+
+    for kind in ("trade", "party"):
+        samples = [s for s in corpus if s["kind"] == kind]
+        if not samples:
+            continue
+        tp, fp, fn, tn, errors = evaluate(classifier, samples, kind)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        avoided = fn + tn
+        check = classifier.is_trade if kind == "trade" else classifier.is_party
+        texts = [s["text"] for s in samples]
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for text in texts:
+                check(text)
+        per_msg_us = (time.perf_counter() - started) / (args.repeat * len(texts)) * 1e6
+
+        print(f"[{kind}] {len(samples)}건 (양성 {tp + fn} / 음성 {fp + tn})")
+        print(f"  정밀도 {precision:.3f}  재현율 {recall:.3f}  (TP {tp} FP {fp} FN {fn} TN {tn})")
+        print(f"  전달 생략 {avoided}/{len(samples)} ({avoided / len(samples):.1%}), "
+              f"잘못 생략 {fn}건")
+        print(f"  메시지당 {per_msg_us:.2f} µs")
+        if args.show_errors:
+            for label, text in errors:
+                print(f"    {label}: {text}")
+
+
+if __name__ == "__main__":
+    main()
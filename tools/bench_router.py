@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+명령 라우터 마이크로 벤치마크
+
+기존 startswith 체인(웹훅의 일반 방 분기 순서 그대로)과
+접두어 트라이 기반 COMMANDS.resolve()의 메시지당 처리 시간을 비교합니다.
+업스트림 호출 없이 "어떤 명령으로 가는지"만 측정합니다.
+
+사용법:
+    python tools/bench_router.py
+    python tools/bench_router.py --messages 200000 --command-ratio 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import COMMANDS  # noqa: E402
+
+COMMAND_SAMPLES = [
+    "!가격 암목", "!가격 5강 나겔반지", "!아이템 오리하르콘", "!아이템 오리하르콘 & 미스릴",
+    "!스킬 메테오", "!마법 힐", "!검색 발록 공략", "!질문 전직 조건", "!현자 발록",
+    "!공지", "!공지 2/5", "!업데이트", "!파티", "!파티 내일 전사", "!도움말", "!방확인",
+    "!관리자", "!별칭 목록", "!가격설정 목록", "!파티설정 목록", "!닉변이력 123",
+]
+CHATTER_SAMPLES = [
+    "ㅋㅋㅋㅋ", "안녕하세요", "강세 팝니다 300", "나겔반지 삽니다", "도움말", "이모티콘을 보냈습니다.",
+    "오늘 파티 구해요", "!", "ㅇㅇ", "다들 뭐하세요", "사진", "5강 나겔반지 얼마인가요?",
+]
+
+
+def legacy_route(msg):
+    """기존 webhook() 일반 방 분기 순서를 그대로 재현 (명령 이름만 반환)"""
+    if msg == "!방확인":
+        return "!방확인"
+    elif (msg.startswith("!관리자등록") or msg.startswith("!닉변감지") or msg.startswith("!닉변이력")
+          or msg.startswith("!가격설정") or msg.startswith("!별칭") or msg.startswith("!시세정리")
+          or msg.startswith("!파티설정")):
+        return "admin"
+    elif msg.startswith("!서버재시작"):
+        return "admin"
+    elif msg.startswith("!"):
+        if msg.startswith("!아이템"):
+            return "!아이템"
+        elif msg.startswith("!스킬") or msg.startswith("!마법"):
+            return "!스킬"
+        elif msg.startswith("!현자"):
+            return "!현자"
+        elif msg.startswith("!공지"):
+            return "!공지"
+        elif msg.startswith("!업데이트"):
+            return "!업데이트"
+        elif msg == "!파티":
+            return "!파티"
+        elif msg.startswith("!파티") and not msg.startswith("!파티설정"):
+            return "!파티"
+        elif msg.startswith("!가격") and not msg.startswith("!가격설정"):
+            return "!가격"
+        elif msg.startswith("!검색") or msg.startswith("!질문"):
+            return "!검색"
+        elif msg == "!도움말":
+            return "!도움말"
+        elif msg == "!관리자":
+            return "!관리자"
+    elif msg == "도움말":
+        return "!도움말"
+    return None
+
+
+def trie_route(msg):
+    command, _args = COMMANDS.resolve(msg)
+    return command.prefix if command else None
+
+
+def bench(fn, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for m in messages:
+            fn(m)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="명령 라우터 벤치마크")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--command-ratio", type=float, default=0.3, help="명령어(!) 메시지 비율")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [
+        rng.choice(COMMAND_SAMPLES) if rng.random() < args.command_ratio else rng.choice(CHATTER_SAMPLES)
+        for _ in range(args.messages)
+    ]
+
+    legacy = bench(legacy_route, messages, args.repeat)
+    trie = bench(trie_route, messages, args.repeat)
+
+    print("=" * 60)
+    print(f"메시지 {args.messages}개 (명령어 비율 {args.command_ratio:.0%}), {args.repeat}회 중 최솟값")
+    print("=" * 60)
+    print(f"startswith 체인 : {legacy * 1e9 / args.messages:8.1f} ns/msg")
+    print(f"접두어 트라이   : {trie * 1e9 / args.messages:8.1f} ns/msg")
+    print(f"비율            : {legacy / trie:8.2f}x")
+
+    # 명령별 최악 경우 (체인 끝쪽 명령)
+    print("\n명령별 (ns/msg):")
+    for sample in ["!가격 암목", "!검색 발록", "!도움말", "!관리자", "안녕하세요"]:
+        lt = bench(legacy_route, [sample] * 20000, 3) * 1e9 / 20000
+        tt = bench(trie_route, [sample] * 20000, 3) * 1e9 / 20000
+        print(f"  {sample:<12} 체인 {lt:7.1f}  트라이 {tt:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
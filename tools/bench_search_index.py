@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+로컬 검색 색인(BM25) 벤치마크
+
+game_data.json(또는 --data 파일)으로 색인을 만들어 생성 시간, 파일 크기,
+다시 열 때(원본 해시 확인 + mmap) 걸리는 시간, 검색 지연(p50/p95/p99)을 측정합니다.
+--scale로 문서를 복제해 자료가 늘었을 때를 흉내낼 수 있습니다.
+
+사용법:
+    python tools/bench_search_index.py
+    python tools/bench_search_index.py --scale 2000 --queries 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import SEARCH_DATA_PATH, SearchIndex, search_tokens  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def make_docs(docs, scale, rng):
+    """원본 문서를 scale배로 복제 (본문 문장 순서를 섞어 서로 다르게)"""
+    out = []
+    for i in range(scale):
+        for doc in docs:
+            sentences = doc["content"].split(". ")
+            if i:
+                rng.shuffle(sentences)
+            out.append({"id": len(out) + 1, "title": f"{doc['title']} {i}" if i else doc["title"],
+                        "content": ". ".join(sentences)})
+    return out
+
+
+def make_queries(docs, count, rng):
+    """문서 본문에서 2~4단어를 뽑아 검색어로 사용"""
+    queries = []
+    for _ in range(count):
+        words = rng.choice(docs)["content"].split()
+        start = rng.randrange(max(1, len(words) - 4))
+        queries.append(" ".join(words[start:start + rng.randint(2, 4)]))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 검색 색인 벤치마크")
+    parser.add_argument("--data", default=SEARCH_DATA_PATH)
+    parser.add_argument("--scale", type=int, default=1, help="문서 복제 배수")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with open(args.data, encoding="utf-8") as f:
+        docs = make_docs(json.load(f), args.scale, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "docs.json")
+        index_path = os.path.join(tmp, "index.bin")
+        with open(data_path, "w", encoding="utf-8") as f:
+            json.dump(docs, f, ensure_ascii=False)
+
+        # 처음 열기: 색인 파일이 없으므로 원본을 읽어 새로 만듦
+        built = SearchIndex(data_path, index_path)
+        built.load()
+        size = os.path.getsize(index_path)
+
+        # 다시 열기: 원본 해시 확인 후 기존 파일을 mmap으로 엶
+        index = SearchIndex(data_path, index_path)
+        started = time.perf_counter()
+        index.load()
+        open_ms = (time.perf_counter() - started) * 1000
+
+        queries = make_queries(docs, args.queries, rng)
+        latencies = []
+        hits = 0
+        for q in queries:
+            started = time.perf_counter()
+            result = index.search(q)
+            latencies.append((time.perf_counter() - started) * 1e6)
+            hits += bool(result)
+        tokens = sum(len(search_tokens(d["title"]) + search_tokens(d["content"])) for d in docs)
+
+        print(f"문서 {len(docs)}개, 토큰 {tokens}개, 단어 {len(index.terms)}개")
+        print(f"색인 생성 {built.build_ms:.1f} ms, 파일 {size / 1024:.1f} KiB, 열기(mmap) {open_ms:.2f} ms")
+        print(f"검색 {len(queries)}회: p50 {percentile(latencies, 50):.0f} µs / "
+              f"p95 {percentile(latencies, 95):.0f} µs / p99 {percentile(latencies, 99):.0f} µs, "
+              f"결과 있음 {hits / len(queries):.1%}")
+
+
+if __name__ == "__main__":
+    main()
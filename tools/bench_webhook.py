@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+웹훅 부하 벤치마크 (가짜 카카오 트래픽)
+
+Iris가 보내는 형식 그대로(msg, "이름/레벨/서버" sender, json.chat_id, type 0 입퇴장 피드)
+메시지를 만들어 Flask 앱의 /webhook에 보내고, 처리량·명령별 지연(p50/p95/p99)·
+메시지당 upstream 호출 수를 측정합니다. wikibot과 Iris는 tools/mock_wikibot.py를
+같은 프로세스에서 띄워 대신합니다.
+
+메시지 종류(--mix 비율):
+    chatter  일반 방 잡담
+    command  일반 방 명령어 (!가격, !검색, !파티 ...)
+    collect  거래/파티 수집방 메시지 (tools/collect_corpus.jsonl)
+    feed     입퇴장 피드 (type 0)
+
+지연은 /webhook이 이벤트를 대기열에 넣은 순간부터 워커가 처리를 끝낼 때까지입니다.
+결과는 --out JSON 파일로도 저장해 실행끼리 비교할 수 있습니다.
+
+사용법:
+    python tools/bench_webhook.py
+    python tools/bench_webhook.py --messages 5000 --rate 300 --mix chatter=30,command=20,collect=45,feed=5
+    python tools/bench_webhook.py --workers 16 --out results/after.json
+    python tools/bench_webhook.py --faults tools/faults_stall.json --rate 50 --messages 3000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import mock_wikibot  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+NAMES = ["바람", "달빛", "검은늑대", "하늘", "세린", "도리", "마루", "아린", "라온", "새벽별"]
+SERVERS = ["세오", "베라", "도가"]
+CHATTER = [
+    "ㅋㅋㅋㅋ", "안녕하세요", "다들 뭐하세요", "오늘 서버 렉 심하네요", "이모티콘을 보냈습니다.", "사진",
+    "점검 언제 끝나요?", "ㅎㅎ 감사합니다", "저녁 뭐 먹지", "도움말", "굿굿", "오 축하드려요",
+]
+COMMANDS = [
+    "!가격 암목", "!가격 5강 나겔반지", "!가격 강세", "!아이템 오리하르콘", "!아이템 오리하르콘 & 미스릴",
+    "!스킬 메테오", "!마법 힐", "!검색 리그 오브 레전드 조작법", "!검색 발록 공략", "!질문 전직 조건",
+    "!현자 발록", "!공지", "!업데이트", "!파티", "!파티 내일 전사", "!도움말", "!방확인", "!관리자",
+]
+ALIASES = {"암목": "암흑의목걸이", "강세": "강화된세피어링", "나겔": "나겔반지"}
+TRADE_COLLECT_ROOM = "900001"
+PARTY_COLLECT_ROOM = "900002"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    unknown = set(mix) - {"chatter", "command", "collect", "feed"}
+    if unknown:
+        raise SystemExit(f"알 수 없는 메시지 종류: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def load_collect_samples():
+    samples = {"trade": [], "party": []}
+    with open(os.path.join(TOOLS_DIR, "collect_corpus.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                s = json.loads(line)
+                samples[s["kind"]].append(s["text"])
+    return samples
+
+
+class TrafficGenerator:
+    """Iris 웹훅 payload 생성"""
+
+    def __init__(self, rng, mix, rooms, users):
+        self.rng = rng
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.rooms = [str(100000 + i) for i in range(rooms)]
+        self.users = [(str(10 ** 9 + i), f"{rng.choice(NAMES)}{i}", rng.randint(1, 99), rng.choice(SERVERS))
+                      for i in range(users)]
+        self.collect = load_collect_samples()
+
+    def _base(self, chat_id, msg, msg_type="1"):
+        user_id, name, level, server = self.rng.choice(self.users)
+        return {
+            "msg": msg,
+            "room": f"room-{chat_id}",
+            "sender": f"{name}/{level}/{server}",
+            "json": {"chat_id": chat_id, "user_id": user_id, "type": msg_type},
+        }
+
+    def make(self):
+        """(분류 라벨, payload)"""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "chatter":
+            return "chatter", self._base(self.rng.choice(self.rooms), self.rng.choice(CHATTER))
+        if kind == "command":
+            msg = self.rng.choice(COMMANDS)
+            return msg.split()[0], self._base(self.rng.choice(self.rooms), msg)
+        if kind == "collect":
+            collect_kind = self.rng.choice(("trade", "party"))
+            room = TRADE_COLLECT_ROOM if collect_kind == "trade" else PARTY_COLLECT_ROOM
+            return f"collect:{collect_kind}", self._base(room, self.rng.choice(self.collect[collect_kind]))
+        user_id, name, _, _ = self.rng.choice(self.users)
+        feed = {"feedType": self.rng.choice((1, 2)), "member": {"nickName": name, "userId": user_id}}
+        payload = self._base(self.rng.choice(self.rooms), json.dumps(feed, ensure_ascii=False), msg_type="0")
+        payload["sender"] = ""
+        return "feed", payload
+
+
+def start_mock(rooms, faults=None):
+    mock_wikibot.reset()
+    if faults:
+        with open(faults, encoding="utf-8") as f:
+            mock_wikibot.set_faults(json.load(f))
+    # 일반 방은 시세·파티 조회방으로 등록 (!가격, !파티 [날짜]가 실제로 upstream까지 가도록)
+    mock_wikibot.configure(rooms + [f"{TRADE_COLLECT_ROOM}:collect"], rooms + [f"{PARTY_COLLECT_ROOM}:collect"],
+                           aliases=ALIASES)
+    server = make_server("127.0.0.1", 0, mock_wikibot.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="mock-wikibot", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="웹훅 부하 벤치마크")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0, help="초당 전송 수 (0: 최대한 빠르게)")
+    parser.add_argument("--senders", type=int, default=4, help="동시에 보내는 스레드 수")
+    parser.add_argument("--mix", default="chatter=50,command=25,collect=20,feed=5")
+    parser.add_argument("--rooms", type=int, default=50, help="일반 방 수")
+    parser.add_argument("--users", type=int, default=300, help="발신자 수")
+    parser.add_argument("--workers", type=int, help="WEBHOOK_WORKERS 대신 사용할 워커 수")
+    parser.add_argument("--faults", help="대역 서버 장애 주입 규칙 JSON (tools/mock_wikibot.py 참고)")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="처리 완료 대기 최대 시간(초)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="bench_webhook_results.json", help="결과 JSON 파일")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    generator = TrafficGenerator(rng, parse_mix(args.mix), args.rooms, args.users)
+    payloads = [generator.make() for _ in range(args.messages)]
+    mock = start_mock(generator.rooms, args.faults)
+    mock_url = f"http://127.0.0.1:{mock.server_port}"
+
+    # 앱 설정은 import 전에 환경 변수로 (상태 파일은 임시 디렉터리에)
+    tmp = tempfile.mkdtemp(prefix="bench_webhook_")
+    os.environ.update({
+        "WIKIBOT_URL": mock_url,
+        "IRIS_URL": mock_url,
+        "COLLECT_SPOOL_PATH": os.path.join(tmp, "spool.db"),
+        "SEARCH_INDEX_PATH": os.path.join(tmp, "search_index.bin"),
+        "NICKNAME_CACHE_FILE": "",
+    })
+    if args.workers:
+        os.environ["WEBHOOK_WORKERS"] = str(args.workers)
+    import app as bot
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    # 처리 완료 시점 기록: webhook()이 부르는 process_event를 감싼다
+    lock = threading.Lock()
+    latencies = {}
+    done = []
+    process_event = bot.process_event
+
+    def timed_process_event(data, queued_at=None):
+        process_event(data, queued_at)
+        finished = time.monotonic()
+        with lock:
+            latencies.setdefault(data.get("_bench_label", "?"), []).append(finished - queued_at)
+            done.append(finished)
+
+    bot.process_event = timed_process_event
+
+    # 웹훅 전송
+    accept_ms = []
+    busy = [0]
+    interval = args.senders / args.rate if args.rate > 0 else 0
+
+    def sender(chunk):
+        client = bot.app.test_client()
+        next_at = time.monotonic()
+        for label, payload in chunk:
+            if interval:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            payload = dict(payload, _bench_label=label)
+            started = time.monotonic()
+            resp = client.post("/webhook", json=payload)
+            elapsed = (time.monotonic() - started) * 1000
+            with lock:
+                accept_ms.append(elapsed)
+                if resp.status_code == 503:
+                    busy[0] += 1
+
+    http_before = {c.name: c.requests for c in (bot.wikibot_http, bot.iris_http)}
+    started = time.monotonic()
+    threads = [threading.Thread(target=sender, args=(payloads[i::args.senders],)) for i in range(args.senders)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    send_elapsed = time.monotonic() - started
+
+    # 받아들인 이벤트가 모두 처리될 때까지 대기 (무시된 메시지는 대기열에 들어가지 않음)
+    expected = bot.WEBHOOK_EVENTS._values.get(("accepted",), 0)
+    deadline = time.monotonic() + args.drain_timeout
+    while len(done) < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    finished_at = max(done) if done else time.monotonic()
+    elapsed = finished_at - started
+    processed = len(done)
+
+    http_calls = {c.name: c.requests - http_before[c.name] for c in (bot.wikibot_http, bot.iris_http)}
+    mock_stats = mock.app.test_client().get("/_stats").get_json()
+
+    commands = {}
+    for label, values in sorted(latencies.items()):
+        commands[label] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(max(values) * 1000, 2),
+        }
+    results = {
+        "config": {k: getattr(args, k) for k in ("messages", "rate", "senders", "mix", "rooms", "users", "seed", "faults")},
+        "workers": bot.WEBHOOK_WORKERS,
+        "sent": len(payloads),
+        "accepted": expected,
+        "busy": busy[0],
+        "processed": processed,
+        "send_seconds": round(send_elapsed, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_msgs_per_sec": round(processed / elapsed, 1) if elapsed else 0,
+        "accept_ms": {"p50": round(percentile(accept_ms, 50), 2), "p99": round(percentile(accept_ms, 99), 2)},
+        "commands": commands,
+        "upstream_calls": http_calls,
+        "upstream_calls_per_message": round(sum(http_calls.values()) / len(payloads), 3),
+        "wikibot_calls_per_message": round(http_calls["wikibot"] / len(payloads), 3),
+        "mock_calls": mock_stats["calls"],
+        "mock_injected": mock_stats["injected"],
+        "reply_queue_pending": bot.reply_queue.pending(),
+    }
+
+    print(f"보낸 메시지 {results['sent']} (대기열 {results['accepted']}, busy {results['busy']}), "
+          f"처리 {processed}, 워커 {results['workers']}")
+    print(f"처리량 {results['throughput_msgs_per_sec']} msg/s (전송 {send_elapsed:.2f}s, 전체 {elapsed:.2f}s), "
+          f"/webhook 응답 p50 {results['accept_ms']['p50']} ms / p99 {results['accept_ms']['p99']} ms")
+    print(f"upstream 호출 {http_calls} → 메시지당 {results['upstream_calls_per_message']} "
+          f"(wikibot {results['wikibot_calls_per_message']})")
+    print(f"{'종류':<16}{'건수':>7}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for label, st in commands.items():
+        print(f"{label:<16}{st['count']:>7}{st['p50_ms']:>10}{st['p95_ms']:>10}{st['p99_ms']:>10}{st['max_ms']:>10}")
+
+    out_dir = os.path.dirname(os.path.abspath(args.out))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {args.out}")
+    mock.shutdown()
+
+
+if __name__ == "__main__":
+    main()
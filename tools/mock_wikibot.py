@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+로컬 테스트용 wikibot + Iris 대역 서버
+
+app.py가 호출하는 wikibot 엔드포인트(/ask*, /api/trade/*, /api/party/*,
+/api/nickname/*, /api/features/check, /api/rooms/config)와 Iris /reply를
+흉내 냅니다. 엔드포인트별 호출 수와 받은 수집 배치 크기를 기록합니다.
+
+장애 주입: 경로 패턴별로 지연 분포, 오류율, 타임아웃(응답 안 함), 느린 응답,
+깨진 JSON을 설정할 수 있습니다. 규칙마다 시작/종료 시각(초)을 두어 "30초 뒤
+10초 동안 멈춤" 같은 시나리오도 만들 수 있습니다. (예: tools/faults_stall.json)
+
+    [
+      {"match": "/ask*", "latency": "lognormal:0.3,0.8"},
+      {"match": "/api/trade/query", "from": 30, "until": 40, "timeout_rate": 1.0},
+      {"match": "/reply", "error_rate": 0.05, "error_status": 503}
+    ]
+
+    latency: fixed:초 | uniform:최소,최대 | normal:평균,표준편차 | lognormal:중앙값,sigma | exp:평균
+    error_rate / error_status(기본 500), timeout_rate / timeout_seconds(기본 60),
+    slow_rate / slow_seconds(기본 10), bad_json_rate, from / until(규칙 적용 후 경과 초)
+    경로마다 처음 일치하는 규칙 하나만 적용합니다.
+
+사용법:
+    python tools/mock_wikibot.py --port 8214
+    python tools/mock_wikibot.py --trade-rooms 100:collect,101 --party-rooms 200:collect
+    python tools/mock_wikibot.py --faults tools/faults_stall.json
+    python tools/mock_wikibot.py --port 3000 --faults iris_faults.json   # Iris 대역만 따로
+    curl http://localhost:8214/_stats
+    curl -X POST http://localhost:8214/_reset
+    curl -X PUT http://localhost:8214/_faults -d @faults.json -H 'Content-Type: application/json'
+    curl -X DELETE http://localhost:8214/_faults
+
+봇을 이 서버에 붙이려면 WIKIBOT_URL과 IRIS_URL을 모두 이 주소로 지정합니다.
+"""
+import argparse
+import fnmatch
+import json
+import math
+import random
+import threading
+import time
+
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+
+_lock = threading.Lock()
+_collected = {}
+_calls = {}
+_replies = {"messages": 0, "chars": 0}
+# 방 설정: room_id → {"room_id", "room_name", "collect"}
+_rooms = {"trade": {}, "party": {}}
+_aliases = {}  # 줄임말 → 정식명
+_faults = {"rules": [], "loaded_at": time.monotonic()}
+_injected = {}  # "패턴 종류" → 횟수
+
+
+def reset():
+    with _lock:
+        _collected.clear()
+        _collected.update({"trade": {"requests": 0, "items": 0, "batches": []},
+                           "party": {"requests": 0, "items": 0, "batches": []}})
+        _calls.clear()
+        _replies.update({"messages": 0, "chars": 0})
+        _injected.clear()
+
+
+def configure(trade_rooms=(), party_rooms=(), aliases=None):
+    """방 설정·별칭 지정. 방은 "room_id" 또는 "room_id:collect" 문자열"""
+    with _lock:
+        for kind, specs in (("trade", trade_rooms), ("party", party_rooms)):
+            _rooms[kind].clear()
+            for spec in specs:
+                room_id, _, flag = str(spec).partition(":")
+                _rooms[kind][room_id] = {"room_id": room_id, "room_name": f"{kind}-{room_id}",
+                                         "collect": flag == "collect"}
+        if aliases is not None:
+            _aliases.clear()
+            _aliases.update(aliases)
+
+
+reset()
+
+
+# ── 장애 주입 ──
+
+def parse_latency(spec):
+    """지연 분포 문자열 → 표본(초)을 돌려주는 함수"""
+    if spec in (None, ""):
+        return lambda: 0.0
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    kind, _, params = spec.partition(":")
+    args = [float(x) for x in params.split(",") if x]
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(args[0]), args[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1 / args[0])
+    raise ValueError(f"알 수 없는 지연 분포: {spec}")
+
+
+def set_faults(rules):
+    """장애 규칙 교체 (from/until은 지금부터의 경과 초)"""
+    compiled = []
+    for rule in rules:
+        compiled.append(dict(rule, _latency=parse_latency(rule.get("latency"))))
+    with _lock:
+        _faults["rules"] = compiled
+        _faults["loaded_at"] = time.monotonic()
+
+
+def _match_fault(path):
+    elapsed = time.monotonic() - _faults["loaded_at"]
+    for rule in _faults["rules"]:
+        if not fnmatch.fnmatchcase(path, rule.get("match", "*")):
+            continue
+        if elapsed < rule.get("from", 0) or elapsed >= rule.get("until", float("inf")):
+            continue
+        return rule
+    return None
+
+
+def _count_injected(rule, kind):
+    with _lock:
+        key = f"{rule.get('match', '*')} {kind}"
+        _injected[key] = _injected.get(key, 0) + 1
+
+
+@app.before_request
+def _count_call():
+    rule = request.url_rule.rule if request.url_rule else request.path
+    if rule.startswith("/_"):
+        return None
+    with _lock:
+        key = f"{request.method} {rule}"
+        _calls[key] = _calls.get(key, 0) + 1
+
+    fault = _match_fault(request.path)
+    if fault is None:
+        return None
+    delay = fault["_latency"]()
+    if delay:
+        time.sleep(delay)
+    roll = random.random()
+    timeout_rate = fault.get("timeout_rate", 0)
+    if roll < timeout_rate:
+        _count_injected(fault, "timeout")
+        time.sleep(fault.get("timeout_seconds", 60))
+        return jsonify({"success": False, "message": "injected timeout"}), 504
+    roll -= timeout_rate
+    error_rate = fault.get("error_rate", 0)
+    if roll < error_rate:
+        _count_injected(fault, "error")
+        return jsonify({"success": False, "message": "injected error"}), fault.get("error_status", 500)
+    roll -= error_rate
+    bad_json_rate = fault.get("bad_json_rate", 0)
+    if roll < bad_json_rate:
+        _count_injected(fault, "bad_json")
+        return "<html>502 Bad Gateway</html>", 200
+    roll -= bad_json_rate
+    if roll < fault.get("slow_rate", 0):
+        _count_injected(fault, "slow")
+        time.sleep(fault.get("slow_seconds", 10))
+    return None
+
+
+def _record(kind, count):
+    with _lock:
+        st = _collected[kind]
+        st["requests"] += 1
+        st["items"] += count
+        st["batches"] = (st["batches"] + [count])[-100:]  # 최근 100개 배치 크기
+
+
+def _body():
+    return request.get_json(silent=True) or {}
+
+
+# ── 검색 ──
+
+@app.route('/ask', methods=['POST'])
+@app.route('/ask/<kind>', methods=['POST'])
+def ask(kind=None):
+    query = _body().get("query", "")
+    return jsonify({
+        "answer": f"[{kind or 'ask'}] {query}에 대한 답변입니다.",
+        "sources": [{"title": query, "url": f"https://example.com/{kind or 'ask'}", "score": 0.9}],
+    })
+
+
+# ── 거래 ──
+
+@app.route('/api/trade/query', methods=['POST'])
+def trade_query():
+    query = _body().get("query", "")
+    return jsonify({"answer": f"{query} 시세: 1억 2천 (최근 3건)"})
+
+
+@app.route('/api/trade/alias', methods=['GET', 'POST'])
+def trade_alias():
+    if request.method == 'POST':
+        body = _body()
+        with _lock:
+            _aliases[body.get("alias", "")] = body.get("canonical_name", "")
+        return jsonify({"success": True})
+    with _lock:
+        aliases = [{"alias": a, "canonical_name": c} for a, c in _aliases.items()]
+    return jsonify({"success": True, "aliases": aliases})
+
+
+@app.route('/api/trade/alias/<alias>', methods=['DELETE'])
+def trade_alias_delete(alias):
+    with _lock:
+        removed = _aliases.pop(alias, None) is not None
+    return jsonify({"success": removed, "message": "삭제 완료" if removed else "없는 별칭"})
+
+
+@app.route('/api/trade/cleanup', methods=['POST'])
+def trade_cleanup():
+    return jsonify({"success": True, "message": "정리 완료", "deleted": 0})
+
+
+@app.route('/api/party/query', methods=['POST'])
+def party_query():
+    return jsonify({"answer": "빈자리: 전사 1 / 법사 1"})
+
+
+# ── 방 설정 ──
+
+@app.route('/api/rooms/config', methods=['POST'])
+def rooms_config():
+    room_ids = _body().get("room_ids", [])
+    with _lock:
+        rooms = {rid: {"trade": _rooms["trade"].get(rid), "party": _rooms["party"].get(rid)} for rid in room_ids}
+    return jsonify({"success": True, "rooms": rooms})
+
+
+@app.route('/api/<kind>/room-check', methods=['POST'])
+def room_check(kind):
+    if kind not in _rooms:
+        return jsonify({"success": False}), 404
+    with _lock:
+        room = _rooms[kind].get(str(_body().get("room_id", "")))
+    return jsonify({"success": True, "room": room})
+
+
+@app.route('/api/<kind>/rooms', methods=['GET', 'POST'])
+def rooms(kind):
+    if kind not in _rooms:
+        return jsonify({"success": False}), 404
+    if request.method == 'POST':
+        body = _body()
+        room_id = str(body.get("room_id", ""))
+        with _lock:
+            _rooms[kind][room_id] = {"room_id": room_id, "room_name": body.get("room_name", ""),
+                                     "collect": bool(body.get("collect"))}
+        return jsonify({"success": True, "message": "등록 완료"})
+    with _lock:
+        return jsonify({"success": True, "rooms": list(_rooms[kind].values())})
+
+
+@app.route('/api/<kind>/rooms/<room_id>', methods=['DELETE'])
+def room_delete(kind, room_id):
+    with _lock:
+        removed = _rooms.get(kind, {}).pop(room_id, None) is not None
+    return jsonify({"success": removed, "message": "삭제 완료" if removed else "없는 방"})
+
+
+# ── 수집 ──
+
+@app.route('/api/<kind>/collect/bulk', methods=['POST'])
+def collect_bulk(kind):
+    if kind not in _collected:
+        return jsonify({"success": False, "message": "unknown kind"}), 404
+    items = _body().get("items", [])
+    _record(kind, len(items))
+    return jsonify({"success": True, "received": len(items)})
+
+
+@app.route('/api/<kind>/collect', methods=['POST'])
+def collect_one(kind):
+    if kind not in _collected:
+        return jsonify({"success": False, "message": "unknown kind"}), 404
+    _record(kind, 1)
+    return jsonify({"success": True})
+
+
+# ── 닉네임 / 관리자 / 기능 토글 ──
+
+@app.route('/api/nickname/check', methods=['POST'])
+def nickname_check():
+    return jsonify({"success": True, "notification": ""})
+
+
+@app.route('/api/nickname/member-event', methods=['POST'])
+def member_event():
+    return jsonify({"success": True, "notification": ""})
+
+
+@app.route('/api/nickname/admin/verify', methods=['POST'])
+def admin_verify():
+    return jsonify({"success": True})
+
+
+@app.route('/api/nickname/admin/<path:rest>', methods=['GET', 'POST', 'DELETE'])
+def admin_other(rest):
+    return jsonify({"success": True, "message": "처리 완료", "rooms": []})
+
+
+@app.route('/api/nickname/history/<room_id>', methods=['GET'])
+def nickname_history(room_id):
+    return jsonify({"success": True, "history": []})
+
+
+@app.route('/api/features/check', methods=['POST'])
+def features_check():
+    return jsonify({"enabled": True})
+
+
+# ── Iris ──
+
+@app.route('/reply', methods=['POST'])
+def reply():
+    body = _body()
+    with _lock:
+        _replies["messages"] += 1
+        _replies["chars"] += len(str(body.get("data", "")))
+    return jsonify({"success": True})
+
+
+@app.route('/_stats', methods=['GET'])
+def stats():
+    with _lock:
+        return jsonify({"calls": dict(_calls), "collected": _collected, "replies": dict(_replies),
+                        "injected": dict(_injected)})
+
+
+@app.route('/_faults', methods=['GET', 'PUT', 'DELETE'])
+def faults():
+    if request.method == 'PUT':
+        rules = request.get_json(silent=True)
+        if not isinstance(rules, list):
+            return jsonify({"success": False, "message": "규칙 목록(JSON 배열)이 필요합니다"}), 400
+        try:
+            set_faults(rules)
+        except (ValueError, IndexError) as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+    elif request.method == 'DELETE':
+        set_faults([])
+    with _lock:
+        rules = [{k: v for k, v in r.items() if not k.startswith("_")} for r in _faults["rules"]]
+        elapsed = round(time.monotonic() - _faults["loaded_at"], 1)
+    return jsonify({"success": True, "rules": rules, "elapsed": elapsed})
+
+
+@app.route('/_reset', methods=['POST'])
+def reset_stats():
+    reset()
+    return jsonify({"success": True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wikibot + Iris 대역 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8214)
+    parser.add_argument("--trade-rooms", default="", help="거래방 목록 (room_id 또는 room_id:collect, 쉼표 구분)")
+    parser.add_argument("--party-rooms", default="", help="파티방 목록 (room_id 또는 room_id:collect, 쉼표 구분)")
+    parser.add_argument("--faults", help="장애 주입 규칙 JSON 파일")
+    args = parser.parse_args()
+    configure([r for r in args.trade_rooms.split(",") if r], [r for r in args.party_rooms.split(",") if r])
+    if args.faults:
+        with open(args.faults, encoding="utf-8") as f:
+            set_faults(json.load(f))
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()